@@ -0,0 +1,359 @@
+from json import loads as json_loads
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from dashboard_api.models import (
+    delete_movements_recorded,
+    Item,
+    ItemCategory,
+    ItemSubCategory,
+    ItemTag,
+    Organization,
+    StockMovement,
+)
+
+# Keeps IN (...) lists below SQLite's bound parameter limit.
+LOOKUP_CHUNK_SIZE = 500
+
+STOCK_FIELD_NAMES = [
+    "allocated_to_sales",
+    "allocated_to_builds",
+    "available_stock",
+    "incoming_stock",
+    "minimum_stock",
+    "desired_stock",
+    "on_build_order",
+    "can_build",
+]
+
+
+def chunked(values, chunk_size):
+    for i in range(0, len(values), chunk_size):
+        yield values[i:i + chunk_size]
+
+
+# chunked() for iterators of unknown length, e.g. rows streamed from a file.
+def iter_chunked(values, chunk_size):
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class ItemBatchValidator:
+    # Validates many new items of one organization with a fixed number of
+    # queries: categories, subcategories and the organization's tag lists are
+    # loaded once, and SKU / name uniqueness is checked with IN lookups.
+    # With upsert, rows whose SKU already belongs to the organization are
+    # returned with their existing pk set instead of being rejected.
+    def __init__(self, organization, upsert=False):
+        self.organization = organization
+        self.upsert = upsert
+
+        self.organization_config = Organization.objects.get_config(organization.id, organization)
+
+        self.category_ids = set(
+            ItemCategory.objects.filter(organization=organization).values_list("id", flat=True)
+        )
+        self.subcategory_category_ids = dict(
+            ItemSubCategory.objects.filter(organization=organization).values_list("id", "category_id")
+        )
+
+    # SKUs are unique across organizations: {sku: (id, organization_id)}.
+    def get_existing_skus(self, skus):
+        existing_skus = {}
+        for skus_chunk in chunked(list(skus), LOOKUP_CHUNK_SIZE):
+            existing_skus.update(
+                (sku, (id, organization_id))
+                for sku, id, organization_id in Item.objects.filter(
+                    stock_keeping_unit__in=skus_chunk
+                ).values_list("stock_keeping_unit", "id", "organization_id")
+            )
+        return existing_skus
+
+    # {(category_id, sub_category_id, name): sku}
+    def get_existing_name_keys(self, names):
+        existing_name_keys = {}
+        for names_chunk in chunked(list(names), LOOKUP_CHUNK_SIZE):
+            existing_name_keys.update(
+                ((category_id, sub_category_id, name), sku)
+                for category_id, sub_category_id, name, sku in Item.objects.filter(
+                    organization=self.organization,
+                    name__in=names_chunk
+                ).values_list("category_id", "sub_category_id", "name", "stock_keeping_unit")
+            )
+        return existing_name_keys
+
+    def build_item(self, validated_data):
+        validated_data = dict(validated_data)
+        category_id = validated_data.pop("category")
+        sub_category_id = validated_data.pop("sub_category")
+
+        return Item(
+            organization=self.organization,
+            category_id=category_id,
+            sub_category_id=sub_category_id,
+            **validated_data
+        )
+
+    def validate_item(self, item):
+        errors = {}
+
+        if item.category_id not in self.category_ids:
+            errors["category"] = [f"Invalid pk \"{item.category_id}\" - object does not exist."]
+
+        if self.subcategory_category_ids.get(item.sub_category_id, None) != item.category_id:
+            errors["sub_category"] = [
+                f"Invalid pk \"{item.sub_category_id}\" - object does not exist in category \"{item.category_id}\"."
+            ]
+
+        try:
+            item.clean_tags(self.organization_config)
+        except ValidationError as error:
+            errors["non_field_errors"] = error.messages
+
+        return errors
+
+    # Takes (row index, serializer validated_data) pairs and returns the valid
+    # unsaved items plus {"index", "errors"} entries for the rest.
+    def validate(self, indexed_validated_data):
+        indexed_items = [
+            (index, self.build_item(validated_data))
+            for index, validated_data in indexed_validated_data
+        ]
+
+        existing_skus = self.get_existing_skus(set(item.stock_keeping_unit for _, item in indexed_items))
+        existing_name_keys = self.get_existing_name_keys(set(item.name for _, item in indexed_items))
+
+        items = []
+        errors = []
+        batch_skus = set()
+        batch_name_keys = set()
+
+        for index, item in indexed_items:
+            item_errors = self.validate_item(item)
+
+            existing_item = existing_skus.get(item.stock_keeping_unit, None)
+            is_update = (
+                self.upsert
+                and existing_item is not None
+                and existing_item[1] == self.organization.id
+            )
+
+            if item.stock_keeping_unit in batch_skus or (existing_item is not None and not is_update):
+                item_errors["stock_keeping_unit"] = ["Item with this Stock keeping unit already exists."]
+
+            # An updated item may keep its own name.
+            name_key = (item.category_id, item.sub_category_id, item.name)
+            existing_name_key_sku = existing_name_keys.get(name_key, item.stock_keeping_unit)
+            if name_key in batch_name_keys or existing_name_key_sku != item.stock_keeping_unit:
+                item_errors.setdefault("non_field_errors", []).append(
+                    "Item with this Organization, Category, Sub category and Name already exists."
+                )
+
+            if item_errors:
+                errors.append({"index": index, "errors": item_errors})
+                continue
+
+            if is_update:
+                item.id = existing_item[0]
+
+            batch_skus.add(item.stock_keeping_unit)
+            batch_name_keys.add(name_key)
+            items.append(item)
+
+        return items, errors
+
+    # Checks a field delta that is applied to many existing items at once and
+    # returns it as update() keyword arguments.
+    def validate_changes(self, validated_data):
+        changes = dict(validated_data)
+        errors = {}
+
+        if "sub_category" in changes:
+            sub_category_id = changes.pop("sub_category")
+            category_id = self.subcategory_category_ids.get(sub_category_id, None)
+
+            if category_id is None:
+                errors["sub_category"] = [f"Invalid pk \"{sub_category_id}\" - object does not exist."]
+            elif changes.get("category", category_id) != category_id:
+                errors["sub_category"] = [
+                    f"Invalid pk \"{sub_category_id}\" - object does not exist in category \"{changes['category']}\"."
+                ]
+            else:
+                changes.pop("category", None)
+                changes["category_id"] = category_id
+                changes["sub_category_id"] = sub_category_id
+        elif "category" in changes:
+            errors["sub_category"] = ["This field is required when changing the category."]
+
+        try:
+            Item(
+                organization=self.organization,
+                tags=changes.get("tags", "[]"),
+                usage_tags=changes.get("usage_tags", "[]")
+            ).clean_tags(self.organization_config)
+        except ValidationError as error:
+            errors["non_field_errors"] = error.messages
+
+        return changes, errors
+
+
+def bulk_create_items(items, chunk_size):
+    with transaction.atomic():
+        for items_chunk in chunked(items, chunk_size):
+            Item.objects.bulk_create(items_chunk)
+            ItemTag.objects.create_for_items(items_chunk)
+            StockMovement.objects.record(
+                StockMovement.objects.build_for_values(item.id, item.organization_id, {}, item.get_ledger_values(), "create")
+                for item in items_chunk
+            )
+
+    return items
+
+
+def bulk_update_items(queryset, changes):
+    tag_field_names = [field_name for field_name in ItemTag.objects.tag_field_names if field_name in changes]
+    ledger_field_names = [field_name for field_name in StockMovement.ledger_field_names if field_name in changes]
+
+    with transaction.atomic():
+        if not tag_field_names and not ledger_field_names:
+            return queryset.update(**changes, version=F("version") + 1)
+
+        # Every matched item gets the same tags, so their ItemTag rows are
+        # rebuilt from the ids rather than from reloaded items. Quantities are
+        # read first so that the ledger records what each item moved by.
+        item_rows = list(queryset.values("id", "organization_id", *ledger_field_names))
+        for item_rows_chunk in chunked(item_rows, LOOKUP_CHUNK_SIZE):
+            item_ids_chunk = [item_row["id"] for item_row in item_rows_chunk]
+            Item.objects.filter(id__in=item_ids_chunk).update(**changes, version=F("version") + 1)
+
+            if tag_field_names:
+                ItemTag.objects.filter(item_id__in=item_ids_chunk, kind__in=tag_field_names).delete()
+                ItemTag.objects.bulk_create([
+                    ItemTag(item_id=item_row["id"], organization_id=item_row["organization_id"], kind=field_name, name=tag_name)
+                    for item_row in item_rows_chunk
+                    for field_name in tag_field_names
+                    for tag_name in set(json_loads(changes[field_name]))
+                ])
+
+            StockMovement.objects.record(
+                StockMovement.objects.build_for_values(
+                    item_row["id"], item_row["organization_id"], item_row, changes, "update"
+                )
+                for item_row in item_rows_chunk
+            )
+
+    return len(item_rows)
+
+
+# Deletes in chunks, each in its own transaction, so that a large delete does
+# not hold write locks for its whole duration.
+def bulk_delete_items(queryset, chunk_size):
+    num_deleted = 0
+
+    while True:
+        with transaction.atomic():
+            item_rows = list(
+                queryset.order_by("id").values("id", "organization_id", *StockMovement.quantity_field_names)[:chunk_size]
+            )
+            if len(item_rows) == 0:
+                break
+
+            StockMovement.objects.record(
+                StockMovement.objects.build_for_values(item_row["id"], item_row["organization_id"], item_row, {}, "delete")
+                for item_row in item_rows
+            )
+            item_ids = [item_row["id"] for item_row in item_rows]
+            # _base_manager, since Item.objects would record the movements again.
+            with delete_movements_recorded(item_ids):
+                Item._base_manager.filter(id__in=item_ids).delete()
+
+        num_deleted += len(item_rows)
+
+    return num_deleted
+
+
+def explain_stock_adjustment_failure(queryset, deltas_by_id):
+    current_values = {
+        row["id"]: row
+        for row in queryset.filter(id__in=list(deltas_by_id)).values("id", *STOCK_FIELD_NAMES)
+    }
+
+    errors = []
+    for id, deltas in deltas_by_id.items():
+        if id not in current_values:
+            errors.append({'id': id, 'errors': ["Item does not exist."]})
+            continue
+
+        field_errors = {
+            field_name: [f"Ensure this value is greater than or equal to 0 (is {current_values[id][field_name]}, delta {delta})."]
+            for field_name, delta in deltas.items()
+            if current_values[id][field_name] + delta < 0
+        }
+        if field_errors:
+            errors.append({'id': id, 'errors': field_errors})
+
+    return errors
+
+
+# Applies {item id: {field: delta}} to every item in one UPDATE computed by the
+# database, so concurrent adjustments never overwrite each other. The
+# MinValueValidator(0) floors are part of the WHERE clause: if any item would
+# go negative no row matches for it, and the whole adjustment is rolled back.
+# Returns (new values, errors).
+def adjust_item_stock(queryset, deltas_by_id):
+    ids = list(deltas_by_id)
+
+    updates = {}
+    for field_name in STOCK_FIELD_NAMES:
+        field_deltas = [
+            When(id=id, then=Value(deltas[field_name]))
+            for id, deltas in deltas_by_id.items()
+            if deltas.get(field_name, 0) != 0
+        ]
+        if field_deltas:
+            updates[field_name] = F(field_name) + Case(*field_deltas, default=Value(0))
+    if updates:
+        updates["version"] = F("version") + 1
+
+    within_floors = Q()
+    for id, deltas in deltas_by_id.items():
+        item_within_floors = Q(id=id)
+        for field_name, delta in deltas.items():
+            if delta < 0:
+                item_within_floors &= Q(**{f"{field_name}__gte": -delta})
+        within_floors |= item_within_floors
+
+    with transaction.atomic():
+        if updates:
+            num_updated = queryset.filter(within_floors).update(**updates)
+        else:
+            num_updated = queryset.filter(id__in=ids).count()
+
+        if num_updated == len(ids):
+            new_values = list(queryset.filter(id__in=ids).order_by("id").values("id", "organization_id", *STOCK_FIELD_NAMES))
+
+            StockMovement.objects.record(
+                StockMovement.objects.build(
+                    item_values["id"], item_values.pop("organization_id"), deltas_by_id[item_values["id"]], "adjustment"
+                )
+                for item_values in new_values
+            )
+            return new_values, []
+
+        transaction.set_rollback(True)
+
+    errors = explain_stock_adjustment_failure(queryset, deltas_by_id)
+    if not errors:
+        # The values changed again between the rollback and the check.
+        errors = [{'id': None, 'errors': ["Stock changed concurrently; retry the adjustment."]}]
+
+    return None, errors
@@ -0,0 +1,28 @@
+from csv import writer as csv_writer
+from json import dumps as json_dumps
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from dashboard_api.bulk_operations import (
+    iter_chunked,
+)
+
+
+class EchoBuffer:
+    # File-like object for csv.writer that hands each formatted row back
+    # instead of storing it.
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, field_names, batch_size):
+    writer = csv_writer(EchoBuffer())
+    yield writer.writerow(field_names)
+
+    for batch in iter_chunked(rows, batch_size):
+        yield "".join(writer.writerow([row[field_name] for field_name in field_names]) for row in batch)
+
+
+def stream_ndjson(rows, batch_size):
+    for batch in iter_chunked(rows, batch_size):
+        yield "".join(json_dumps(row, cls=DjangoJSONEncoder) + "\n" for row in batch)
@@ -0,0 +1,215 @@
+from csv import DictReader
+from io import TextIOWrapper
+from json import loads as json_loads, dumps as json_dumps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+
+from dashboard_api.bulk_operations import (
+    ItemBatchValidator,
+    iter_chunked,
+)
+from dashboard_api.models import (
+    Item,
+    ItemCategory,
+    ItemSubCategory,
+    ItemTag,
+    StockMovement,
+)
+from dashboard_api.serializers import (
+    ItemBulkCreateSerializer,
+)
+
+
+def iter_csv_rows(file):
+    for row in DictReader(TextIOWrapper(file, encoding="utf-8-sig", newline="")):
+        # Cells beyond the header row are collected under None.
+        row.pop(None, None)
+        # Empty cells fall back to the field defaults.
+        yield {key: value for key, value in row.items() if value != ""}
+
+
+def iter_ndjson_rows(file):
+    for line in TextIOWrapper(file, encoding="utf-8-sig"):
+        if not line.strip():
+            continue
+
+        try:
+            yield json_loads(line)
+        except ValueError:
+            yield None
+
+
+class ItemImporter:
+    # Writes rows streamed from a file into an organization's items, one
+    # transaction per chunk, so that memory use and lock time stay bounded and
+    # a bad chunk does not roll back the chunks before it.
+    update_field_names = [
+        field.name for field in Item._meta.concrete_fields
+        if field.name not in ("id", "organization", "stock_keeping_unit", "version")
+    ]
+
+    def __init__(self, organization, chunk_size, upsert=False):
+        self.organization = organization
+        self.chunk_size = chunk_size
+        self.upsert = upsert
+
+        self.validator = ItemBatchValidator(organization, upsert)
+        self.row_serializer = ItemBulkCreateSerializer()
+
+        # Files reference categories and subcategories by name.
+        self.category_ids = dict(
+            ItemCategory.objects.filter(organization=organization).values_list("name", "id")
+        )
+        self.subcategory_ids = {
+            (category_id, name): id
+            for id, category_id, name in ItemSubCategory.objects.filter(
+                organization=organization
+            ).values_list("id", "category_id", "name")
+        }
+
+    def resolve_row(self, row):
+        data = dict(row)
+        errors = {}
+
+        category_name = data.get("category", None)
+        category_id = self.category_ids.get(category_name, None)
+        if category_name is None:
+            errors["category"] = ["This field is required."]
+        elif category_id is None:
+            errors["category"] = [f"Category \"{category_name}\" does not exist."]
+        else:
+            data["category"] = category_id
+
+        sub_category_name = data.get("sub_category", None)
+        sub_category_id = self.subcategory_ids.get((category_id, sub_category_name), None)
+        if sub_category_name is None:
+            errors["sub_category"] = ["This field is required."]
+        elif sub_category_id is None:
+            errors["sub_category"] = [
+                f"Subcategory \"{sub_category_name}\" does not exist in category \"{category_name}\"."
+            ]
+        else:
+            data["sub_category"] = sub_category_id
+
+        # NDJSON rows may carry tags as lists rather than JSON text.
+        for field_name in ItemTag.objects.tag_field_names:
+            if isinstance(data.get(field_name, None), list):
+                data[field_name] = json_dumps(data[field_name])
+
+        return data, errors
+
+    def validate_rows(self, indexed_rows):
+        indexed_validated_data = []
+        errors = []
+
+        for index, row in indexed_rows:
+            if not isinstance(row, dict):
+                errors.append({'index': index, 'errors': {'non_field_errors': ["Row is not a JSON object."]}})
+                continue
+
+            data, row_errors = self.resolve_row(row)
+            if row_errors:
+                errors.append({'index': index, 'errors': row_errors})
+                continue
+
+            try:
+                indexed_validated_data.append((index, self.row_serializer.run_validation(data)))
+            except ValidationError as error:
+                errors.append({'index': index, 'errors': error.detail})
+
+        fields_by_sku = {
+            validated_data["stock_keeping_unit"]: set(validated_data)
+            for _, validated_data in indexed_validated_data
+        }
+
+        items, batch_errors = self.validator.validate(indexed_validated_data)
+        errors = sorted(errors + batch_errors, key=lambda error: error['index'])
+
+        return items, fields_by_sku, errors
+
+    def fill_missing_fields(self, updated_items, fields_by_sku):
+        # Updates only overwrite the columns present in the row.
+        existing_items = Item.objects.in_bulk([item.id for item in updated_items])
+
+        for item in updated_items:
+            existing_item = existing_items[item.id]
+            row_fields = fields_by_sku[item.stock_keeping_unit]
+
+            for field_name in self.update_field_names:
+                if field_name not in row_fields:
+                    attname = Item._meta.get_field(field_name).attname
+                    setattr(item, attname, getattr(existing_item, attname))
+
+        return existing_items
+
+    def write_items(self, items, fields_by_sku):
+        created_items = [item for item in items if item.pk is None]
+        updated_items = [item for item in items if item.pk is not None]
+
+        with transaction.atomic():
+            Item.objects.bulk_create(created_items)
+            ItemTag.objects.create_for_items(created_items)
+
+            movements = [
+                StockMovement.objects.build_for_values(item.id, item.organization_id, {}, item.get_ledger_values(), "import")
+                for item in created_items
+            ]
+
+            if updated_items:
+                existing_items = self.fill_missing_fields(updated_items, fields_by_sku)
+                for item in updated_items:
+                    item.version = F("version") + 1
+                Item.objects.bulk_update(updated_items, self.update_field_names + ["version"])
+                ItemTag.objects.sync_for_items(updated_items)
+
+                movements += [
+                    StockMovement.objects.build_for_values(
+                        item.id,
+                        item.organization_id,
+                        existing_items[item.id].get_ledger_values(),
+                        item.get_ledger_values(),
+                        "import"
+                    )
+                    for item in updated_items
+                ]
+
+            StockMovement.objects.record(movements)
+
+        return created_items, updated_items
+
+    def import_chunk(self, indexed_rows):
+        items, fields_by_sku, errors = self.validate_rows(indexed_rows)
+
+        created_items = []
+        updated_items = []
+        try:
+            created_items, updated_items = self.write_items(items, fields_by_sku)
+        except IntegrityError:
+            # Another writer took a SKU or name after validation; only this
+            # chunk is rolled back.
+            errors = [
+                {'index': index, 'errors': {'non_field_errors': ["Chunk conflicts with concurrently written items."]}}
+                for index, _ in indexed_rows
+            ]
+
+        return {
+            'rows': len(indexed_rows),
+            'created': len(created_items),
+            'updated': len(updated_items),
+            'errors': errors,
+        }
+
+    # Yields one progress report per committed chunk.
+    def import_rows(self, rows):
+        num_rows = 0
+        for chunk_number, indexed_rows in enumerate(iter_chunked(enumerate(rows), self.chunk_size), start=1):
+            chunk_result = self.import_chunk(indexed_rows)
+            num_rows += chunk_result['rows']
+
+            yield {
+                'chunk': chunk_number,
+                'rows_processed': num_rows,
+                **chunk_result,
+            }
@@ -0,0 +1,225 @@
+from collections import OrderedDict
+from os import getpid
+from pickle import dumps as pickle_dumps, HIGHEST_PROTOCOL
+from threading import Lock, Thread
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from dashboard_api.metrics import (
+    record_redis_error,
+)
+
+
+# In-process cache bounded by entry count and total size, evicting the least
+# recently used entries first. Every delete() and clear() starts a new
+# generation; a set() made with the generation read before fetching its value
+# is dropped if an invalidation happened in between.
+class LocalLRUCache:
+    def __init__(self, max_entries, max_size):
+        self.max_entries = max_entries
+        self.max_size = max_size
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._generation = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def estimate_size(self, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return len(value)
+        return len(pickle_dumps(value, protocol=HIGHEST_PROTOCOL))
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return default
+
+            value, size, expires_at = entry
+            if expires_at <= monotonic():
+                self._remove(key)
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, size=None, generation=None):
+        if size is None:
+            size = self.estimate_size(value)
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._remove(key)
+            if size > self.max_size:
+                return
+
+            self._entries[key] = (value, size, monotonic() + timeout)
+            self._size += size
+
+            while len(self._entries) > self.max_entries or self._size > self.max_size:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            self._generation += 1
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+
+# Drops local cache entries for keys that any worker publishes on the
+# invalidation channel.
+class LocalCacheInvalidationListener(Thread):
+    reconnect_interval = 1.0
+
+    def __init__(self, local_cache, channel):
+        super().__init__(name="local-cache-invalidation-listener", daemon=True)
+        self.local_cache = local_cache
+        self.channel = channel
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                record_redis_error("l1_invalidation")
+
+            # Invalidations may have been missed while disconnected.
+            self.local_cache.clear()
+            sleep(self.reconnect_interval)
+
+    def listen(self):
+        pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        self.local_cache.clear()
+
+        for message in pubsub.listen():
+            self.local_cache.delete(message["data"].decode("utf-8"))
+
+
+# A per-process LocalLRUCache in front of the shared Redis cache. Values under
+# a key are treated as immutable except through incr() and delete(), which
+# broadcast the key so that every worker drops its copy.
+class TwoTierCache:
+    def __init__(self, remote_cache, local_cache, channel, timeout):
+        self.remote_cache = remote_cache
+        self.local_cache = local_cache
+        self.channel = channel
+        self.timeout = timeout
+
+    def publish_invalidation(self, key):
+        self.local_cache.delete(key)
+        get_redis_connection("default").publish(self.channel, key)
+
+    def get(self, key, default=None, size=None):
+        value = self.local_cache.get(key, None)
+        if value is not None:
+            return value
+
+        # An invalidation that arrives during the remote read may be for the
+        # value being read, which must then not be kept.
+        generation = self.local_cache.generation
+        value = self.remote_cache.get(key, None)
+        if value is None:
+            return default
+
+        self.local_cache.set(key, value, self.timeout, size, generation)
+        return value
+
+    # Reads the keys missing from the local cache in one remote round trip.
+    def get_many(self, keys):
+        values = {}
+        missing_keys = []
+        for key in keys:
+            value = self.local_cache.get(key, None)
+            if value is None:
+                missing_keys.append(key)
+            else:
+                values[key] = value
+
+        if missing_keys:
+            generation = self.local_cache.generation
+            remote_values = self.remote_cache.get_many(missing_keys)
+            for key, value in remote_values.items():
+                self.local_cache.set(key, value, self.timeout, None, generation)
+            values.update(remote_values)
+
+        return values
+
+    def set(self, key, value, timeout, size=None):
+        self.remote_cache.set(key, value, timeout)
+        self.local_cache.set(key, value, min(self.timeout, timeout or self.timeout), size)
+
+    def add(self, key, value, timeout):
+        added = self.remote_cache.add(key, value, timeout)
+        self.local_cache.delete(key)
+        return added
+
+    def incr(self, key, delta=1):
+        value = self.remote_cache.incr(key, delta)
+        self.publish_invalidation(key)
+        return value
+
+    def delete(self, key):
+        deleted = self.remote_cache.delete(key)
+        self.publish_invalidation(key)
+        return deleted
+
+
+_two_tier_cache = None
+_two_tier_cache_pid = None
+_two_tier_cache_lock = Lock()
+
+
+def get_two_tier_cache():
+    global _two_tier_cache, _two_tier_cache_pid
+
+    # Pre-fork servers import this module before forking, so each worker
+    # process builds its own local cache and listener thread.
+    if _two_tier_cache is not None and _two_tier_cache_pid == getpid():
+        return _two_tier_cache
+
+    with _two_tier_cache_lock:
+        if _two_tier_cache is None or _two_tier_cache_pid != getpid():
+            local_cache = LocalLRUCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_MAX_SIZE)
+            channel = settings.CACHE_L1_INVALIDATION_CHANNEL
+
+            LocalCacheInvalidationListener(local_cache, channel).start()
+
+            _two_tier_cache = TwoTierCache(cache, local_cache, channel, settings.CACHE_L1_TIMEOUT)
+            _two_tier_cache_pid = getpid()
+
+    return _two_tier_cache
+
+
+# The two-tier cache when CACHE_L1_ENABLED is set, the shared cache otherwise.
+def get_shared_cache():
+    if settings.CACHE_L1_ENABLED:
+        return get_two_tier_cache()
+    return cache
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dashboard_api.models import (
+    Item,
+    ItemTag,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the normalized ItemTag rows from Item.tags and Item.usage_tags."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--organization", type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Backfilling item tags...')
+        num_items = self.run_backfill(options["chunk_size"], options["organization"])
+        self.stdout.write(f'    ... done ({num_items} items).')
+
+    def run_backfill(self, chunk_size, organization_id):
+        queryset = Item.objects.only("id", "organization_id", "tags", "usage_tags").order_by("id")
+        if organization_id is not None:
+            queryset = queryset.filter(organization_id=organization_id)
+
+        num_items = 0
+        last_id = 0
+
+        while True:
+            items = list(queryset.filter(id__gt=last_id)[:chunk_size])
+            if len(items) == 0:
+                break
+
+            with transaction.atomic():
+                ItemTag.objects.sync_for_items(items)
+
+            num_items += len(items)
+            last_id = items[-1].id
+
+        return num_items
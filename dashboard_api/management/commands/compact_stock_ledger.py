@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dashboard_api.models import (
+    Organization,
+)
+from dashboard_api.stock_ledger import (
+    compact_stock_ledger,
+)
+
+
+class Command(BaseCommand):
+    help = "Fold stock movements older than the retention period into snapshots and delete them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=int, default=settings.STOCK_LEDGER_RETENTION_DAYS)
+        parser.add_argument("--snapshot-retention-days", type=int, default=None)
+        parser.add_argument("--organization", type=int, default=None)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(days=options["retention_days"])
+
+        keep_snapshots_after = None
+        if options["snapshot_retention_days"] is not None:
+            keep_snapshots_after = now - timedelta(days=options["snapshot_retention_days"])
+
+        organizations = Organization.objects.order_by("id")
+        if options["organization"] is not None:
+            organizations = organizations.filter(id=options["organization"])
+
+        self.stdout.write(f'Compacting the stock ledger up to {cutoff.isoformat()}...')
+        for organization in organizations:
+            num_movements, num_snapshots = compact_stock_ledger(organization.id, cutoff, keep_snapshots_after)
+            self.stdout.write(f'    {organization.name}: {num_movements} movements, {num_snapshots} snapshots deleted')
+        self.stdout.write('    ... done.')
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard_api.imports import (
+    ItemImporter,
+    iter_csv_rows,
+    iter_ndjson_rows,
+)
+from dashboard_api.mixins import (
+    invalidate_model_caches,
+)
+from dashboard_api.models import (
+    Organization,
+)
+
+
+class Command(BaseCommand):
+    help = "Import items into an organization from a CSV or NDJSON file, committing in chunks."
+
+    row_readers = {
+        "csv": iter_csv_rows,
+        "ndjson": iter_ndjson_rows,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--organization", type=int, required=True)
+        parser.add_argument("--format", choices=sorted(self.row_readers), default=None)
+        parser.add_argument("--chunk-size", type=int, default=settings.ITEM_IMPORT_CHUNK_SIZE)
+        parser.add_argument("--upsert", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(id=options["organization"])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization {options['organization']} does not exist.")
+
+        import_format = options["format"]
+        if import_format is None:
+            import_format = "ndjson" if options["path"].lower().endswith((".ndjson", ".jsonl")) else "csv"
+
+        importer = ItemImporter(organization, options["chunk_size"], upsert=options["upsert"])
+
+        self.stdout.write(f'Importing items into "{organization.name}"...')
+
+        num_created = 0
+        num_updated = 0
+        num_errors = 0
+
+        with open(options["path"], "rb") as file:
+            for progress in importer.import_rows(self.row_readers[import_format](file)):
+                if progress['created'] or progress['updated']:
+                    invalidate_model_caches(organization.id, ["Item"])
+
+                num_created += progress['created']
+                num_updated += progress['updated']
+                num_errors += len(progress['errors'])
+
+                for error in progress['errors']:
+                    self.stderr.write(f"    row {error['index']}: {error['errors']}")
+                self.stdout.write(
+                    f"    chunk {progress['chunk']}: {progress['rows_processed']} rows processed "
+                    f"({num_created} created, {num_updated} updated, {num_errors} errors)"
+                )
+
+        self.stdout.write(f'    ... done ({num_created} created, {num_updated} updated, {num_errors} errors).')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from dashboard_api.query_stats import (
+    load_query_stats,
+    reset_query_stats,
+)
+
+SORT_FIELDS = {
+    "total": "total_ms",
+    "count": "count",
+    "mean": "mean_ms",
+    "slow": "slow_count",
+}
+
+
+class Command(BaseCommand):
+    help = "Show the SQL run by the API grouped by normalized shape, with EXPLAIN plans of the slow ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sort", choices=SORT_FIELDS.keys(), default="total")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--url-name", default=None)
+        parser.add_argument("--plans", action="store_true")
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            num_fingerprints = reset_query_stats()
+            self.stdout.write(f'Deleted the stats of {num_fingerprints} query fingerprints.')
+            return
+
+        query_stats = load_query_stats(SORT_FIELDS[options["sort"]])
+        if options["url_name"] is not None:
+            query_stats = [stats for stats in query_stats if stats["url_name"] == options["url_name"]]
+
+        self.stdout.write(f'{"total ms":>12} {"count":>8} {"mean ms":>9} {"slow":>6}  fingerprint       url name')
+        for stats in query_stats[:options["limit"]]:
+            self.stdout.write(
+                f'{stats["total_ms"]:>12.1f} {stats["count"]:>8} {stats["mean_ms"]:>9.2f} {stats["slow_count"]:>6}  '
+                f'{stats["fingerprint"]}  {stats["url_name"] or "-"}'
+            )
+            self.stdout.write(f'    {stats["sql"]}')
+
+            if options["plans"] and stats["plan"] is not None:
+                self.stdout.write(f'    EXPLAIN of a {stats["plan_duration_ms"]:.1f} ms run at {stats["explained_at"]}:')
+                for line in stats["plan"].splitlines():
+                    self.stdout.write(f'        {line}')
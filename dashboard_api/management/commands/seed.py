@@ -1,137 +1,272 @@
-from json import dumps as json_dumps
-from random import randint, sample, seed, uniform
+from decimal import Decimal
+from json import loads as json_loads, dumps as json_dumps
+from random import Random
+from time import monotonic
 
-from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
 
+from dashboard_api.bulk_operations import (
+    iter_chunked,
+)
 from dashboard_api.models import (
     CustomUser,
     Item,
     ItemCategory,
     ItemSubCategory,
+    ItemTag,
     Organization,
+    StockMovement,
 )
 
-RANDOM_SEED = 0
-NUM_USERS_PER_ORG = 2
-NUM_ITEM_CATEGORIES_PER_ORG = 2
-NUM_ITEM_SUBCATEGORIES_PER_ITEM_CATEGORY = 3
-NUM_ITEMS_PER_ITEM_SUBCATEGORY = 4
+DEFAULT_ROLES = ["admin", "worker", "sales"]
 DEFAULT_TAGS = ["shopify", "xero"]
 DEFAULT_USAGE_TAGS = ["assembly", "component", "purchasable", "saleable", "bundle"]
 
-
-seed(RANDOM_SEED)
+# Fixed demo accounts used by the README and manual QA; foo_bar belongs to a
+# second organization to check that organizations are kept apart.
+DEMO_ORGANIZATION_NAME = "Kaizntree"
+DEMO_OTHER_ORGANIZATION_NAME = "Organization 1"
+DEMO_PASSWORD = "1234"
+DEMO_USERS = [
+    ("marcos@kaizntree.com", "marcos_brisson", "Marcos Brisson", DEMO_ORGANIZATION_NAME),
+    ("ali@kaizntree.com", "ali_quidwai", "Ali Quidwai", DEMO_ORGANIZATION_NAME),
+    ("abhilakshsinghreen@gmail.com", "abhilaksh_singh_reen", "Abhilaksh Singh Reen", DEMO_ORGANIZATION_NAME),
+    ("foo@bar.com", "foo_bar", "Foo Bar", DEMO_OTHER_ORGANIZATION_NAME),
+]
+DEMO_RANDOM_SEED = 0
+DEMO_CATEGORIES = 2
+DEMO_SUBCATEGORIES_PER_CATEGORY = 3
+DEMO_ITEMS_PER_SUBCATEGORY = 4
 
 
 class Command(BaseCommand):
+    # Generates synthetic organizations at any scale. Every row is valid by
+    # construction (roles and tags are drawn from the organization's own
+    # lists, names and SKUs are numbered), so rows are written with chunked
+    # bulk_create instead of per-row full_clean(). The same --seed and counts
+    # always produce the same data. The fixed demo organizations and users
+    # are created first, once per database, with their own password hashes.
     help = "seed database for testing and development."
 
+    def add_arguments(self, parser):
+        parser.add_argument("--organizations", type=int, default=4)
+        parser.add_argument("--users-per-organization", type=int, default=2)
+        parser.add_argument("--categories-per-organization", type=int, default=2)
+        parser.add_argument("--subcategories-per-category", type=int, default=3)
+        parser.add_argument("--items-per-subcategory", type=int, default=4)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        # Keeps usernames, emails and SKUs apart between seeded batches.
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument("--password", default="1234")
+        # Synthetic users share one password hash, computed once, instead of
+        # running the password hasher per user.
+        parser.add_argument("--fast-passwords", action="store_true")
+        parser.add_argument("--skip-demo", action="store_true")
+
     def handle(self, *args, **options):
+        self.options = options
+        self.random = Random(options["seed"])
+        self.chunk_size = options["chunk_size"]
+        self.prefix = options["prefix"]
+        self.shared_password_hash = None
+
+        if self.chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
         self.stdout.write('Seeding data...')
-        self.run_seed()
-        self.stdout.write('    ... done.')
+        start_time = monotonic()
+
+        try:
+            self.run_seed()
+        except IntegrityError as error:
+            raise CommandError(f"Seeded rows clash with existing ones; use another --prefix. ({error})")
+
+        self.stdout.write(f'    ... done in {monotonic() - start_time:.1f}s.')
 
     def run_seed(self):
-        default_roles = ["admin", "worker", "sales"]
+        if not self.options["skip_demo"]:
+            self.seed_demo_fixtures()
 
-        org_0 = Organization.objects.create(
-            name="Kaizntree",
-            roles=json_dumps(default_roles),
-            item_tags=json_dumps(DEFAULT_TAGS),
-            item_usage_tags=json_dumps(DEFAULT_USAGE_TAGS)
-        )
-        org_1 = Organization.objects.create(
-            name="Organization 1",
-            roles=json_dumps(default_roles),
-            item_tags=json_dumps(["shopify", "xero"]),
-            item_usage_tags=json_dumps(["assembly", "component", "purchasable", "saleable", "bundle"])
-        )
-        org_2 = Organization.objects.create(
-            name="Organization 2",
-            roles=json_dumps(default_roles),
-            item_tags=json_dumps(["shopify", "xero"]),
-            item_usage_tags=json_dumps(["assembly", "purchasable", "saleable"])
-        )
-        org_3 = Organization.objects.create(
-            name="Organization 3",
-            roles=json_dumps(default_roles),
-            item_tags=json_dumps(["xero"]),
-            item_usage_tags=json_dumps(["assembly", "component", "purchasable", "saleable", "bundle"])
-        )
+        organizations = self.seed_organizations()
+
+        num_items = 0
+        for organization_number, organization in enumerate(organizations, start=1):
+            with transaction.atomic():
+                self.seed_users(organization_number, organization)
+                subcategories = self.seed_categories(organization)
+
+            num_items += self.seed_items(organization_number, organization, subcategories)
+            self.stdout.write(f'    {organization.name}: {num_items} items so far')
+
+    # Created one row at a time through the model's own save(), like any
+    # account made by hand; --seed, --prefix and --fast-passwords do not
+    # apply, and a database that already has them is left as it is.
+    def seed_demo_fixtures(self):
+        demo_emails = [email for email, *_ in DEMO_USERS]
+        if CustomUser.objects.filter(email__in=demo_emails).exists():
+            self.stdout.write('    demo users already exist, skipping them')
+            return
+
+        demo_random = Random(DEMO_RANDOM_SEED)
+        with transaction.atomic():
+            organizations = {
+                DEMO_ORGANIZATION_NAME: Organization.objects.create(
+                    name=DEMO_ORGANIZATION_NAME,
+                    roles=json_dumps(DEFAULT_ROLES),
+                    item_tags=json_dumps(DEFAULT_TAGS),
+                    item_usage_tags=json_dumps(DEFAULT_USAGE_TAGS)
+                ),
+                DEMO_OTHER_ORGANIZATION_NAME: Organization.objects.create(
+                    name=DEMO_OTHER_ORGANIZATION_NAME,
+                    roles=json_dumps(DEFAULT_ROLES),
+                    item_tags=json_dumps(DEFAULT_TAGS),
+                    item_usage_tags=json_dumps(DEFAULT_USAGE_TAGS)
+                ),
+            }
+
+            for email, username, full_name, organization_name in DEMO_USERS:
+                CustomUser.objects.create_user(
+                    email=email,
+                    username=username,
+                    password=DEMO_PASSWORD,
+                    full_name=full_name,
+                    phone_number="0000000000",
+                    organization=organizations[organization_name],
+                    role="admin"
+                )
+
+            organization = organizations[DEMO_ORGANIZATION_NAME]
+            for category_number in range(1, 1 + DEMO_CATEGORIES):
+                category = ItemCategory.objects.create(name=f"Item Category {category_number}", organization=organization)
+
+                for subcategory_number in range(1, 1 + DEMO_SUBCATEGORIES_PER_CATEGORY):
+                    subcategory = ItemSubCategory.objects.create(
+                        name=f"Item Sub Category {category_number}_{subcategory_number}",
+                        category=category,
+                        organization=organization
+                    )
+
+                    for item_number in range(1, 1 + DEMO_ITEMS_PER_SUBCATEGORY):
+                        Item.objects.create(
+                            name=f"Item {item_number}",
+                            sub_category=subcategory,
+                            category=category,
+                            organization=organization,
+                            stock_keeping_unit=f"Item_sku_{category_number}_{subcategory_number}_{item_number}",
+                            cost=Decimal(demo_random.randrange(1000, 100000)) / 100,
+                            available_stock=demo_random.randint(50, 250),
+                            tags=json_dumps(demo_random.sample(DEFAULT_TAGS, demo_random.randint(0, len(DEFAULT_TAGS)))),
+                            usage_tags=json_dumps(demo_random.sample(DEFAULT_USAGE_TAGS, demo_random.randint(0, len(DEFAULT_USAGE_TAGS)))),
+                        )
 
-        user_1 = CustomUser.objects.create_user(
-            email="marcos@kaizntree.com",
-            username="marcos_brisson",
-            password="1234",
-            full_name="Marcos Brisson",
-            phone_number="0000000000",
-            organization=org_0,
-            role="admin"
+        self.stdout.write(f'    demo users: {", ".join(demo_emails)} (password "{DEMO_PASSWORD}")')
+
+    def build_organization(self, organization_number):
+        organization = Organization(
+            name=f"{self.prefix.capitalize()} Organization {organization_number}",
+            roles=json_dumps(DEFAULT_ROLES),
+            item_tags=json_dumps(self.sample_non_empty(DEFAULT_TAGS)),
+            item_usage_tags=json_dumps(self.sample_non_empty(DEFAULT_USAGE_TAGS))
         )
+        try:
+            organization.full_clean()
+        except ValidationError as error:
+            raise CommandError(f"Invalid organization: {error}")
+        return organization
+
+    def seed_organizations(self):
+        organizations = [
+            self.build_organization(organization_number)
+            for organization_number in range(1, 1 + self.options["organizations"])
+        ]
+        return Organization.objects.bulk_create(organizations)
+
+    def get_password_hash(self):
+        if not self.options["fast_passwords"]:
+            return make_password(self.options["password"])
+
+        if self.shared_password_hash is None:
+            self.shared_password_hash = make_password(self.options["password"])
+        return self.shared_password_hash
 
-        user_2 = CustomUser.objects.create_user(
-            email="ali@kaizntree.com",
-            username="ali_quidwai",
-            password="1234",
-            full_name="Ali Quidwai",
-            phone_number="0000000000",
-            organization=org_0,
-            role="admin"
+    def seed_users(self, organization_number, organization):
+        roles = json_loads(organization.roles)
+        users = (
+            CustomUser(
+                username=f"{self.prefix}_{organization_number}_{user_number}",
+                email=f"{self.prefix}_{organization_number}_{user_number}@example.com",
+                password=self.get_password_hash(),
+                full_name=f"User {organization_number}_{user_number}",
+                phone_number="0000000000",
+                organization=organization,
+                # Every organization gets at least one admin.
+                role="admin" if user_number == 1 else self.random.choice(roles),
+                is_staff=True
+            )
+            for user_number in range(1, 1 + self.options["users_per_organization"])
         )
+        for users_chunk in iter_chunked(users, self.chunk_size):
+            CustomUser.objects.bulk_create(users_chunk)
 
-        user_3 = CustomUser.objects.create_user(
-            email="abhilakshsinghreen@gmail.com",
-            username="abhilaksh_singh_reen",
-            password="1234",
-            full_name="Abhilaksh Singh Reen",
-            phone_number="0000000000",
-            organization=org_0,
-            role="admin"
+    def seed_categories(self, organization):
+        categories = ItemCategory.objects.bulk_create(
+            [
+                ItemCategory(name=f"Item Category {category_number}", organization=organization)
+                for category_number in range(1, 1 + self.options["categories_per_organization"])
+            ],
+            batch_size=self.chunk_size
         )
 
-        user_4 = CustomUser.objects.create_user(
-            email="foo@bar.com",
-            username="foo_bar",
-            password="1234",
-            full_name="Foo Bar",
-            phone_number="0000000000",
-            organization=org_1,
-            role="admin"
+        return ItemSubCategory.objects.bulk_create(
+            [
+                ItemSubCategory(
+                    name=f"Item Sub Category {category_number}_{subcategory_number}",
+                    category=category,
+                    organization=organization
+                )
+                for category_number, category in enumerate(categories, start=1)
+                for subcategory_number in range(1, 1 + self.options["subcategories_per_category"])
+            ],
+            batch_size=self.chunk_size
         )
 
-        org_1_item_categories = []
-        for i in range(1, 1 + NUM_ITEM_CATEGORIES_PER_ORG):
-            new_item_category = ItemCategory.objects.create(
-                name=f"Item Category {i}",
-                organization=org_0
-            )
-            org_1_item_categories.append(new_item_category)
-        
-        org_1_item_subcategories = []
-        for i, item_category_object in enumerate(org_1_item_categories):
-            for j in range(1, 1 + NUM_ITEM_SUBCATEGORIES_PER_ITEM_CATEGORY):
-                new_item_subcategory = ItemSubCategory.objects.create(
-                    name=f"Item Sub Category {i}_{j}",
-                    category=item_category_object,
-                    organization=org_0
+    def generate_items(self, organization_number, organization, subcategories):
+        item_tags = json_loads(organization.item_tags)
+        item_usage_tags = json_loads(organization.item_usage_tags)
+
+        for subcategory_number, subcategory in enumerate(subcategories, start=1):
+            for item_number in range(1, 1 + self.options["items_per_subcategory"]):
+                yield Item(
+                    name=f"Item {item_number}",
+                    sub_category_id=subcategory.id,
+                    category_id=subcategory.category_id,
+                    organization_id=organization.id,
+                    stock_keeping_unit=f"{self.prefix}_{organization_number}_{subcategory_number}_{item_number}",
+                    cost=Decimal(self.random.randrange(1000, 100000)) / 100,
+                    available_stock=self.random.randint(50, 250),
+                    tags=json_dumps(self.random.sample(item_tags, self.random.randint(0, len(item_tags)))),
+                    usage_tags=json_dumps(self.random.sample(item_usage_tags, self.random.randint(0, len(item_usage_tags)))),
                 )
-                org_1_item_subcategories.append(new_item_subcategory)
-        
-        org_1_items = []
-        for i, item_subcategory_object in enumerate(org_1_item_subcategories):
-            for j in range(1, 1 + NUM_ITEMS_PER_ITEM_SUBCATEGORY):
-                random_tags = sample(DEFAULT_TAGS, randint(0, len(DEFAULT_TAGS)))
-                random_usage_tags = sample(DEFAULT_USAGE_TAGS, randint(0, len(DEFAULT_USAGE_TAGS)))
-
-                new_item = Item.objects.create(
-                    name=f"Item {j}",
-                    sub_category=item_subcategory_object,
-                    category=item_subcategory_object.category,
-                    organization=org_0,
-                    stock_keeping_unit=f"Item_sku_{i}_{j}",
-                    cost=str(round(uniform(10.0, 1000.0), 2)),
-                    available_stock=randint(50, 250),
-                    tags=json_dumps(random_tags),
-                    usage_tags=json_dumps(random_usage_tags),
+
+    def seed_items(self, organization_number, organization, subcategories):
+        num_items = 0
+
+        # One transaction per chunk keeps memory and lock time bounded.
+        for items_chunk in iter_chunked(self.generate_items(organization_number, organization, subcategories), self.chunk_size):
+            with transaction.atomic():
+                Item.objects.bulk_create(items_chunk)
+                ItemTag.objects.create_for_items(items_chunk)
+                StockMovement.objects.record(
+                    StockMovement.objects.build_for_values(item.id, item.organization_id, {}, item.get_ledger_values(), "create")
+                    for item in items_chunk
                 )
-                org_1_items.append(new_item)
+            num_items += len(items_chunk)
+
+        return num_items
+
+    def sample_non_empty(self, values):
+        return self.random.sample(values, self.random.randint(1, len(values)))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from dashboard_api.models import (
+    Organization,
+)
+from dashboard_api.stock_ledger import (
+    snapshot_closed_periods,
+    take_stock_snapshot,
+)
+
+
+class Command(BaseCommand):
+    help = "Snapshot the current stock quantities of every item, the base for point-in-time stock queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organization", type=int, default=None)
+        # Meant to run on a schedule (e.g. hourly): snapshots the months that
+        # have closed since the last run.
+        parser.add_argument("--period-ends", action="store_true")
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.order_by("id")
+        if options["organization"] is not None:
+            organizations = organizations.filter(id=options["organization"])
+
+        if options["period_ends"]:
+            self.stdout.write('Snapshotting closed periods...')
+            for organization in organizations:
+                num_snapshots = snapshot_closed_periods(organization.id)
+                self.stdout.write(f'    {organization.name}: {num_snapshots} period ends')
+            self.stdout.write('    ... done.')
+            return
+
+        self.stdout.write('Taking stock snapshots...')
+        for organization in organizations:
+            taken_at = take_stock_snapshot(organization.id)
+            self.stdout.write(f'    {organization.name}: {taken_at.isoformat()}')
+        self.stdout.write('    ... done.')
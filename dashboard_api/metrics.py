@@ -0,0 +1,307 @@
+from bisect import bisect_left
+from json import loads as json_loads, dumps as json_dumps
+from os import getpid, listdir, replace
+from os.path import join
+from threading import Lock, RLock, Thread, local
+from time import sleep
+from weakref import finalize
+
+from django.conf import settings
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+
+METRIC_HELP = {
+    "http_requests_total": ("counter", "Requests served, by URL name, method and status."),
+    "http_request_duration_seconds": ("histogram", "Request latency, by URL name."),
+    "http_slow_requests_total": ("counter", "Requests slower than REQUEST_TIMING_SLOW_THRESHOLD_MS, by URL name."),
+    "db_queries_total": ("counter", "SQL queries run, by URL name."),
+    "cache_lookups_total": ("counter", "CacheMixin entry lookups, by model and hit/miss."),
+    "cache_hit_ratio": ("gauge", "CacheMixin hits over lookups since start, by model."),
+    "redis_errors_total": ("counter", "Redis errors, by where they surfaced."),
+}
+
+
+class ThreadShardOwner:
+    # Only held by its thread's thread-local storage; it is collected when
+    # the thread exits, which retires the thread's shard.
+    pass
+
+
+# Per-process counters and histograms. Every thread records into its own
+# shard, so the hot path is a dict update without a lock; the lock is only
+# taken when a thread records for the first time. When a thread exits its
+# shard is merged into the retired totals, so thread-per-request servers do
+# not accumulate shards. Snapshots merge the live shards and the retired ones.
+class MetricsRegistry:
+    def __init__(self):
+        self._shards = []
+        self._retired_shard = ({}, {})
+        # Reentrant: a shard may be retired by a collection that happens to run
+        # while this thread holds the lock.
+        self._shards_lock = RLock()
+        self._local = local()
+        self.histogram_buckets = {}
+
+    def _get_shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = ({}, {})
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+
+            owner = ThreadShardOwner()
+            finalize(owner, self._retire_shard, shard)
+            self._local.owner = owner
+        return shard
+
+    def _retire_shard(self, shard):
+        retired_counters, retired_histograms = self._retired_shard
+        with self._shards_lock:
+            for key, value in shard[0].items():
+                retired_counters[key] = retired_counters.get(key, 0) + value
+            for key, histogram in shard[1].items():
+                merge_histogram(retired_histograms, key, list(histogram))
+            self._shards.remove(shard)
+
+    # Labels are tuples of (name, value) pairs.
+    def increment(self, name, labels=(), value=1):
+        counters = self._get_shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=(), buckets=None):
+        histograms = self._get_shard()[1]
+        key = (name, labels)
+
+        # One count per bucket (the last one is +Inf), then the sum.
+        buckets = buckets or settings.METRICS_LATENCY_BUCKETS
+        histogram = histograms.get(key, None)
+        if histogram is None:
+            self.histogram_buckets[name] = buckets
+            histogram = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        counters = {}
+        histograms = {}
+
+        # The retired totals are only changed under the lock, and a shard is
+        # either live or retired while it is held.
+        with self._shards_lock:
+            shards = list(self._shards)
+            for key, value in self._retired_shard[0].copy().items():
+                counters[key] = value
+            for key, histogram in self._retired_shard[1].copy().items():
+                histograms[key] = list(histogram)
+
+        for shard_counters, shard_histograms in shards:
+            # dict.copy() runs under the GIL, so a recording thread cannot
+            # resize the dict halfway through.
+            for key, value in shard_counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, histogram in shard_histograms.copy().items():
+                merge_histogram(histograms, key, list(histogram))
+
+        return {
+            "counters": counters,
+            "histograms": histograms,
+            "histogram_buckets": dict(self.histogram_buckets),
+        }
+
+
+def merge_histogram(histograms, key, histogram):
+    merged_histogram = histograms.get(key, None)
+    if merged_histogram is None:
+        histograms[key] = histogram
+    else:
+        histograms[key] = [merged + value for merged, value in zip(merged_histogram, histogram)]
+
+
+def serialize_snapshot(snapshot):
+    return json_dumps({
+        "counters": [[name, labels, value] for (name, labels), value in snapshot["counters"].items()],
+        "histograms": [[name, labels, histogram] for (name, labels), histogram in snapshot["histograms"].items()],
+        "histogram_buckets": snapshot["histogram_buckets"],
+    })
+
+
+def deserialize_snapshot(serialized_snapshot):
+    data = json_loads(serialized_snapshot)
+    return {
+        "counters": {
+            (name, tuple(tuple(label) for label in labels)): value for name, labels, value in data["counters"]
+        },
+        "histograms": {
+            (name, tuple(tuple(label) for label in labels)): histogram for name, labels, histogram in data["histograms"]
+        },
+        "histogram_buckets": {name: tuple(buckets) for name, buckets in data["histogram_buckets"].items()},
+    }
+
+
+def merge_snapshots(snapshots):
+    merged = {"counters": {}, "histograms": {}, "histogram_buckets": {}}
+    for snapshot in snapshots:
+        for key, value in snapshot["counters"].items():
+            merged["counters"][key] = merged["counters"].get(key, 0) + value
+        for key, histogram in snapshot["histograms"].items():
+            merge_histogram(merged["histograms"], key, histogram)
+        merged["histogram_buckets"].update(snapshot["histogram_buckets"])
+    return merged
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped_labels = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped_labels) + "}"
+
+
+def add_cache_hit_ratios(counters):
+    lookups_by_model = {}
+    for (name, labels), value in counters.items():
+        if name == "cache_lookups_total":
+            labels = dict(labels)
+            hits, total = lookups_by_model.get(labels["model"], (0, 0))
+            lookups_by_model[labels["model"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+
+    gauges = dict(counters)
+    for model, (hits, total) in lookups_by_model.items():
+        gauges[("cache_hit_ratio", (("model", model),))] = hits / total if total else 0.0
+    return gauges
+
+
+# Prometheus text exposition format, version 0.0.4.
+def render_exposition(snapshot):
+    samples_by_name = {}
+
+    for (name, labels), value in sorted(add_cache_hit_ratios(snapshot["counters"]).items()):
+        samples_by_name.setdefault(name, []).append(f"{name}{format_labels(labels)} {value}")
+
+    for (name, labels), histogram in sorted(snapshot["histograms"].items()):
+        buckets = snapshot["histogram_buckets"][name]
+        samples = samples_by_name.setdefault(name, [])
+
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(list(buckets) + ["+Inf"], histogram[:-1]):
+            cumulative_count += bucket_count
+            samples.append(f"{name}_bucket{format_labels(labels + (('le', upper_bound),))} {cumulative_count}")
+        samples.append(f"{name}_sum{format_labels(labels)} {histogram[-1]}")
+        samples.append(f"{name}_count{format_labels(labels)} {cumulative_count}")
+
+    lines = []
+    for name, samples in sorted(samples_by_name.items()):
+        metric_type, help_text = METRIC_HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines += samples
+    return "\n".join(lines) + "\n"
+
+
+# Under a pre-fork server every worker writes its snapshot to its own file in
+# METRICS_DIR, and the worker answering a scrape merges all of them. Files of
+# exited workers are kept so that counters never go backwards; clear the
+# directory when the server starts.
+def get_snapshot_path(pid):
+    return join(settings.METRICS_DIR, f"metrics_{pid}.json")
+
+
+def write_process_snapshot(registry):
+    snapshot_path = get_snapshot_path(getpid())
+    temporary_path = f"{snapshot_path}.tmp"
+    with open(temporary_path, "w") as snapshot_file:
+        snapshot_file.write(serialize_snapshot(registry.snapshot()))
+    replace(temporary_path, snapshot_path)
+
+
+def read_process_snapshots():
+    snapshots = []
+    for file_name in listdir(settings.METRICS_DIR):
+        if file_name.startswith("metrics_") and file_name.endswith(".json"):
+            try:
+                with open(join(settings.METRICS_DIR, file_name)) as snapshot_file:
+                    snapshots.append(deserialize_snapshot(snapshot_file.read()))
+            except (OSError, ValueError):
+                continue
+    return snapshots
+
+
+class MetricsFlusher(Thread):
+    def __init__(self, registry, interval):
+        super().__init__(name="metrics-flusher", daemon=True)
+        self.registry = registry
+        self.interval = interval
+
+    def run(self):
+        while True:
+            sleep(self.interval)
+            try:
+                write_process_snapshot(self.registry)
+            except OSError:
+                pass
+
+
+_metrics_registry = None
+_metrics_registry_pid = None
+_metrics_registry_lock = Lock()
+
+
+def get_metrics_registry():
+    global _metrics_registry, _metrics_registry_pid
+
+    # Pre-fork servers import this module before forking, so each worker
+    # process starts its own registry (and flusher).
+    if _metrics_registry is not None and _metrics_registry_pid == getpid():
+        return _metrics_registry
+
+    with _metrics_registry_lock:
+        if _metrics_registry is None or _metrics_registry_pid != getpid():
+            _metrics_registry = MetricsRegistry()
+            _metrics_registry_pid = getpid()
+
+            if settings.METRICS_DIR:
+                MetricsFlusher(_metrics_registry, settings.METRICS_FLUSH_INTERVAL).start()
+
+    return _metrics_registry
+
+
+def collect_metrics():
+    registry = get_metrics_registry()
+    if not settings.METRICS_DIR:
+        return render_exposition(registry.snapshot())
+
+    # This worker's latest numbers, not its last flush.
+    write_process_snapshot(registry)
+    return render_exposition(merge_snapshots(read_process_snapshots()))
+
+
+def record_request(url_name, method, status, duration, num_queries):
+    registry = get_metrics_registry()
+    registry.increment("http_requests_total", (("url_name", url_name), ("method", method), ("status", status)))
+    registry.observe("http_request_duration_seconds", duration, (("url_name", url_name),))
+    registry.increment("db_queries_total", (("url_name", url_name),), num_queries)
+
+
+def record_cache_lookup(model_name, hit):
+    if settings.METRICS_ENABLED:
+        get_metrics_registry().increment("cache_lookups_total", (("model", model_name), ("result", "hit" if hit else "miss")))
+
+
+def record_slow_request(url_name):
+    if settings.METRICS_ENABLED:
+        get_metrics_registry().increment("http_slow_requests_total", (("url_name", url_name),))
+
+
+def is_redis_error(exception):
+    return isinstance(exception, (ConnectionInterrupted, RedisError))
+
+
+def record_redis_error(source):
+    if settings.METRICS_ENABLED:
+        get_metrics_registry().increment("redis_errors_total", (("source", source),))
@@ -0,0 +1,160 @@
+from json import dumps as json_dumps
+from logging import getLogger
+from random import random
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+
+from dashboard_api.metrics import (
+    is_redis_error,
+    record_redis_error,
+    record_request,
+    record_slow_request,
+)
+from dashboard_api.query_stats import (
+    get_query_stats,
+    QueryStatsRecorder,
+)
+from dashboard_api.request_timing import (
+    get_request_timings,
+    RequestTimings,
+    reset_request_timings,
+    set_request_timings,
+)
+
+
+logger = getLogger(__name__)
+
+
+class RequestTimingMiddleware:
+    # Times every request and captures its SQL; those slower than the
+    # threshold are logged as one JSON line with their slowest queries and
+    # counted in http_slow_requests_total. For a sampled fraction of requests
+    # the time is also broken down into auth, db, cache, serialize and
+    # render, returned in a Server-Timing header and logged.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_sampled(self):
+        sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        return sample_rate > 0 and random() < sample_rate
+
+    def __call__(self, request):
+        sampled = self.is_sampled()
+
+        # Queries are timed on every request; the per-phase measurements only
+        # run while the timings are the current ones.
+        request_timings = RequestTimings(settings.REQUEST_TIMING_MAX_CAPTURED_QUERIES)
+        token = set_request_timings(request_timings) if sampled else None
+        start_time = perf_counter()
+        try:
+            with connection.execute_wrapper(request_timings.record_query):
+                response = self.get_response(request)
+        finally:
+            if token is not None:
+                reset_request_timings(token)
+        total_duration = perf_counter() - start_time
+
+        if sampled:
+            response["Server-Timing"] = request_timings.format_server_timing(total_duration)
+        if sampled or self.is_slow(total_duration):
+            self.log_request(request, response, request_timings, total_duration, sampled)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns.
+        request_timings = get_request_timings()
+        if request_timings is not None:
+            start_time = perf_counter()
+            response.add_post_render_callback(
+                lambda rendered_response: request_timings.add("render", perf_counter() - start_time)
+            )
+        return response
+
+    def is_slow(self, total_duration):
+        return total_duration * 1000 >= settings.REQUEST_TIMING_SLOW_THRESHOLD_MS
+
+    # Unsampled requests only have their SQL timed.
+    def log_request(self, request, response, request_timings, total_duration, sampled):
+        resolver_match = getattr(request, "resolver_match", None)
+        url_name = resolver_match.url_name if resolver_match else None
+        log_fields = {
+            "method": request.method,
+            "path": request.path,
+            "url_name": url_name,
+            "status": response.status_code,
+            "total_ms": round(total_duration * 1000, 3),
+            "sampled": sampled,
+        }
+        if sampled:
+            log_fields.update(request_timings.as_log_fields())
+        else:
+            log_fields["db_queries"] = request_timings.num_queries
+            log_fields["db_ms"] = round(request_timings.get("db") * 1000, 3)
+
+        if not self.is_slow(total_duration):
+            logger.info(json_dumps(log_fields))
+            return
+
+        record_slow_request(url_name or "unmatched")
+        slowest_queries = sorted(request_timings.captured_queries, key=lambda query: query[1], reverse=True)
+        log_fields["slow"] = True
+        log_fields["queries"] = [
+            {"sql": sql, "ms": round(duration * 1000, 3)}
+            for sql, duration in slowest_queries[:settings.REQUEST_TIMING_MAX_LOGGED_QUERIES]
+        ]
+        logger.warning(json_dumps(log_fields))
+
+
+# Counts the SQL queries of one request.
+class QueryCounter:
+    def __init__(self):
+        self.num_queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.num_queries += 1
+        return execute(sql, params, many, context)
+
+
+class RequestMetricsMiddleware:
+    # Records every request into the process's metrics registry: count and
+    # latency per URL name, and the number of SQL queries it ran. Redis
+    # errors raised by views are counted as well.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        query_counter = QueryCounter()
+        start_time = perf_counter()
+        with connection.execute_wrapper(query_counter):
+            response = self.get_response(request)
+        duration = perf_counter() - start_time
+
+        resolver_match = getattr(request, "resolver_match", None)
+        url_name = resolver_match.url_name if resolver_match and resolver_match.url_name else "unmatched"
+        record_request(url_name, request.method, response.status_code, duration, query_counter.num_queries)
+        return response
+
+    def process_exception(self, request, exception):
+        if settings.METRICS_ENABLED and is_redis_error(exception):
+            record_redis_error("request")
+        return None
+
+
+class QueryStatsMiddleware:
+    # Aggregates the request's SQL by fingerprint (see query_stats) and
+    # queues slow reads for a background EXPLAIN. View the results with
+    # `python manage.py query_stats`.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_STATS_ENABLED:
+            return self.get_response(request)
+
+        with connection.execute_wrapper(QueryStatsRecorder(get_query_stats(), connection.alias, request)):
+            return self.get_response(request)
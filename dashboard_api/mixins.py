@@ -1,40 +1,708 @@
+from functools import wraps
+from gzip import compress as gzip_compress, decompress as gzip_decompress
+from hashlib import sha1
+from json import dumps as json_dumps
+from math import log
+from random import random
+from re import compile as re_compile
+from secrets import randbits
+from time import perf_counter, sleep, time
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.core.cache import cache
+from django.db.models import Count
+from django.http import HttpResponse
+from django.http import HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from dashboard_api.local_cache import (
+    get_two_tier_cache,
+)
+from dashboard_api.metrics import (
+    record_cache_lookup as record_cache_lookup_metric,
+)
+from dashboard_api.models import (
+    ItemTag,
+    StaleVersionError,
+)
+from dashboard_api.request_timing import (
+    measure,
+    record_cache_lookup,
+)
+
+
+accepts_gzip_re = re_compile(r"\bgzip\b")
+# Detail ETags name the row version after the cache hash: "<hash>-v<version>".
+etag_re = re_compile(r"^(?P<opaque_tag>.*?)(?:-v(?P<row_version>\d+))?$")
+
+# Deletes a lock only if it still holds the caller's token.
+release_lock_script = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+# Short Redis locks owned by a random token, or None if the lock is taken.
+# Integers are stored unpickled, so the release script can compare them.
+def acquire_lock(lock_cache_key, timeout):
+    lock_token = randbits(63)
+    if cache.add(lock_cache_key, lock_token, timeout=timeout):
+        return lock_token
+    return None
+
+
+# A holder that outlived the lock timeout must not release the lock of the
+# worker that took it over.
+def release_lock(lock_cache_key, lock_token):
+    get_redis_connection("default").eval(release_lock_script, 1, cache.make_key(lock_cache_key), lock_token)
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The resource has been modified since it was last fetched."
+    default_code = "precondition_failed"
+
+
+class VersionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The resource was modified by another request."
+    default_code = "version_conflict"
+
+
+class IdempotencyKeyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = "idempotency_key_in_progress"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+def generate_version_cache_key(organization_id, model_name):
+    return f"{organization_id}__{model_name}__version"
+
+
+def get_version_cache():
+    # Every version bump is broadcast while L1 is enabled, since any view may
+    # hold the bumped counter in its local cache.
+    if settings.CACHE_L1_ENABLED:
+        return get_two_tier_cache()
+    return cache
+
+
+def generate_initial_cache_version():
+    # Seeded from the clock so that a counter lost to eviction never restarts
+    # at a version whose entries may still be cached.
+    return int(time() * 1000)
+
+
+def bump_model_cache_version(organization_id, model_name):
+    version_cache = get_version_cache()
+    version_cache_key = generate_version_cache_key(organization_id, model_name)
+
+    try:
+        return version_cache.incr(version_cache_key)
+    except ValueError:
+        version_cache.add(version_cache_key, generate_initial_cache_version(), timeout=None)
+        return version_cache.incr(version_cache_key)
+
+
+# Outdates every cached entry of these models for the organization. Also for
+# writes made outside of the views, e.g. by management commands.
+def invalidate_model_caches(organization_id, model_names):
+    for model_name in model_names:
+        bump_model_cache_version(organization_id, model_name)
 
 
 class CacheMixin:
-    def generate_primary_cache_key(self, organization_id, other_fields):
-        sorted_keys = sorted(other_fields.keys())
-        other_fields_str = "--".join([f"{key}-{other_fields[key]}" for key in sorted_keys])
-        return f"{organization_id}__{other_fields_str}"
-    
-    def generate_all_cache_key(self, organization_id):
-        return f"{organization_id}__{self.model_name}"
-    
-    def generate_single_cache_key(self, organization_id, id):
-        return f"{organization_id}__{self.model_name}__{id}"
-    
-    def get_all_cache(self, organization_id):
-        all_cache_key = self.generate_all_cache_key(organization_id)
-        return cache.get(all_cache_key, None)
-    
-    def get_single_cache(self, organization_id, id):
-        single_cache_key = self.generate_single_cache_key(organization_id, id)
-        return cache.get(single_cache_key, None)
-    
-    def set_all_cache(self, organization_id, data):
-        all_cache_key = self.generate_all_cache_key(organization_id)
-        cache.set(all_cache_key, data)
-
-    def set_single_cache(self, organization_id, id, data):
-        single_cache_key = self.generate_single_cache_key(organization_id, id)
-        cache.set(single_cache_key, data)
-
-    def delete_all_cache(self, organization_id):
-        all_cache_key = self.generate_all_cache_key(organization_id)
-        if all_cache_key in cache:
-            cache.delete(all_cache_key)
-
-    def delete_single_cache(self, organization_id, id):
-        single_cache_key = self.generate_single_cache_key(organization_id, id)
-        if single_cache_key in cache:
-            cache.delete(single_cache_key)
+    # Names of other cached models whose rows are removed (cascade) or changed
+    # by writes to this model.
+    dependent_model_names = []
+    # Serve this model's entries from the per-process L1 cache when
+    # CACHE_L1_ENABLED is set. Meant for rarely changing reference data.
+    local_cache_enabled = False
+    # Keeps the entries of several views over the same model apart; they still
+    # share the model's version, so writes invalidate all of them.
+    cache_view_name = None
+
+    def generate_version_cache_key(self, organization_id, model_name=None):
+        return generate_version_cache_key(organization_id, model_name or self.model_name)
+
+    def generate_query_params_hash(self, query_params):
+        if hasattr(query_params, "lists"):
+            params = query_params.lists()
+        else:
+            params = [(key, [value]) for key, value in query_params.items()]
+
+        canonical_params = sorted(
+            (key, sorted(str(value) for value in values))
+            for key, values in params
+        )
+        canonical_query_string = urlencode(canonical_params, doseq=True)
+        return sha1(canonical_query_string.encode("utf-8")).hexdigest()
+
+    def get_cache_representation(self):
+        # "json" entries hold the rendered response body, "data" entries hold
+        # response.data for any other renderer (e.g. the browsable API).
+        request = getattr(self, "request", None)
+        if (
+            settings.CACHE_RENDERED_RESPONSES
+            and request is not None
+            and request.accepted_renderer.format == "json"
+        ):
+            return "json"
+        return "data"
+
+    def generate_primary_cache_key(self, organization_id, query_params, id=None):
+        query_params_hash = self.generate_query_params_hash(query_params)
+        representation = self.get_cache_representation()
+        cache_name = self.model_name if self.cache_view_name is None else f"{self.model_name}__{self.cache_view_name}"
+        return f"{organization_id}__{cache_name}__{query_params_hash}__{id or 'all'}__{representation}"
+
+    def generate_versioned_cache_key(self, organization_id, query_params, id=None):
+        version = self.get_cache_version(organization_id)
+        return f"{self.generate_primary_cache_key(organization_id, query_params, id)}__v{version}"
+
+    def generate_stale_cache_key(self, organization_id, query_params, id=None):
+        return f"{self.generate_primary_cache_key(organization_id, query_params, id)}__stale"
+
+    def generate_lock_cache_key(self, versioned_cache_key):
+        return f"{versioned_cache_key}__lock"
+
+    def get_entry_cache(self):
+        if settings.CACHE_L1_ENABLED and self.local_cache_enabled:
+            return get_two_tier_cache()
+        return cache
+
+    def get_version_cache(self):
+        return get_version_cache()
+
+    def generate_initial_cache_version(self):
+        return generate_initial_cache_version()
+
+    def get_cache_version(self, organization_id):
+        # Views are instantiated per request, so this pins one version for the
+        # whole request (ETag and cache lookup) at the cost of one round trip.
+        cache_versions = self.__dict__.setdefault("cache_versions", {})
+        if organization_id in cache_versions:
+            return cache_versions[organization_id]
+
+        version_cache = self.get_entry_cache()
+        version_cache_key = self.generate_version_cache_key(organization_id)
+
+        version = version_cache.get(version_cache_key, None)
+        if version is None:
+            version_cache.add(version_cache_key, self.generate_initial_cache_version(), timeout=None)
+            version = version_cache.get(version_cache_key)
+
+        cache_versions[organization_id] = version
+        return version
+
+    def bump_cache_version(self, organization_id, model_name=None):
+        if model_name is None or model_name == self.model_name:
+            self.__dict__.get("cache_versions", {}).pop(organization_id, None)
+
+        return bump_model_cache_version(organization_id, model_name or self.model_name)
+
+    def get_cache(self, organization_id, query_params, id=None):
+        versioned_cache_key = self.generate_versioned_cache_key(organization_id, query_params, id)
+        cache_entry = self.get_entry_cache().get(versioned_cache_key, None)
+        if cache_entry is None:
+            return None
+        return cache_entry["data"]
+
+    def set_cache(self, organization_id, query_params, data, id=None, compute_time=0.0):
+        versioned_cache_key = self.generate_versioned_cache_key(organization_id, query_params, id)
+        stale_cache_key = self.generate_stale_cache_key(organization_id, query_params, id)
+        self.set_cache_entry(versioned_cache_key, stale_cache_key, data, compute_time)
+
+    def build_cache_entry(self, versioned_cache_key, data, compute_time):
+        return {
+            "data": data,
+            "etag": self.generate_etag(versioned_cache_key),
+            "compute_time": compute_time,
+            "expires_at": time() + cache.default_timeout,
+        }
+
+    def set_cache_entry(self, versioned_cache_key, stale_cache_key, data, compute_time):
+        cache_entry = self.build_cache_entry(versioned_cache_key, data, compute_time)
+        self.get_entry_cache().set(versioned_cache_key, cache_entry, cache.default_timeout)
+        if settings.CACHE_SERVE_STALE:
+            cache.set(stale_cache_key, cache_entry, settings.CACHE_STALE_TIMEOUT)
+        return cache_entry
+
+    def invalidate_cache(self, organization_id):
+        self.__dict__.get("cache_versions", {}).pop(organization_id, None)
+        invalidate_model_caches(organization_id, [self.model_name, *self.dependent_model_names])
+
+    def should_refresh_early(self, cache_entry):
+        # Probabilistic early expiration: the closer an entry is to expiring, and
+        # the longer it took to compute, the likelier a reader refreshes it now.
+        beta = settings.CACHE_EARLY_REFRESH_BETA
+        if beta <= 0:
+            return False
+
+        early_by = -cache_entry["compute_time"] * beta * log(1.0 - random())
+        return time() + early_by >= cache_entry["expires_at"]
+
+    def acquire_cache_lock(self, versioned_cache_key):
+        return acquire_lock(self.generate_lock_cache_key(versioned_cache_key), settings.CACHE_LOCK_TIMEOUT)
+
+    def release_cache_lock(self, versioned_cache_key, lock_token):
+        release_lock(self.generate_lock_cache_key(versioned_cache_key), lock_token)
+
+    def wait_for_cache_entry(self, versioned_cache_key):
+        lock_cache_key = self.generate_lock_cache_key(versioned_cache_key)
+        deadline = time() + settings.CACHE_LOCK_WAIT_TIMEOUT
+
+        while time() < deadline:
+            sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+
+            cached_values = cache.get_many([versioned_cache_key, lock_cache_key])
+            if versioned_cache_key in cached_values:
+                return cached_values[versioned_cache_key]
+            if lock_cache_key not in cached_values:
+                # The lock holder finished without caching anything (e.g. a 404).
+                break
+
+        return None
+
+    def compute_cache_entry(self, versioned_cache_key, stale_cache_key, compute, lock_token):
+        try:
+            start_time = time()
+            data = compute()
+            return self.set_cache_entry(versioned_cache_key, stale_cache_key, data, time() - start_time)
+        finally:
+            self.release_cache_lock(versioned_cache_key, lock_token)
+
+    def get_or_compute_cache_entry(self, organization_id, query_params, compute, id=None):
+        versioned_cache_key = self.generate_versioned_cache_key(organization_id, query_params, id)
+        stale_cache_key = self.generate_stale_cache_key(organization_id, query_params, id)
+
+        lookup_start_time = perf_counter()
+        cache_entry = self.get_entry_cache().get(versioned_cache_key, None)
+        record_cache_lookup(cache_entry is not None, perf_counter() - lookup_start_time)
+        record_cache_lookup_metric(self.model_name, cache_entry is not None)
+
+        if cache_entry is not None:
+            if self.should_refresh_early(cache_entry):
+                lock_token = self.acquire_cache_lock(versioned_cache_key)
+                if lock_token is not None:
+                    return self.compute_cache_entry(versioned_cache_key, stale_cache_key, compute, lock_token)
+            return cache_entry
+
+        lock_token = self.acquire_cache_lock(versioned_cache_key)
+        if lock_token is not None:
+            return self.compute_cache_entry(versioned_cache_key, stale_cache_key, compute, lock_token)
+
+        # Another worker is rebuilding this entry.
+        if settings.CACHE_SERVE_STALE:
+            stale_cache_entry = cache.get(stale_cache_key, None)
+            if stale_cache_entry is not None:
+                return stale_cache_entry
+
+        cache_entry = self.wait_for_cache_entry(versioned_cache_key)
+        if cache_entry is not None:
+            return cache_entry
+
+        return self.build_cache_entry(versioned_cache_key, compute(), 0.0)
+
+    def get_or_compute_cache(self, organization_id, query_params, compute, id=None):
+        return self.get_or_compute_cache_entry(organization_id, query_params, compute, id)["data"]
+
+    def generate_etag(self, versioned_cache_key):
+        # Every write bumps the version, so a versioned key always maps to the
+        # same content and its hash is a strong validator for the response.
+        return f'"{sha1(versioned_cache_key.encode("utf-8")).hexdigest()}"'
+
+    def generate_row_etag(self, etag, row_version):
+        if row_version is None:
+            return etag
+        return f'{etag[:-1]}-v{row_version}"'
+
+    def parse_etag(self, etag):
+        # Gzipped and identity bodies of the same entry carry "-gzip" and plain tags.
+        match = etag_re.match(etag.removeprefix("W/").strip('"').removesuffix("-gzip"))
+        row_version = match["row_version"]
+        return match["opaque_tag"], None if row_version is None else int(row_version)
+
+    def get_row_version(self, data, id=None):
+        if id and isinstance(data, dict):
+            return data.get("version", None)
+        return None
+
+    def find_matching_etag(self, etags, etag):
+        opaque_tag = etag.strip('"')
+        for candidate_etag in etags:
+            candidate_opaque_tag, _ = self.parse_etag(candidate_etag)
+            if candidate_opaque_tag == opaque_tag:
+                return candidate_etag
+        return None
+
+    def etag_matches(self, if_match_header, etag, match_any=False):
+        if not if_match_header:
+            return False
+
+        etags = parse_etags(if_match_header)
+        if "*" in etags:
+            return match_any
+
+        return self.find_matching_etag(etags, etag) is not None
+
+    def get_current_etag(self, request, id=None):
+        user_organization = self.request.user.organization
+        versioned_cache_key = self.generate_versioned_cache_key(user_organization.id, request.query_params, id)
+        return self.generate_etag(versioned_cache_key)
+
+    # Returns the row version named by If-Match, which the write then makes
+    # conditional on. Tags without one are compared with the current ETag.
+    def check_if_match(self, request, id=None):
+        if_match_header = request.META.get("HTTP_IF_MATCH", None)
+        if if_match_header is None:
+            return None
+
+        etags = parse_etags(if_match_header)
+        if id and "*" not in etags:
+            for etag in etags:
+                _, row_version = self.parse_etag(etag)
+                if row_version is not None:
+                    return row_version
+
+        if not self.etag_matches(if_match_header, self.get_current_etag(request, id), match_any=True):
+            raise PreconditionFailed()
+        return None
+
+    def write_at_version(self, write, expected_version=None):
+        try:
+            return write()
+        except StaleVersionError:
+            # A version from If-Match is the client's precondition; otherwise
+            # another request won the race since this one read the row.
+            if expected_version is not None:
+                raise PreconditionFailed()
+            raise VersionConflict()
+
+    def destroy_at_version(self, request, id=None, expected_version=None):
+        instance = self.get_object()
+        if expected_version is not None:
+            instance.version = expected_version
+        self.perform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def set_etag(self, response, etag):
+        if response.get("Content-Encoding", None) == "gzip":
+            etag = f'{etag[:-1]}-gzip"'
+        response["ETag"] = etag
+        return response
+
+    def render_response_data(self, data):
+        renderer = self.request.accepted_renderer
+        with measure("render"):
+            body = renderer.render(data, self.request.accepted_media_type, self.get_renderer_context())
+
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+
+        content_encoding = None
+        if settings.CACHE_COMPRESS_RESPONSES and len(body) >= settings.CACHE_COMPRESSION_MIN_SIZE:
+            body = gzip_compress(body, compresslevel=settings.CACHE_COMPRESSION_LEVEL)
+            content_encoding = "gzip"
+
+        return {
+            "body": body,
+            "content_type": content_type,
+            "content_encoding": content_encoding,
+        }
+
+    def build_rendered_response(self, rendered_response):
+        body = rendered_response["body"]
+        content_encoding = rendered_response["content_encoding"]
+
+        if content_encoding == "gzip":
+            if not accepts_gzip_re.search(self.request.META.get("HTTP_ACCEPT_ENCODING", "")):
+                body = gzip_decompress(body)
+                content_encoding = None
+
+        response = HttpResponse(body, content_type=rendered_response["content_type"])
+        if content_encoding:
+            response["Content-Encoding"] = content_encoding
+        if settings.CACHE_COMPRESS_RESPONSES:
+            patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+    def compute_response(self, request, id=None):
+        if id:
+            return self.retrieve(request, id)
+        return self.list(request, id)
+
+    def measure_compute_response(self, request, id=None):
+        with measure("serialize", exclude_db=True):
+            return self.compute_response(request, id)
+
+    def compute_rendered_response(self, request, id=None):
+        data = self.measure_compute_response(request, id).data
+        rendered_response = self.render_response_data(data)
+        # Kept with the body so that cache hits can still name the row version.
+        rendered_response["row_version"] = self.get_row_version(data, id)
+        return rendered_response
+
+    def cached_get(self, request, id=None):
+        user_organization = self.request.user.organization
+
+        # Answered from the cached version counter alone, before any query or serialization.
+        current_etag = self.get_current_etag(request, id)
+        matching_etag = self.find_matching_etag(parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")), current_etag)
+        if matching_etag is not None:
+            # Echoes the client's tag, which may also name the row version.
+            response = HttpResponseNotModified()
+            response["ETag"] = matching_etag
+            return response
+
+        if self.get_cache_representation() == "json":
+            # Cache hits skip the renderer entirely and return the stored body.
+            cache_entry = self.get_or_compute_cache_entry(
+                user_organization.id,
+                request.query_params,
+                lambda: self.compute_rendered_response(request, id),
+                id
+            )
+            response = self.build_rendered_response(cache_entry["data"])
+            etag = self.generate_row_etag(cache_entry["etag"], cache_entry["data"].get("row_version", None))
+            return self.set_etag(response, etag)
+
+        cache_entry = self.get_or_compute_cache_entry(
+            user_organization.id,
+            request.query_params,
+            lambda: self.measure_compute_response(request, id).data,
+            id
+        )
+        etag = self.generate_row_etag(cache_entry["etag"], self.get_row_version(cache_entry["data"], id))
+        return self.set_etag(Response(cache_entry["data"]), etag)
+
+
+def idempotent(write):
+    # Marks a write handler of an IdempotencyMixin view.
+    @wraps(write)
+    def idempotent_write(self, request, *args, **kwargs):
+        return self.run_idempotent(request, lambda: write(self, request, *args, **kwargs))
+    return idempotent_write
+
+
+class IdempotencyMixin:
+    # Writes sent with an Idempotency-Key run once: their successful response
+    # is stored in Redis and replayed for retries of the same request without
+    # running the handler, and retries that arrive while the first one is
+    # still running wait for it behind a lock.
+    idempotency_header = "HTTP_IDEMPOTENCY_KEY"
+
+    def get_idempotency_key(self, request):
+        idempotency_key = request.META.get(self.idempotency_header, None)
+        if idempotency_key is None:
+            return None
+
+        if not idempotency_key or len(idempotency_key) > settings.IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError({
+                "Idempotency-Key": [f"Expected 1 to {settings.IDEMPOTENCY_KEY_MAX_LENGTH} characters."]
+            })
+        return idempotency_key
+
+    def generate_idempotency_cache_key(self, request, idempotency_key):
+        user = request.user
+        key_hash = sha1(idempotency_key.encode("utf-8")).hexdigest()
+        return f"{user.organization_id}__idempotency__{user.id}__{request.method}__{request.path}__{key_hash}"
+
+    def generate_idempotency_lock_cache_key(self, idempotency_cache_key):
+        return f"{idempotency_cache_key}__lock"
+
+    def generate_request_fingerprint(self, request):
+        canonical_data = json_dumps(request.data, sort_keys=True, default=str)
+        return sha1(canonical_data.encode("utf-8")).hexdigest()
+
+    def build_replayed_response(self, stored_response, fingerprint):
+        if stored_response["fingerprint"] != fingerprint:
+            raise IdempotencyKeyReused()
+
+        response = Response(stored_response["data"], status=stored_response["status"])
+        response["Idempotent-Replayed"] = "true"
+        return response
+
+    def wait_for_stored_response(self, idempotency_cache_key):
+        lock_cache_key = self.generate_idempotency_lock_cache_key(idempotency_cache_key)
+        deadline = time() + settings.IDEMPOTENCY_LOCK_WAIT_TIMEOUT
+
+        while time() < deadline:
+            sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+
+            cached_values = cache.get_many([idempotency_cache_key, lock_cache_key])
+            if idempotency_cache_key in cached_values:
+                return cached_values[idempotency_cache_key]
+            if lock_cache_key not in cached_values:
+                # The first request failed, so nothing was stored.
+                break
+
+        return None
+
+    def acquire_idempotency_lock(self, lock_cache_key):
+        return acquire_lock(lock_cache_key, settings.IDEMPOTENCY_LOCK_TIMEOUT)
+
+    def release_idempotency_lock(self, lock_cache_key, lock_token):
+        release_lock(lock_cache_key, lock_token)
+
+    def run_idempotent(self, request, write):
+        idempotency_key = self.get_idempotency_key(request)
+        if idempotency_key is None:
+            return write()
+
+        idempotency_cache_key = self.generate_idempotency_cache_key(request, idempotency_key)
+        lock_cache_key = self.generate_idempotency_lock_cache_key(idempotency_cache_key)
+        # Taken before the handler adds its own fields to request.data.
+        fingerprint = self.generate_request_fingerprint(request)
+
+        stored_response = cache.get(idempotency_cache_key, None)
+        if stored_response is not None:
+            return self.build_replayed_response(stored_response, fingerprint)
+
+        lock_token = self.acquire_idempotency_lock(lock_cache_key)
+        if lock_token is None:
+            stored_response = self.wait_for_stored_response(idempotency_cache_key)
+            if stored_response is None:
+                raise IdempotencyKeyInProgress()
+            return self.build_replayed_response(stored_response, fingerprint)
+
+        try:
+            # The previous holder may have stored its response and released
+            # the lock between the first read and the add.
+            stored_response = cache.get(idempotency_cache_key, None)
+            if stored_response is not None:
+                return self.build_replayed_response(stored_response, fingerprint)
+
+            response = write()
+            # Failures are not stored, so that a retry can still succeed.
+            if status.is_success(response.status_code):
+                cache.set(idempotency_cache_key, {
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "data": response.data,
+                }, settings.IDEMPOTENCY_KEY_TIMEOUT)
+            return response
+        finally:
+            self.release_idempotency_lock(lock_cache_key, lock_token)
+
+
+class ItemFilterMixin:
+    # Filters shared by every endpoint that reads an organization's items.
+    direct_filter_fields = [
+        "category",
+        "sub_category",
+        "stock_status",
+    ]
+    tag_filter_fields = [
+        "tags",
+        "usage_tags"
+    ]
+    range_filter_fields = [
+        "allocated_to_sales",
+        "allocated_to_builds",
+        "available_stock",
+        "incoming_stock",
+        "minimum_stock",
+        "desired_stock",
+        "on_build_order",
+        "can_build",
+        "cost",
+    ]
+
+    as_of_query_param = "as_of"
+
+    # Point-in-time reads; naive timestamps are in the server time zone.
+    def get_as_of(self):
+        value = self.request.query_params.get(self.as_of_query_param, None)
+        if value is None:
+            return None
+
+        try:
+            as_of = parse_datetime(value)
+        except ValueError:
+            as_of = None
+        if as_of is None:
+            raise ValidationError({self.as_of_query_param: ["Expected an ISO 8601 timestamp."]})
+
+        if timezone.is_naive(as_of):
+            as_of = timezone.make_aware(as_of)
+        return as_of
+
+    def has_item_filters(self):
+        params = self.request.query_params
+
+        filter_params = list(self.direct_filter_fields)
+        for filter_field in self.tag_filter_fields:
+            filter_params += [filter_field, f"{filter_field}__all", f"{filter_field}__any"]
+        for filter_field in self.range_filter_fields:
+            filter_params += [f"{filter_field}__{lookup}" for lookup in ("lt", "lte", "gt", "gte")]
+
+        return any(filter_param in params for filter_param in filter_params)
+
+    def filter_item_queryset(self, queryset):
+        queryset = queryset.filter(organization=self.request.user.organization)
+
+        params = self.request.query_params
+
+        for filter_field in self.direct_filter_fields:
+            if filter_field in params:
+                queryset = queryset.filter(**{filter_field: params[filter_field]})
+        
+        for filter_field in self.tag_filter_fields:
+            # "tags=a,b" and "tags__all=a,b" match items with every tag, "tags__any=a,b" with at least one.
+            if filter_field in params:
+                queryset = self.filter_by_tags(queryset, filter_field, params[filter_field], match_all=True)
+            elif f"{filter_field}__all" in params:
+                queryset = self.filter_by_tags(queryset, filter_field, params[f"{filter_field}__all"], match_all=True)
+
+            if f"{filter_field}__any" in params:
+                queryset = self.filter_by_tags(queryset, filter_field, params[f"{filter_field}__any"], match_all=False)
+        
+        for filter_field in self.range_filter_fields:
+            if f"{filter_field}__lte" in params:
+                queryset = queryset.filter(**{f"{filter_field}__lte": params[f"{filter_field}__lte"]})
+            elif f"{filter_field}__lt" in params:
+                queryset = queryset.filter(**{f"{filter_field}__lt": params[f"{filter_field}__lt"]})
+
+            if f"{filter_field}__gte" in params:
+                queryset = queryset.filter(**{f"{filter_field}__gte": params[f"{filter_field}__gte"]})
+            elif f"{filter_field}__gt" in params:
+                queryset = queryset.filter(**{f"{filter_field}__gt": params[f"{filter_field}__gt"]})
+        
+        return queryset
+
+    def filter_by_tags(self, queryset, filter_field, cs_values, match_all):
+        values = cs_values.replace(",", "%2c").split("%2c")
+        values = set(value.strip() for value in values if value.strip())
+        if len(values) == 0:
+            return queryset
+
+        tagged_item_ids = ItemTag.objects.filter(
+            organization=self.request.user.organization,
+            kind=filter_field,
+            name__in=values
+        ).values("item")
+
+        if match_all:
+            tagged_item_ids = tagged_item_ids.annotate(
+                num_matched_tags=Count("id")
+            ).filter(num_matched_tags=len(values))
+
+        return queryset.filter(id__in=tagged_item_ids.values("item"))
@@ -1,12 +1,28 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from json import loads as json_loads, dumps as json_dumps
 
 from django.contrib.auth.models import AbstractUser, PermissionsMixin
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
 from dashboard_api.model_managers import (
     CustomUserManager,
+    ItemDeletingManager,
+    ItemTagManager,
+    OrganizationManager,
+    StockMovementManager,
+)
+from dashboard_api.organization_config import (
+    invalidate_organization_config,
+)
+from dashboard_api.user_cache import (
+    invalidate_cached_users,
 )
 
 
@@ -15,6 +31,8 @@ class Organization(models.Model):
     roles = models.TextField(default=json_dumps(["admin"]))
     item_tags = models.TextField(default=json_dumps(["shopify", "xero"]))
     item_usage_tags = models.TextField(default=json_dumps(["assembly", "component", "purchasable", "saleable", "bundle"]))
+
+    objects = OrganizationManager()
     
     def clean(self):
         super().clean()
@@ -35,6 +53,16 @@ class Organization(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
+
+    # The organization's ledger is deleted with it, so its items need no
+    # "delete" movements.
+    @classmethod
+    def record_item_deletes(cls, queryset):
+        return item_deletes_recorded(Item.objects.filter(organization__in=queryset), record_movements=False)
+
+    def delete(self, *args, **kwargs):
+        with self.record_item_deletes(type(self).objects.filter(pk=self.pk)):
+            return super().delete(*args, **kwargs)
     
     def __str__(self):
         return self.name
@@ -60,8 +88,8 @@ class CustomUser(AbstractUser, PermissionsMixin):
     def clean(self):
         super().clean()
 
-        user_organization_roles = json_loads(self.organization.roles)
-        if self.role not in user_organization_roles:
+        organization_config = Organization.objects.get_config(self.organization_id)
+        if self.role not in organization_config.roles:
             raise ValidationError(f"User role ({self.role}) does not exist in the organization's roles.")
 
     def save(self, *args, **kwargs):
@@ -72,34 +100,93 @@ class CustomUser(AbstractUser, PermissionsMixin):
         return self.username
 
 
-class ItemCategory(models.Model):
+class StaleVersionError(Exception):
+    pass
+
+
+class VersionedModel(models.Model):
+    # Optimistic concurrency: an UPDATE or DELETE only applies while the row
+    # still has this instance's version, i.e. the version it was loaded with
+    # or the one the client said it last saw. No rows are locked.
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        abstract = True
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected_version = self.version
+
+        version_field = self._meta.get_field("version")
+        values = [value for value in values if value[0] is not version_field]
+        values.append((version_field, None, F("version") + 1))
+
+        updated = super()._do_update(
+            base_qs.filter(version=expected_version), using, pk_val, values, update_fields, forced_update
+        )
+        if updated:
+            self.version = expected_version + 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise StaleVersionError(f"{self._meta.object_name} {pk_val} is no longer at version {expected_version}.")
+        return updated
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Claims the row at the expected version before the cascade runs.
+            claimed = type(self)._base_manager.filter(pk=self.pk, version=self.version).update(version=F("version") + 1)
+            if not claimed:
+                raise StaleVersionError(f"{self._meta.object_name} {self.pk} is no longer at version {self.version}.")
+            return super().delete(*args, **kwargs)
+
+
+class ItemCategory(VersionedModel):
     name = models.CharField(max_length=255, blank=False)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=False)
 
+    objects = ItemDeletingManager()
+
     class Meta:
         unique_together = ('organization', 'name')
 
+    @classmethod
+    def record_item_deletes(cls, queryset):
+        return item_deletes_recorded(Item.objects.filter(category__in=queryset))
+
+    def delete(self, *args, **kwargs):
+        with self.record_item_deletes(type(self).objects.filter(pk=self.pk)):
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
-class ItemSubCategory(models.Model):
+class ItemSubCategory(VersionedModel):
     name = models.CharField(max_length=255)
     category = models.ForeignKey(ItemCategory, on_delete=models.CASCADE)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
 
+    objects = ItemDeletingManager()
+
     class Meta:
         unique_together = ('organization', 'category', 'name')
 
+    @classmethod
+    def record_item_deletes(cls, queryset):
+        return item_deletes_recorded(Item.objects.filter(sub_category__in=queryset))
+
+    def delete(self, *args, **kwargs):
+        with self.record_item_deletes(type(self).objects.filter(pk=self.pk)):
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
-class Item(models.Model):
+class Item(VersionedModel):
     name = models.CharField(max_length=255, blank=False)
     category = models.ForeignKey(ItemCategory, on_delete=models.CASCADE, blank=False)
     sub_category = models.ForeignKey(ItemSubCategory, on_delete=models.CASCADE, blank=False)
-    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=False)
+    # Indexed through the composite indexes in Meta, which all lead with it.
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=False, db_index=False)
 
     description = models.TextField(default="", blank=True)
     stock_keeping_unit = models.CharField(unique=True, max_length=255, blank=False)
@@ -123,12 +210,34 @@ class Item(models.Model):
     tags = models.TextField(default=json_dumps([]))
     usage_tags = models.TextField(default=json_dumps([]))
 
+    objects = ItemDeletingManager()
+
     class Meta:
         unique_together = ('organization', 'category', 'sub_category', 'name')
+        # Every ItemGenericAPIView query is scoped to an organization, so each
+        # index leads with it. Trailing "id" keeps the keyset pagination order
+        # in the index and makes COUNT(*) index-only.
+        indexes = [
+            models.Index(fields=['organization', 'id'], name='item_org_id_idx'),
+            models.Index(fields=['organization', 'category', 'id'], name='item_org_category_idx'),
+            models.Index(fields=['organization', 'sub_category', 'id'], name='item_org_subcategory_idx'),
+            models.Index(fields=['organization', 'stock_status', 'id'], name='item_org_status_idx'),
+            models.Index(fields=['organization', 'name', 'id'], name='item_org_name_idx'),
+            models.Index(fields=['organization', 'available_stock', 'id'], name='item_org_available_idx'),
+            models.Index(fields=['organization', 'cost', 'id'], name='item_org_cost_idx'),
+            # Most items have nothing incoming, so this stays small.
+            models.Index(
+                fields=['organization', 'incoming_stock'],
+                name='item_org_incoming_idx',
+                condition=models.Q(incoming_stock__gt=0)
+            ),
+        ]
 
     def clean(self):
         super().clean()
+        self.clean_tags()
 
+    def clean_tags(self, organization_config=None):
         json_list_fields = ["tags", "usage_tags"]
         for field_name in json_list_fields:
             try:
@@ -138,44 +247,252 @@ class Item(models.Model):
             except ValueError:
                 raise ValidationError(f"Invalid JSON format for \"{field_name}\".")
 
+        # Bulk paths pass the config they fetched once per batch.
+        if organization_config is None:
+            organization_config = Organization.objects.get_config(self.organization_id)
+
         if self.tags:
             item_tags = json_loads(self.tags)
-            organization_item_tags = json_loads(self.organization.item_tags)
-            undefined_item_tags = []
+            undefined_item_tags = set(item_tags) - organization_config.item_tags
 
-            for tag in item_tags:
-                if not tag in organization_item_tags:
-                    undefined_item_tags.append(tag)
-            
             if len(undefined_item_tags) > 0:
                 raise ValidationError(
-                    f"Tags {', '.join(undefined_item_tags)} are "
+                    f"Tags {', '.join(tag for tag in item_tags if tag in undefined_item_tags)} are "
                     "not defined in the item's organization."
                 )
         
         if self.usage_tags:
             item_usage_tags = json_loads(self.usage_tags)
-            organization_usage_tags = json_loads(self.organization.item_usage_tags)
-            undefined_usage_tags = []
-
-            for tag in item_usage_tags:
-                if not tag in organization_usage_tags:
-                    undefined_usage_tags.append(tag)
+            undefined_usage_tags = set(item_usage_tags) - organization_config.item_usage_tags
 
             if len(undefined_usage_tags) > 0:
                 raise ValidationError(
-                    f"Usage tags {', '.join(undefined_usage_tags)} are "
+                    f"Usage tags {', '.join(tag for tag in item_usage_tags if tag in undefined_usage_tags)} are "
                     "not defined in the item's organization."
                 )
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        item = super().from_db(db, field_names, values)
+        # Remembered so that save() can record what changed in the ledger.
+        # Deferred fields are left alone rather than loaded one by one.
+        if all(field_name in field_names for field_name in StockMovement.ledger_field_names):
+            item._loaded_ledger_values = item.get_ledger_values()
+        return item
+
+    def get_ledger_values(self):
+        return {
+            field_name: getattr(self, field_name)
+            for field_name in StockMovement.ledger_field_names
+        }
+
+    def get_stored_ledger_values(self):
+        if self._state.adding:
+            return {}
+
+        loaded_ledger_values = getattr(self, "_loaded_ledger_values", None)
+        if loaded_ledger_values is None:
+            loaded_ledger_values = Item.objects.filter(pk=self.pk).values(*StockMovement.ledger_field_names).first()
+
+        return loaded_ledger_values or {}
+
+    # Only queryset deletes; a single Item.delete() is left to the pre_delete
+    # receiver.
+    @classmethod
+    def record_item_deletes(cls, queryset):
+        return item_deletes_recorded(queryset)
+
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        reason = "create" if self._state.adding else "update"
+
+        with transaction.atomic():
+            stored_ledger_values = self.get_stored_ledger_values()
+            super().save(*args, **kwargs)
+            ItemTag.objects.sync_for_items([self])
+
+            ledger_values = self.get_ledger_values()
+            StockMovement.objects.record([
+                StockMovement.objects.build_for_values(self.id, self.organization_id, stored_ledger_values, ledger_values, reason)
+            ])
+
+        self._loaded_ledger_values = ledger_values
+
+    def __str__(self):
+        return self.name
+
+
+class ItemTag(models.Model):
+    # Normalized copy of Item.tags / Item.usage_tags, one row per tag, so that
+    # tag filters are index lookups instead of LIKE scans over JSON text.
+    KIND_CHOICES = [
+        ("tags", "Tag"),
+        ("usage_tags", "Usage Tag"),
+    ]
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255)
+
+    objects = ItemTagManager()
+
+    class Meta:
+        unique_together = ('item', 'kind', 'name')
+        indexes = [
+            models.Index(fields=['organization', 'kind', 'name', 'item'], name='itemtag_org_kind_name_item'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class StockMovement(models.Model):
+    # Append-only ledger of changes to an item's quantities, one signed delta
+    # column per quantity, plus the new unit cost when it changed. It outlives
+    # deleted items (their last movement zeroes them), so the item relation is
+    # not enforced or cascaded.
+    REASON_CHOICES = [
+        ("create", "Create"),
+        ("update", "Update"),
+        ("delete", "Delete"),
+        ("adjustment", "Adjustment"),
+        ("import", "Import"),
+    ]
+
+    quantity_field_names = [
+        "allocated_to_sales",
+        "allocated_to_builds",
+        "available_stock",
+        "incoming_stock",
+        "on_build_order",
+        "can_build",
+    ]
+    ledger_field_names = quantity_field_names + ["cost"]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, db_index=False)
+    item = models.ForeignKey(Item, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False)
+    reason = models.CharField(max_length=16, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    allocated_to_sales = models.IntegerField(default=0)
+    allocated_to_builds = models.IntegerField(default=0)
+    available_stock = models.IntegerField(default=0)
+    incoming_stock = models.IntegerField(default=0)
+    on_build_order = models.IntegerField(default=0)
+    can_build = models.IntegerField(default=0)
+
+    cost = models.DecimalField(max_digits=19, decimal_places=4, null=True, blank=True)
+
+    objects = StockMovementManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'item', 'created_at'], name='stockmovement_org_item_time'),
+            # Organization-wide tails and retention.
+            models.Index(fields=['organization', 'created_at'], name='stockmovement_org_time'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    # Quantities and unit cost of every item of an organization at taken_at,
+    # written as one batch so that "stock at T" is the latest batch before T
+    # plus the movements after it. Batches read from the items record the
+    # last movement they include, and the movements after it are those with
+    # a greater id; batches folded from the ledger leave it empty and are
+    # followed by the movements created after taken_at.
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, db_index=False)
+    item = models.ForeignKey(Item, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False)
+    taken_at = models.DateTimeField()
+    last_movement_id = models.BigIntegerField(null=True, blank=True)
+
+    allocated_to_sales = models.IntegerField(default=0)
+    allocated_to_builds = models.IntegerField(default=0)
+    available_stock = models.IntegerField(default=0)
+    incoming_stock = models.IntegerField(default=0)
+    on_build_order = models.IntegerField(default=0)
+    can_build = models.IntegerField(default=0)
+
+    cost = models.DecimalField(max_digits=19, decimal_places=4, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'taken_at', 'item'], name='stocksnapshot_org_time_item'),
+            models.Index(fields=['organization', 'item', 'taken_at'], name='stocksnapshot_org_item_time'),
+        ]
+
+
+_items_with_recorded_deletes = ContextVar("items_with_recorded_deletes", default=frozenset())
+
+
+# For delete paths that record the "delete" movements of their items in bulk
+# before deleting them.
+@contextmanager
+def delete_movements_recorded(item_ids):
+    token = _items_with_recorded_deletes.set(_items_with_recorded_deletes.get() | frozenset(item_ids))
+    try:
+        yield
+    finally:
+        _items_with_recorded_deletes.reset(token)
+
+
+# Records the "delete" movements of the items about to be deleted with one
+# query and one insert, and opens the transaction the delete must run in.
+@contextmanager
+def item_deletes_recorded(items, record_movements=True):
+    with transaction.atomic():
+        if record_movements:
+            item_rows = list(items.order_by().values("id", "organization_id", *StockMovement.quantity_field_names))
+            StockMovement.objects.record(
+                StockMovement.objects.build_for_values(item_row["id"], item_row["organization_id"], item_row, {}, "delete")
+                for item_row in item_rows
+            )
+            item_ids = [item_row["id"] for item_row in item_rows]
+        else:
+            item_ids = items.values_list("id", flat=True)
+
+        with delete_movements_recorded(item_ids):
+            yield
+
+
+# Every deleted item leaves a "delete" movement, however it was deleted.
+# Queryset deletes and deletes of categories, subcategories and organizations
+# record theirs in bulk beforehand (see item_deletes_recorded), so this only
+# writes for a single Item.delete() and for deletes made through
+# _base_manager. Runs inside the deletion's transaction.
+@receiver(pre_delete, sender=Item)
+def record_item_delete_movement(sender, instance, **kwargs):
+    if instance.id in _items_with_recorded_deletes.get():
+        return
+
+    StockMovement.objects.record([
+        StockMovement.objects.build_for_values(
+            instance.id, instance.organization_id, instance.get_stored_ledger_values(), {}, "delete"
+        )
+    ])
+
+
+# Cached configs and users are dropped on every save and delete, including
+# queryset and admin deletes and cascades; update() is covered by the
+# managers' querysets.
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_organization_caches(sender, instance, **kwargs):
+    # Nothing can be cached yet for a new organization.
+    if kwargs.get("created", False):
+        return
+
+    invalidate_organization_config(instance.id)
+    # Users deleted along with the organization invalidate themselves.
+    invalidate_cached_users(CustomUser.objects.filter(organization_id=instance.id).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_cached_users([instance.id])
+
+
 # class SalesOrder(models.Model):
 #     customer_id = models.CharField(max_length=255, blank=False)
 #     priority = models.IntegerField(default=0, blank=False, validators=[MinValueValidator(0)])
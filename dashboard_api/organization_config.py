@@ -0,0 +1,79 @@
+from json import loads as json_loads
+from time import time
+
+from django.conf import settings
+
+from dashboard_api.local_cache import (
+    get_shared_cache,
+)
+
+
+# An organization's roles and tag lists, parsed once from their JSON columns.
+class OrganizationConfig:
+    def __init__(self, organization_id, roles, item_tags, item_usage_tags):
+        self.organization_id = organization_id
+        self.roles = frozenset(roles)
+        self.item_tags = frozenset(item_tags)
+        self.item_usage_tags = frozenset(item_usage_tags)
+
+    @classmethod
+    def from_organization(cls, organization):
+        return cls(
+            organization.id,
+            json_loads(organization.roles),
+            json_loads(organization.item_tags),
+            json_loads(organization.item_usage_tags)
+        )
+
+
+def generate_organization_config_version_cache_key(organization_id):
+    return f"{organization_id}__organization_config__version"
+
+
+def generate_organization_config_cache_key(organization_id):
+    return f"{organization_id}__organization_config"
+
+
+def get_organization_config_cache():
+    return get_shared_cache()
+
+
+# A config is cached with the organization's config version read before the
+# organization was, and only served while that version is still current.
+# Invalidation bumps the version rather than deleting the config, so a fill
+# that read the organization before a concurrent update cannot bring the
+# stale config back. Both keys are read in one round trip; returns the
+# cached config (or None) and the current version.
+def get_cached_organization_config(organization_id):
+    version_cache_key = generate_organization_config_version_cache_key(organization_id)
+    config_cache_key = generate_organization_config_cache_key(organization_id)
+
+    cached_values = get_organization_config_cache().get_many([version_cache_key, config_cache_key])
+    version = cached_values.get(version_cache_key, None)
+    cached_entry = cached_values.get(config_cache_key, None)
+
+    if cached_entry is not None and cached_entry[0] == version:
+        return cached_entry[1], version
+    return None, version
+
+
+def set_cached_organization_config(organization_id, version, organization_config):
+    get_organization_config_cache().set(
+        generate_organization_config_cache_key(organization_id),
+        (version, organization_config),
+        settings.ORGANIZATION_CONFIG_CACHE_TIMEOUT
+    )
+
+
+def invalidate_organization_config(organization_id):
+    config_cache = get_organization_config_cache()
+    version_cache_key = generate_organization_config_version_cache_key(organization_id)
+
+    try:
+        config_cache.incr(version_cache_key)
+    except ValueError:
+        # Configs cached before the organization had a version stop matching
+        # once it has one. Seeded from the clock so that a counter lost to
+        # eviction never restarts at a version that may still be cached.
+        if not config_cache.add(version_cache_key, int(time() * 1000), timeout=None):
+            config_cache.incr(version_cache_key)
@@ -0,0 +1,170 @@
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from urllib.parse import parse_qs, urlencode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Position of the last (or, going backwards, first) row of a page: its value
+# of the ordering field and its id.
+KeysetCursor = namedtuple("KeysetCursor", ["reverse", "ordering", "value", "id"])
+
+
+class ItemCursorPagination(CursorPagination):
+    # Keyset pagination over (organization, ordering field, id): pages are
+    # fetched with WHERE field > v OR (field = v AND id > last id) instead of
+    # an OFFSET scan, so ties on the ordering field cannot stall paging, and
+    # no COUNT(*) is issued unless the client asks for it.
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    ordering = ("id",)
+    ordering_query_param = "ordering"
+    # Only fields with an (organization, field, id) index or a unique index,
+    # so that every page is an index range scan.
+    ordering_fields = [
+        "id",
+        "name",
+        "stock_keeping_unit",
+        "available_stock",
+        "cost",
+    ]
+
+    count_query_param = "include_count"
+
+    def is_requested(self, request):
+        # Unpaginated lists stay the default so existing clients keep working.
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, "").lower() in ("1", "true"):
+            self.count = queryset.count()
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request, queryset)
+        reverse = cursor is not None and cursor.reverse
+
+        ordering = self.reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.build_position_filter(ordering, cursor))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_page = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following_page
+        else:
+            self.has_next = has_following_page
+            self.has_previous = cursor is not None
+
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering_field = request.query_params.get(self.ordering_query_param, None)
+        if not ordering_field or ordering_field.lstrip("-") not in self.ordering_fields:
+            return self.ordering
+
+        if ordering_field.lstrip("-") == "id":
+            return (ordering_field,)
+
+        # Break ties on the primary key so that the page order is stable.
+        id_ordering = "-id" if ordering_field.startswith("-") else "id"
+        return (ordering_field, id_ordering)
+
+    def reverse_ordering(self, ordering):
+        return tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+
+    def build_position_filter(self, ordering, cursor):
+        comparisons = [(field.lstrip("-"), "lt" if field.startswith("-") else "gt") for field in ordering]
+
+        id_field, id_comparison = comparisons[-1]
+        position_filter = Q(**{f"{id_field}__{id_comparison}": cursor.id})
+        if len(comparisons) == 2:
+            field, comparison = comparisons[0]
+            position_filter = Q(**{f"{field}__{comparison}": cursor.value}) | (
+                Q(**{field: cursor.value}) & position_filter
+            )
+        return position_filter
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param, None)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = parse_qs(b64decode(encoded.encode("ascii")).decode("ascii"), keep_blank_values=True)
+            cursor = KeysetCursor(
+                reverse=tokens.get("r", ["0"])[0] == "1",
+                ordering=tokens["o"][0],
+                value=tokens.get("v", [None])[0],
+                id=int(tokens["i"][0]),
+            )
+
+            # A cursor only makes sense under the ordering it was issued for.
+            if cursor.ordering != self.ordering[0]:
+                raise ValueError("Cursor ordering mismatch.")
+
+            # Positions are cleaned like the fields they compare to, so that a
+            # forged cursor cannot reach the database with a value it rejects.
+            model_meta = queryset.model._meta
+            cursor = cursor._replace(id=model_meta.pk.clean(cursor.id, None))
+            if len(self.ordering) == 2:
+                ordering_field = model_meta.get_field(cursor.ordering.lstrip("-"))
+                cursor = cursor._replace(value=ordering_field.clean(cursor.value, None))
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor
+
+    def encode_cursor(self, reverse, instance):
+        tokens = {"o": self.ordering[0], "i": str(instance.id)}
+        if reverse:
+            tokens["r"] = "1"
+        if len(self.ordering) == 2:
+            tokens["v"] = str(getattr(instance, self.ordering[0].lstrip("-")))
+
+        encoded = b64encode(urlencode(tokens).encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or len(self.page) == 0:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or len(self.page) == 0:
+            return None
+        return self.encode_cursor(True, self.page[0])
+
+    def get_paginated_response(self, data):
+        response_data = {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+        if self.count is not None:
+            response_data["count"] = self.count
+
+        return Response(response_data)
@@ -0,0 +1,31 @@
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from dashboard_api.renderers import (
+    FastJSONRenderer,
+    orjson,
+)
+
+
+# JSONParser on orjson, which also rejects NaN and infinities. Bodies orjson
+# rejects are parsed again by JSONParser, so clients get the same
+# ParseError messages; it is also used when orjson is not installed.
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        body = stream.read()
+        try:
+            if encoding.lower().replace("-", "") != "utf8":
+                return orjson.loads(body.decode(encoding))
+            return orjson.loads(body)
+        except (orjson.JSONDecodeError, UnicodeDecodeError):
+            return super().parse(BytesIO(body), media_type, parser_context)
@@ -0,0 +1,271 @@
+from functools import lru_cache
+from hashlib import sha1
+from os import getpid
+from queue import Empty, Full, Queue
+from re import compile as re_compile
+from threading import Lock, Thread
+from time import monotonic, perf_counter, sleep
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from dashboard_api.metrics import (
+    record_redis_error,
+)
+
+
+string_literal_re = re_compile(r"'(?:[^']|'')*'")
+number_re = re_compile(r"\b\d+(?:\.\d+)?\b")
+placeholder_list_re = re_compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+repeated_list_re = re_compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+whitespace_re = re_compile(r"\s+")
+
+QUERY_STATS_FINGERPRINTS_KEY = "query_stats__fingerprints"
+
+
+# Reduces a statement to its shape: literals and placeholders become ?, and
+# IN lists and multi-row VALUES of any length become (...). Django reuses the
+# same SQL string for the same shape, so results are memoized.
+@lru_cache(maxsize=4096)
+def fingerprint_sql(sql):
+    normalized_sql = string_literal_re.sub("?", sql).replace("%s", "?")
+    normalized_sql = number_re.sub("?", normalized_sql)
+    normalized_sql = placeholder_list_re.sub("(...)", normalized_sql)
+    normalized_sql = repeated_list_re.sub("(...)", normalized_sql)
+    normalized_sql = whitespace_re.sub(" ", normalized_sql).strip()
+    return sha1(normalized_sql.encode("utf-8")).hexdigest()[:16], normalized_sql
+
+
+# Only reads are explained; EXPLAIN of a write is not guaranteed to be free
+# of side effects on every backend.
+def is_explainable(sql):
+    return sql.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+def generate_query_stats_key(fingerprint):
+    return f"query_stats__{fingerprint}"
+
+
+def generate_explain_lock_key(fingerprint):
+    return f"query_stats__{fingerprint}__explain_lock"
+
+
+def explain_query(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+# Per-process count, total time and slow count per fingerprint, pushed to
+# Redis every QUERY_STATS_FLUSH_INTERVAL. Slow reads are queued for an
+# EXPLAIN that a background thread runs on its own connection, at most once
+# per fingerprint every QUERY_STATS_EXPLAIN_INTERVAL across all processes.
+class QueryStats:
+    def __init__(self):
+        self._lock = Lock()
+        self._stats = {}
+        self._explain_requested_at = {}
+        self.explain_queue = Queue(maxsize=settings.QUERY_STATS_EXPLAIN_QUEUE_SIZE)
+
+    def record(self, alias, sql, params, many, duration_ms, url_name):
+        fingerprint, normalized_sql = fingerprint_sql(sql)
+        is_slow = duration_ms >= settings.QUERY_STATS_SLOW_THRESHOLD_MS
+
+        with self._lock:
+            # [sql, count, total_ms, slow_count, url_name]
+            stats = self._stats.get(fingerprint, None)
+            if stats is None:
+                stats = self._stats[fingerprint] = [normalized_sql, 0, 0.0, 0, url_name]
+            stats[1] += 1
+            stats[2] += duration_ms
+            stats[3] += is_slow
+            if url_name is not None:
+                stats[4] = url_name
+
+        if is_slow and not many and is_explainable(sql):
+            self.request_explain(fingerprint, normalized_sql, alias, sql, params, duration_ms)
+
+    def request_explain(self, fingerprint, normalized_sql, alias, sql, params, duration_ms):
+        now = monotonic()
+        requested_at = self._explain_requested_at.get(fingerprint, None)
+        if requested_at is not None and now - requested_at < settings.QUERY_STATS_EXPLAIN_INTERVAL:
+            return
+        self._explain_requested_at[fingerprint] = now
+
+        try:
+            self.explain_queue.put_nowait((fingerprint, normalized_sql, alias, sql, params, duration_ms))
+        except Full:
+            pass
+
+    def pop_stats(self):
+        with self._lock:
+            stats, self._stats = self._stats, {}
+        return stats
+
+    def flush(self):
+        stats = self.pop_stats()
+        if len(stats) == 0:
+            return
+
+        try:
+            pipeline = get_redis_connection("default").pipeline(transaction=False)
+            for fingerprint, (normalized_sql, count, total_ms, slow_count, url_name) in stats.items():
+                query_stats_key = generate_query_stats_key(fingerprint)
+                pipeline.sadd(QUERY_STATS_FINGERPRINTS_KEY, fingerprint)
+                pipeline.hset(query_stats_key, mapping={"sql": normalized_sql, "url_name": url_name or ""})
+                pipeline.hincrby(query_stats_key, "count", count)
+                pipeline.hincrbyfloat(query_stats_key, "total_ms", total_ms)
+                pipeline.hincrby(query_stats_key, "slow_count", slow_count)
+            pipeline.execute()
+        except RedisError:
+            record_redis_error("query_stats")
+
+    def explain_next(self, block=True):
+        try:
+            fingerprint, normalized_sql, alias, sql, params, duration_ms = self.explain_queue.get(block=block)
+        except Empty:
+            return False
+
+        try:
+            redis_connection = get_redis_connection("default")
+            if not redis_connection.set(
+                generate_explain_lock_key(fingerprint), 1, nx=True, ex=settings.QUERY_STATS_EXPLAIN_INTERVAL
+            ):
+                return True
+
+            plan = explain_query(connections[alias], sql, params)
+            redis_connection.sadd(QUERY_STATS_FINGERPRINTS_KEY, fingerprint)
+            redis_connection.hset(generate_query_stats_key(fingerprint), mapping={
+                "sql": normalized_sql,
+                "plan": plan,
+                "plan_duration_ms": duration_ms,
+                "explained_at": timezone.now().isoformat(),
+            })
+        except RedisError:
+            record_redis_error("query_stats")
+        except Exception:
+            # The statement may not survive a replay (e.g. its temporary
+            # table is gone); the next slow run tries again.
+            pass
+
+        return True
+
+    def explain_pending(self):
+        while self.explain_next(block=False):
+            pass
+
+
+# Installed with connection.execute_wrapper() for the duration of a request.
+class QueryStatsRecorder:
+    def __init__(self, query_stats, alias, request):
+        self.query_stats = query_stats
+        self.alias = alias
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        start_time = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (perf_counter() - start_time) * 1000
+            resolver_match = getattr(self.request, "resolver_match", None)
+            url_name = resolver_match.url_name if resolver_match else None
+            self.query_stats.record(self.alias, sql, params, many, duration_ms, url_name)
+
+
+class QueryStatsFlusher(Thread):
+    def __init__(self, query_stats, interval):
+        super().__init__(name="query-stats-flusher", daemon=True)
+        self.query_stats = query_stats
+        self.interval = interval
+
+    def run(self):
+        while True:
+            sleep(self.interval)
+            self.query_stats.flush()
+
+
+class QueryExplainer(Thread):
+    def __init__(self, query_stats):
+        super().__init__(name="query-explainer", daemon=True)
+        self.query_stats = query_stats
+
+    def run(self):
+        while True:
+            self.query_stats.explain_next()
+
+            # Request threads get this from request_finished.
+            for connection in connections.all(initialized_only=True):
+                connection.close_if_unusable_or_obsolete()
+
+
+_query_stats = None
+_query_stats_pid = None
+_query_stats_lock = Lock()
+
+
+def get_query_stats():
+    global _query_stats, _query_stats_pid
+
+    # Pre-fork servers import this module before forking, so each worker
+    # process starts its own stats and threads.
+    if _query_stats is not None and _query_stats_pid == getpid():
+        return _query_stats
+
+    with _query_stats_lock:
+        if _query_stats is None or _query_stats_pid != getpid():
+            query_stats = QueryStats()
+
+            QueryStatsFlusher(query_stats, settings.QUERY_STATS_FLUSH_INTERVAL).start()
+            QueryExplainer(query_stats).start()
+
+            _query_stats = query_stats
+            _query_stats_pid = getpid()
+
+    return _query_stats
+
+
+# The flushed stats of all processes, most expensive first.
+def load_query_stats(sort_by="total_ms"):
+    redis_connection = get_redis_connection("default")
+    fingerprints = sorted(fingerprint.decode("utf-8") for fingerprint in redis_connection.smembers(QUERY_STATS_FINGERPRINTS_KEY))
+
+    pipeline = redis_connection.pipeline(transaction=False)
+    for fingerprint in fingerprints:
+        pipeline.hgetall(generate_query_stats_key(fingerprint))
+
+    query_stats = []
+    for fingerprint, fields in zip(fingerprints, pipeline.execute()):
+        fields = {name.decode("utf-8"): value.decode("utf-8") for name, value in fields.items()}
+        count = int(fields.get("count", 0))
+        total_ms = float(fields.get("total_ms", 0))
+        query_stats.append({
+            "fingerprint": fingerprint,
+            "sql": fields.get("sql", ""),
+            "url_name": fields.get("url_name", ""),
+            "count": count,
+            "total_ms": total_ms,
+            "mean_ms": total_ms / count if count else 0.0,
+            "slow_count": int(fields.get("slow_count", 0)),
+            "plan": fields.get("plan", None),
+            "plan_duration_ms": float(fields["plan_duration_ms"]) if "plan_duration_ms" in fields else None,
+            "explained_at": fields.get("explained_at", None),
+        })
+
+    return sorted(query_stats, key=lambda stats: stats[sort_by], reverse=True)
+
+
+def reset_query_stats():
+    redis_connection = get_redis_connection("default")
+    fingerprints = [fingerprint.decode("utf-8") for fingerprint in redis_connection.smembers(QUERY_STATS_FINGERPRINTS_KEY)]
+
+    pipeline = redis_connection.pipeline(transaction=False)
+    for fingerprint in fingerprints:
+        pipeline.delete(generate_query_stats_key(fingerprint), generate_explain_lock_key(fingerprint))
+    pipeline.delete(QUERY_STATS_FINGERPRINTS_KEY)
+    pipeline.execute()
+
+    return len(fingerprints)
@@ -0,0 +1,55 @@
+from math import isfinite
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+json_encoder = JSONEncoder()
+
+
+# JSONRenderer on orjson, which serializes datetimes, UUIDs and dict/list
+# subclasses natively; Decimals, lazy strings and the rest go through DRF's
+# own encoder, so the output matches JSONRenderer's. Falls back to
+# JSONRenderer when orjson is not installed, for indented output and
+# non-compact or ASCII-only settings, and for values orjson rejects (e.g.
+# integers beyond 64 bits, or a NaN or infinite Decimal under STRICT_JSON,
+# which then fails as it does in JSONRenderer). The one difference: orjson
+# renders NaN and infinite Python floats as null, since finding them would
+# mean walking the whole response.
+class FastJSONRenderer(JSONRenderer):
+    def can_render_fast(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        )
+
+    def encode_default(self, value):
+        encoded = json_encoder.default(value)
+        if self.strict and type(encoded) is float and not isfinite(encoded):
+            raise ValueError("Out of range float values are not JSON compliant")
+        return encoded
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if not self.can_render_fast(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            body = orjson.dumps(data, default=self.encode_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same as JSONRenderer: keep the output a strict JavaScript subset.
+        if b"\xe2\x80\xa8" in body or b"\xe2\x80\xa9" in body:
+            body = body.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return body
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+
+_current_request_timings = ContextVar("request_timings", default=None)
+
+
+# Where the time of one sampled request went. Durations are in seconds and
+# keyed by phase: "auth", "db", "cache", "serialize" and "render".
+class RequestTimings:
+    server_timing_descriptions = {
+        "auth": "JWT authentication",
+        "serialize": "queryset and serializer, excluding db",
+        "render": "renderer",
+    }
+
+    def __init__(self, max_captured_queries):
+        self.durations = {}
+        self.num_queries = 0
+        self.num_cache_hits = 0
+        self.num_cache_misses = 0
+        self.max_captured_queries = max_captured_queries
+        self.captured_queries = []
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+
+    def get(self, name):
+        return self.durations.get(name, 0.0)
+
+    # connection.execute_wrapper() hook.
+    def record_query(self, execute, sql, params, many, context):
+        start_time = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start_time
+            self.num_queries += 1
+            self.add("db", duration)
+            if len(self.captured_queries) < self.max_captured_queries:
+                self.captured_queries.append((sql, duration))
+
+    def record_cache_lookup(self, hit, duration):
+        if hit:
+            self.num_cache_hits += 1
+        else:
+            self.num_cache_misses += 1
+        self.add("cache", duration)
+
+    def format_server_timing(self, total_duration):
+        metrics = [
+            f'db;dur={self.get("db") * 1000:.1f};desc="{self.num_queries} queries"',
+            f'cache;dur={self.get("cache") * 1000:.1f};desc="{self.num_cache_hits} hits, {self.num_cache_misses} misses"',
+        ]
+        for name, description in self.server_timing_descriptions.items():
+            if name in self.durations:
+                metrics.append(f'{name};dur={self.get(name) * 1000:.1f};desc="{description}"')
+        metrics.append(f"total;dur={total_duration * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def as_log_fields(self):
+        return {
+            "db_queries": self.num_queries,
+            "cache_hits": self.num_cache_hits,
+            "cache_misses": self.num_cache_misses,
+            **{f"{name}_ms": round(duration * 1000, 3) for name, duration in sorted(self.durations.items())},
+        }
+
+
+def get_request_timings():
+    return _current_request_timings.get()
+
+
+def set_request_timings(request_timings):
+    return _current_request_timings.set(request_timings)
+
+
+def reset_request_timings(token):
+    _current_request_timings.reset(token)
+
+
+# Adds the block's duration to the current request's timings, if it is
+# sampled. With exclude_db, queries run inside the block are not counted
+# twice.
+@contextmanager
+def measure(name, exclude_db=False):
+    request_timings = get_request_timings()
+    if request_timings is None:
+        yield
+        return
+
+    start_time = perf_counter()
+    start_db_duration = request_timings.get("db")
+    try:
+        yield
+    finally:
+        duration = perf_counter() - start_time
+        if exclude_db:
+            duration -= request_timings.get("db") - start_db_duration
+        request_timings.add(name, duration)
+
+
+def record_cache_lookup(hit, duration):
+    request_timings = get_request_timings()
+    if request_timings is not None:
+        request_timings.record_cache_lookup(hit, duration)
@@ -64,3 +64,38 @@ class ItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = '__all__'
+
+
+class ItemBulkCreateSerializer(serializers.ModelSerializer):
+    # Relations and uniqueness are checked once per batch by ItemBatchValidator,
+    # so this serializer only validates field values and runs no queries.
+    category = serializers.IntegerField()
+    sub_category = serializers.IntegerField()
+
+    class Meta:
+        model = Item
+        exclude = ('id', 'organization', 'version')
+        extra_kwargs = {
+            'stock_keeping_unit': {'validators': []},
+        }
+        validators = []
+
+
+class ItemStockAdjustmentSerializer(serializers.Serializer):
+    # Signed deltas, applied in the database; floors are enforced there too.
+    id = serializers.IntegerField()
+
+    allocated_to_sales = serializers.IntegerField(required=False)
+    allocated_to_builds = serializers.IntegerField(required=False)
+    available_stock = serializers.IntegerField(required=False)
+    incoming_stock = serializers.IntegerField(required=False)
+    minimum_stock = serializers.IntegerField(required=False)
+    desired_stock = serializers.IntegerField(required=False)
+    on_build_order = serializers.IntegerField(required=False)
+    can_build = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if len(data) < 2:
+            raise serializers.ValidationError('At least one stock delta is required')
+
+        return data
@@ -0,0 +1,303 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from dashboard_api.bulk_operations import (
+    iter_chunked,
+)
+from dashboard_api.models import (
+    Item,
+    Organization,
+    StockMovement,
+    StockSnapshot,
+)
+
+
+# (taken_at, last_movement_id) of the latest snapshot batch before as_of.
+def get_latest_snapshot(organization_id, as_of):
+    return StockSnapshot.objects.filter(
+        organization_id=organization_id,
+        taken_at__lte=as_of
+    ).order_by("-taken_at").values_list("taken_at", "last_movement_id").first()
+
+
+def get_ledger_querysets(organization_id, as_of, item_ids=None):
+    snapshots = StockSnapshot.objects.filter(organization_id=organization_id)
+    movements = StockMovement.objects.filter(organization_id=organization_id, created_at__lte=as_of)
+    if item_ids is not None:
+        snapshots = snapshots.filter(item_id__in=item_ids)
+        movements = movements.filter(item_id__in=item_ids)
+
+    latest_snapshot = get_latest_snapshot(organization_id, as_of)
+    if latest_snapshot is None:
+        return snapshots.none(), movements
+
+    snapshot_time, last_movement_id = latest_snapshot
+    if last_movement_id is None:
+        return snapshots.filter(taken_at=snapshot_time), movements.filter(created_at__gt=snapshot_time)
+
+    # A movement created before the snapshot but committed after it is not
+    # in the snapshot, and has a greater id than any movement that is.
+    return snapshots.filter(taken_at=snapshot_time), movements.filter(id__gt=last_movement_id)
+
+
+# Matches the items that the ledger knows at as_of, i.e. that had been
+# created (and snapshotted or moved) by then.
+def get_items_known_at(organization_id, as_of):
+    snapshots, movements = get_ledger_querysets(organization_id, as_of)
+    return Q(id__in=snapshots.values("item_id")) | Q(id__in=movements.values("item_id"))
+
+
+# Quantities and unit cost of an organization's items at as_of:
+# {item id: {field: value}}. Starts from the latest snapshot batch before
+# as_of and adds the movements after it, so the work is bounded by the
+# snapshot interval, not by the length of the history.
+def get_stock_as_of(organization_id, as_of, item_ids=None):
+    snapshots, movements = get_ledger_querysets(organization_id, as_of, item_ids)
+
+    ledger_values = {}
+    for snapshot in snapshots.values("item_id", *StockMovement.ledger_field_names).iterator():
+        ledger_values[snapshot.pop("item_id")] = snapshot
+
+    # Aliased because annotations cannot shadow model fields.
+    movement_totals = movements.values("item_id").annotate(**{
+        f"total_{field_name}": Sum(field_name) for field_name in StockMovement.quantity_field_names
+    }).order_by()
+
+    for movement_total in movement_totals.iterator():
+        item_ledger_values = ledger_values.setdefault(movement_total["item_id"], {
+            **{field_name: 0 for field_name in StockMovement.quantity_field_names},
+            "cost": None,
+        })
+        for field_name in StockMovement.quantity_field_names:
+            item_ledger_values[field_name] += movement_total[f"total_{field_name}"]
+
+    # The last cost recorded after the snapshot wins.
+    latest_cost_movement_ids = movements.filter(cost__isnull=False).values("item_id").annotate(
+        latest_id=Max("id")
+    ).values("latest_id")
+    for item_id, cost in StockMovement.objects.filter(id__in=latest_cost_movement_ids).values_list("item_id", "cost"):
+        ledger_values[item_id]["cost"] = cost
+
+    return ledger_values
+
+
+def format_valuation(num_items_in_stock, total_available_stock, total_value):
+    return {
+        'num_items_in_stock': num_items_in_stock,
+        'total_available_stock': total_available_stock or 0,
+        'total_value': str(Decimal(total_value or 0).quantize(Decimal("0.0001"))),
+    }
+
+
+# Inventory value (cost * available_stock) of the organization's items now.
+def get_current_valuation(organization_id):
+    valuation = Item.objects.filter(organization_id=organization_id).aggregate(
+        num_items_in_stock=Count("id", filter=Q(available_stock__gt=0)),
+        total_available_stock=Sum("available_stock"),
+        total_value=Sum(ExpressionWrapper(
+            F("cost") * F("available_stock"),
+            output_field=DecimalField(max_digits=30, decimal_places=4)
+        ))
+    )
+    return format_valuation(**valuation)
+
+
+def aggregate_valuation(queryset):
+    return queryset.aggregate(
+        num_items_in_stock=Count("item_id", filter=Q(stock__gt=0)),
+        total_available_stock=Sum("stock"),
+        total_value=Sum(ExpressionWrapper(
+            F("stock") * F("item_cost"),
+            output_field=DecimalField(max_digits=30, decimal_places=4)
+        ))
+    )
+
+
+# Same as summing get_stock_as_of(), but aggregated by the database: each
+# snapshot row plus the movements of its item after the snapshot, then the
+# items that only have movements.
+def get_valuation_as_of(organization_id, as_of):
+    snapshots, movements = get_ledger_querysets(organization_id, as_of)
+
+    moved_stock = movements.filter(item_id=OuterRef("item_id")).order_by().values("item_id").annotate(
+        total_available_stock=Sum("available_stock")
+    ).values("total_available_stock")
+    latest_cost = movements.filter(item_id=OuterRef("item_id"), cost__isnull=False).order_by("-id").values("cost")[:1]
+
+    snapshot_valuation = aggregate_valuation(snapshots.annotate(
+        stock=F("available_stock") + Coalesce(Subquery(moved_stock), 0),
+        item_cost=Coalesce(Subquery(latest_cost), F("cost")),
+    ))
+    movement_valuation = aggregate_valuation(
+        movements.exclude(item_id__in=snapshots.values("item_id")).values("item_id").annotate(
+            stock=Sum("available_stock"),
+            item_cost=Subquery(latest_cost),
+        ).order_by()
+    )
+
+    return format_valuation(*(
+        (snapshot_valuation[field_name] or 0) + (movement_valuation[field_name] or 0)
+        for field_name in ("num_items_in_stock", "total_available_stock", "total_value")
+    ))
+
+
+def write_snapshot(organization_id, taken_at, ledger_values_by_item_id, last_movement_id=None):
+    snapshots = (
+        StockSnapshot(
+            organization_id=organization_id,
+            item_id=item_id,
+            taken_at=taken_at,
+            last_movement_id=last_movement_id,
+            **{**item_ledger_values, "cost": item_ledger_values["cost"] or 0}
+        )
+        for item_id, item_ledger_values in ledger_values_by_item_id
+    )
+    for snapshots_chunk in iter_chunked(snapshots, settings.STOCK_LEDGER_BATCH_SIZE):
+        StockSnapshot.objects.bulk_create(snapshots_chunk)
+
+
+# Snapshots the current quantities and cost of every item of the
+# organization. Also the baseline for items that existed before the ledger.
+def take_stock_snapshot(organization_id):
+    with transaction.atomic():
+        # Inserting a movement or an item takes a key share lock on the
+        # organization row until commit, so this waits for the writes in
+        # flight and holds back new ones until the snapshot is written.
+        # Every movement up to the last id read is then in the item rows.
+        Organization.objects.select_for_update().filter(id=organization_id).values_list("id").first()
+
+        taken_at = timezone.now()
+        last_movement_id = StockMovement.objects.filter(organization_id=organization_id).aggregate(
+            Max("id")
+        )["id__max"] or 0
+
+        item_ledger_values = Item.objects.filter(organization_id=organization_id).order_by("id").values(
+            "id", *StockMovement.ledger_field_names
+        )
+        write_snapshot(
+            organization_id,
+            taken_at,
+            ((ledger_values.pop("id"), ledger_values) for ledger_values in item_ledger_values.iterator()),
+            last_movement_id
+        )
+
+    return taken_at
+
+
+# Writes the ledger's values at as_of as a snapshot batch. Items at zero that
+# no longer exist are left out.
+def materialize_snapshot(organization_id, as_of):
+    ledger_values = get_stock_as_of(organization_id, as_of)
+    existing_item_ids = set(Item.objects.filter(organization_id=organization_id).values_list("id", flat=True))
+
+    write_snapshot(
+        organization_id,
+        as_of,
+        (
+            (item_id, item_ledger_values) for item_id, item_ledger_values in sorted(ledger_values.items())
+            if item_id in existing_item_ids
+            or any(item_ledger_values[field_name] for field_name in StockMovement.quantity_field_names)
+        )
+    )
+
+
+# Month boundaries in the server time zone strictly between start and end. A
+# snapshot taken at the start of a month holds the stock at the end of the
+# previous one.
+def get_period_ends(start, end):
+    start = timezone.localtime(start)
+    year, month = start.year, start.month
+
+    period_ends = []
+    while True:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        period_end = timezone.make_aware(datetime(year, month, 1))
+        if period_end >= end:
+            break
+        period_ends.append(period_end)
+
+    return period_ends
+
+
+def delete_in_chunks(queryset, chunk_size):
+    num_deleted = 0
+
+    while True:
+        ids = list(queryset.order_by("id").values_list("id", flat=True)[:chunk_size])
+        if len(ids) == 0:
+            break
+
+        queryset.model.objects.filter(id__in=ids).delete()
+        num_deleted += len(ids)
+
+    return num_deleted
+
+
+# Materializes the period ends that have no snapshot batch yet.
+def materialize_period_ends(organization_id, period_ends):
+    existing_snapshot_times = set(StockSnapshot.objects.filter(
+        organization_id=organization_id,
+        taken_at__in=period_ends
+    ).values_list("taken_at", flat=True).distinct())
+
+    num_materialized = 0
+    for period_end in period_ends:
+        if period_end not in existing_snapshot_times:
+            with transaction.atomic():
+                materialize_snapshot(organization_id, period_end)
+            num_materialized += 1
+
+    return num_materialized
+
+
+# Snapshots every period that has closed since the ledger of the organization
+# started, so that period-end queries replay at most one period of movements.
+# Periods close STOCK_LEDGER_PERIOD_CLOSE_DELAY seconds after their end, which
+# leaves writes started before the boundary time to commit.
+def snapshot_closed_periods(organization_id, now=None):
+    closed_before = (now or timezone.now()) - timedelta(seconds=settings.STOCK_LEDGER_PERIOD_CLOSE_DELAY)
+
+    # Snapshots deleted by compaction are not recreated: nothing before the
+    # earliest remaining snapshot or movement is looked at.
+    ledger_start_times = [
+        StockSnapshot.objects.filter(organization_id=organization_id).aggregate(Min("taken_at"))["taken_at__min"],
+        StockMovement.objects.filter(organization_id=organization_id).aggregate(Min("created_at"))["created_at__min"],
+    ]
+    ledger_start_times = [start_time for start_time in ledger_start_times if start_time is not None]
+    if not ledger_start_times:
+        return 0
+
+    return materialize_period_ends(organization_id, get_period_ends(min(ledger_start_times), closed_before))
+
+
+# Folds the movements up to cutoff into snapshots, one at every period end
+# they span and one at cutoff, then deletes them along with the snapshots
+# older than keep_snapshots_after (period-end snapshots included). Stock
+# before cutoff can afterwards only be answered at period ends; answers after
+# cutoff are unchanged.
+def compact_stock_ledger(organization_id, cutoff, keep_snapshots_after=None):
+    compacted_movements = StockMovement.objects.filter(organization_id=organization_id, created_at__lte=cutoff)
+
+    first_movement_time = compacted_movements.order_by("created_at").values_list("created_at", flat=True).first()
+    if first_movement_time is not None:
+        materialize_period_ends(organization_id, get_period_ends(first_movement_time, cutoff))
+
+        with transaction.atomic():
+            materialize_snapshot(organization_id, cutoff)
+
+    num_deleted_movements = delete_in_chunks(compacted_movements, settings.STOCK_LEDGER_BATCH_SIZE)
+
+    num_deleted_snapshots = 0
+    if keep_snapshots_after is not None:
+        num_deleted_snapshots = delete_in_chunks(
+            StockSnapshot.objects.filter(organization_id=organization_id, taken_at__lt=min(keep_snapshots_after, cutoff)),
+            settings.STOCK_LEDGER_BATCH_SIZE
+        )
+
+    return num_deleted_movements, num_deleted_snapshots
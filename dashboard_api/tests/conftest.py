@@ -1,6 +1,7 @@
 from json import dumps as json_dumps
 from random import randint, sample, seed, uniform
 
+from django.core.cache import cache
 import pytest
 
 from dashboard_api.models import (
@@ -38,6 +39,11 @@ def pytest_configure():
 def api_client():
     return APIClient
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Database ids are reused between tests, so cached responses must not be.
+    cache.clear()
+
 # Organizations
 @pytest.fixture
 def organization_1(db, scope="session"):
@@ -1,9 +1,43 @@
-from json import loads as json_loads
-
+from base64 import b64encode
+from csv import DictReader
+from decimal import Decimal
+from gc import collect as gc_collect
+from gzip import decompress as gzip_decompress
+from io import StringIO
+from json import loads as json_loads, dumps as json_dumps
+from threading import Thread
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 import pytest
 
+from dashboard_api.metrics import (
+    get_metrics_registry,
+    MetricsRegistry,
+    serialize_snapshot,
+)
+from dashboard_api.mixins import (
+    IdempotencyMixin,
+)
 from dashboard_api.models import (
     CustomUser,
+    Item,
+    ItemSubCategory,
+    ItemTag,
+    StockMovement,
+)
+from dashboard_api.paginations import (
+    ItemCursorPagination,
+)
+from dashboard_api.user_cache import (
+    generate_user_cache_key,
+    get_user_cache,
 )
 
 
@@ -540,6 +574,33 @@ class TestItemAPIs:
         for i, object in enumerate(response_1_data):
             assert object['id'] == org_1_items_with_usage_tags[i].id
 
+    def test_get_filtered_by_any_tag(self, api_client, org_1_items, org_1_users):
+        filter_usage_tags = ["bundle", "component"]
+
+        org_1_items_with_any_usage_tag = [
+            object for object in org_1_items
+            if set(filter_usage_tags) & set(json_loads(object.usage_tags))
+        ]
+
+        endpoint = self.endpoint + f"?usage_tags__any={','.join(filter_usage_tags)}&tags__all=shopify"
+
+        headers_1 = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response_1 = api_client().get(endpoint, **headers_1)
+
+        assert response_1.status_code == 200
+
+        response_1_data = response_1.json()
+        expected_items = [
+            object for object in org_1_items_with_any_usage_tag
+            if "shopify" in json_loads(object.tags)
+        ]
+
+        assert len(expected_items) > 0
+        assert [object['id'] for object in response_1_data] == [object.id for object in expected_items]
+
     def test_get_filtered_by_range_field(self, api_client, org_1_items, org_1_users):
         min_cost = 250
         max_cost = 750
@@ -762,7 +823,1136 @@ class TestItemAPIs:
 
         assert delete_response.status_code == 204
 
+    def test_get_filtered_after_create(self, api_client, org_1_item_categories, org_1_item_subcategories, org_1_items, org_1_users):
+        endpoint = self.endpoint + f"?category={org_1_item_categories[0].id}"
+
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response_1 = api_client().get(endpoint, **headers)
+        num_items_before_create = len(response_1.json())
+
+        create_response = api_client().post(
+            self.endpoint,
+            {
+                "name": "Item New",
+                "sub_category": org_1_item_subcategories[0].id,
+                "category": org_1_item_categories[0].id,
+                "stock_keeping_unit": "new",
+                "cost": "50.00"
+            },
+            format='json',
+            **headers
+        )
+
+        assert create_response.status_code == 201
+
+        response_2 = api_client().get(endpoint, **headers)
+        response_2_data = response_2.json()
+
+        assert len(response_2_data) == num_items_before_create + 1
+        assert create_response.json()['id'] in [object['id'] for object in response_2_data]
+
+    @override_settings(CACHE_COMPRESS_RESPONSES=True, CACHE_COMPRESSION_MIN_SIZE=0)
+    def test_get_all_cached_compressed(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response_1 = api_client().get(self.endpoint, **headers)
+        response_2 = api_client().get(self.endpoint, **headers)
+        response_3 = api_client().get(self.endpoint, HTTP_ACCEPT_ENCODING="gzip, deflate", **headers)
+
+        assert response_1.status_code == 200
+        assert response_2.status_code == 200
+        assert response_3.status_code == 200
+
+        assert response_2.headers['content-type'] == "application/json"
+        assert "Content-Encoding" not in response_2.headers
+        assert response_2.content == response_1.content
+
+        assert response_3.headers['content-encoding'] == "gzip"
+        assert gzip_decompress(response_3.content) == response_1.content
+        assert len(json_loads(response_1.content)) == len(org_1_items)
+
+    def test_get_not_modified(self, api_client, org_1_items, org_1_item_subcategories, org_1_users, django_assert_num_queries):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response_1 = api_client().get(self.endpoint, **headers)
+
+        assert response_1.status_code == 200
+        etag = response_1.headers['etag']
+
+        # The user and their organization come from the cache too.
+        with django_assert_num_queries(0):
+            response_2 = api_client().get(self.endpoint, HTTP_IF_NONE_MATCH=etag, **headers)
+
+        assert response_2.status_code == 304
+        assert response_2.headers['etag'] == etag
+        assert response_2.content == b""
+
+        api_client().post(
+            self.endpoint,
+            {
+                "name": "Item New",
+                "sub_category": org_1_item_subcategories[0].id,
+                "category": org_1_item_subcategories[0].category.id,
+                "stock_keeping_unit": "new",
+                "cost": "50.00"
+            },
+            format='json',
+            **headers
+        )
+
+        response_3 = api_client().get(self.endpoint, HTTP_IF_NONE_MATCH=etag, **headers)
+
+        assert response_3.status_code == 200
+        assert response_3.headers['etag'] != etag
+        assert len(response_3.json()) == len(org_1_items) + 1
+
+    def test_update_if_match(self, api_client, org_1_items, org_1_users):
+        endpoint_with_pk = self.endpoint_with_pk.replace("{{pk}}", str(org_1_items[0].id))
+
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        get_response = api_client().get(endpoint_with_pk, **headers)
+        etag = get_response.headers['etag']
+
+        item_data = get_response.json()
+        item_data['name'] = "Item Renamed"
+
+        stale_update_response = api_client().put(
+            endpoint_with_pk,
+            item_data,
+            format='json',
+            HTTP_IF_MATCH='"stale"',
+            **headers
+        )
+
+        assert stale_update_response.status_code == 412
+
+        update_response = api_client().put(
+            endpoint_with_pk,
+            item_data,
+            format='json',
+            HTTP_IF_MATCH=etag,
+            **headers
+        )
+
+        assert update_response.status_code == 200
+        assert update_response.json()['name'] == "Item Renamed"
+
+        repeated_update_response = api_client().put(
+            endpoint_with_pk,
+            item_data,
+            format='json',
+            HTTP_IF_MATCH=etag,
+            **headers
+        )
+
+        assert repeated_update_response.status_code == 412
+
+    def test_update_version_conflict(self, api_client, org_1_items, org_1_users):
+        endpoint_with_pk = self.endpoint_with_pk.replace("{{pk}}", str(org_1_items[0].id))
+
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        get_response = api_client().get(endpoint_with_pk, **headers)
+        etag = get_response.headers['etag']
+        item_data = get_response.json()
+
+        assert item_data['version'] == 1
+        assert etag.strip('"').endswith("-v1")
+
+        # Another client saves the item after this one read it.
+        item = Item.objects.get(id=org_1_items[0].id)
+        item.description = "Changed elsewhere"
+        item.save()
+
+        item_data['name'] = "Item Renamed"
+        conflicting_update_response = api_client().put(endpoint_with_pk, item_data, format='json', **headers)
+
+        assert conflicting_update_response.status_code == 409
+
+        conditional_delete_response = api_client().delete(endpoint_with_pk, HTTP_IF_MATCH=etag, **headers)
+
+        assert conditional_delete_response.status_code == 412
+        assert Item.objects.get(id=org_1_items[0].id).description == "Changed elsewhere"
+
+        item_data['version'] = 2
+        update_response = api_client().put(endpoint_with_pk, item_data, format='json', **headers)
+
+        assert update_response.status_code == 200
+        assert update_response.json()['version'] == 3
+
+    def test_cached_user_invalidated(self, api_client, org_1_items, org_1_users):
+        user = org_1_users[0]['object']
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        assert api_client().get(self.endpoint, **headers).status_code == 200
+
+        user.is_active = False
+        user.save()
+
+        assert api_client().get(self.endpoint, **headers).status_code == 401
+
+    def test_cached_user_invalidated_by_queryset_update(self, api_client, org_1_items, org_1_users):
+        user = org_1_users[0]['object']
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        assert api_client().get(self.endpoint, **headers).status_code == 200
+
+        CustomUser.objects.filter(id=user.id).update(is_active=False)
+
+        assert api_client().get(self.endpoint, **headers).status_code == 401
+
+    def test_cached_user_invalidated_by_queryset_delete(self, api_client, org_1_items, org_1_users):
+        user = org_1_users[0]['object']
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        assert api_client().get(self.endpoint, **headers).status_code == 200
+
+        CustomUser.objects.filter(id=user.id).delete()
+
+        assert api_client().get(self.endpoint, **headers).status_code == 401
+
+    def test_cached_user_has_no_password(self, api_client, org_1_items, org_1_users):
+        user = org_1_users[0]['object']
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        assert api_client().get(self.endpoint, **headers).status_code == 200
+
+        cached_user = get_user_cache().get(generate_user_cache_key(user.id))
+        assert user.password not in str(cached_user)
+        assert cached_user["user"][0] == user.id
+
+    def test_create_idempotency_key(self, api_client, org_1_items, org_1_item_subcategories, org_1_users, django_assert_num_queries):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+            "HTTP_IDEMPOTENCY_KEY": "create-item-new",
+        }
+
+        item_data = {
+            "name": "Item New",
+            "sub_category": org_1_item_subcategories[0].id,
+            "category": org_1_item_subcategories[0].category.id,
+            "stock_keeping_unit": "new",
+            "cost": "50.00"
+        }
+
+        response_1 = api_client().post(self.endpoint, item_data, format='json', **headers)
+
+        assert response_1.status_code == 201
+        assert "Idempotent-Replayed" not in response_1.headers
+
+        # The user comes from the cache and the handler does not run.
+        with django_assert_num_queries(0):
+            response_2 = api_client().post(self.endpoint, item_data, format='json', **headers)
+
+        assert response_2.status_code == 201
+        assert response_2.headers['idempotent-replayed'] == "true"
+        assert response_2.json() == response_1.json()
+        assert Item.objects.filter(stock_keeping_unit="new").count() == 1
+
+        reused_key_response = api_client().post(
+            self.endpoint,
+            {**item_data, "name": "Item Other"},
+            format='json',
+            **headers
+        )
+
+        assert reused_key_response.status_code == 422
+
+    def test_create_idempotency_key_stored_while_locking(self, api_client, org_1_items, org_1_item_subcategories, org_1_users, monkeypatch):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+            "HTTP_IDEMPOTENCY_KEY": "create-item-new",
+        }
+
+        item_data = {
+            "name": "Item New",
+            "sub_category": org_1_item_subcategories[0].id,
+            "category": org_1_item_subcategories[0].category.id,
+            "stock_keeping_unit": "new",
+            "cost": "50.00"
+        }
+
+        response_1 = api_client().post(self.endpoint, item_data, format='json', **headers)
+        assert response_1.status_code == 201
+
+        # The first read misses, as if the first request finished right after it.
+        acquire_idempotency_lock = IdempotencyMixin.acquire_idempotency_lock
+
+        def acquire_after_store(view, lock_cache_key):
+            cache.set(lock_cache_key.removesuffix("__lock"), stored_response)
+            return acquire_idempotency_lock(view, lock_cache_key)
+
+        [stored_response_key] = cache.keys("*__idempotency__*")
+        stored_response = cache.get(stored_response_key)
+        cache.delete(stored_response_key)
+        monkeypatch.setattr(IdempotencyMixin, "acquire_idempotency_lock", acquire_after_store)
+
+        response_2 = api_client().post(self.endpoint, item_data, format='json', **headers)
+
+        assert response_2.status_code == 201
+        assert response_2.headers['idempotent-replayed'] == "true"
+        assert Item.objects.filter(stock_keeping_unit="new").count() == 1
+        assert cache.keys("*__idempotency__*__lock") == []
+
+    def test_idempotency_lock_released_by_owner_only(self):
+        view = IdempotencyMixin()
+        lock_cache_key = "idempotency_test__lock"
+
+        lock_token = view.acquire_idempotency_lock(lock_cache_key)
+        assert lock_token is not None
+        assert view.acquire_idempotency_lock(lock_cache_key) is None
+
+        # The lock expired and another request took it.
+        cache.set(lock_cache_key, lock_token + 1)
+        view.release_idempotency_lock(lock_cache_key, lock_token)
+        assert cache.get(lock_cache_key) == lock_token + 1
+
+        view.release_idempotency_lock(lock_cache_key, lock_token + 1)
+        assert cache.get(lock_cache_key) is None
+
+    def test_get_paginated_by_cursor(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        page_endpoint = self.endpoint + "?page_size=5&include_count=true"
+        fetched_ids = []
+
+        while page_endpoint is not None:
+            response = api_client().get(page_endpoint, **headers)
+
+            assert response.status_code == 200
+
+            response_data = response.json()
+
+            assert response_data['count'] == len(org_1_items)
+            assert len(response_data['results']) <= 5
+
+            fetched_ids += [object['id'] for object in response_data['results']]
+            page_endpoint = response_data['next']
+
+        assert fetched_ids == sorted(object.id for object in org_1_items)
+
+    def test_get_paginated_by_cursor_ordering(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        page_endpoint = self.endpoint + "?page_size=7&ordering=-available_stock"
+        fetched_items = []
+
+        while page_endpoint is not None:
+            response_data = api_client().get(page_endpoint, **headers).json()
+
+            assert "count" not in response_data
+
+            fetched_items += response_data['results']
+            page_endpoint = response_data['next']
+
+        expected_items = sorted(org_1_items, key=lambda object: (-object.available_stock, -object.id))
+        assert [object['id'] for object in fetched_items] == [object.id for object in expected_items]
+
+    def test_get_paginated_by_cursor_ordering_ties(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+        Item.objects.filter(id__in=[object.id for object in org_1_items]).update(available_stock=7)
+
+        page_endpoint = self.endpoint + "?page_size=3&ordering=available_stock"
+        fetched_ids = []
+        pages = []
+
+        while page_endpoint is not None:
+            response_data = api_client().get(page_endpoint, **headers).json()
+            pages.append(response_data)
+
+            fetched_ids += [object['id'] for object in response_data['results']]
+            page_endpoint = response_data['next']
+
+        assert fetched_ids == sorted(object.id for object in org_1_items)
+
+        # Walking back from the last page returns the previous pages.
+        previous_response_data = api_client().get(pages[-1]['previous'], **headers).json()
+        assert previous_response_data['results'] == pages[-2]['results']
+
+    def test_get_paginated_by_cursor_ordering_mismatch(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        next_endpoint = api_client().get(self.endpoint + "?page_size=3&ordering=cost", **headers).json()['next']
+        response = api_client().get(next_endpoint.replace("ordering=cost", "ordering=name"), **headers)
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("ordering, tokens", [
+        ("available_stock", {"o": "available_stock", "i": "1", "v": "abc"}),
+        ("available_stock", {"o": "available_stock", "i": "1"}),
+        ("available_stock", {"o": "available_stock", "i": "1", "v": str(2 ** 70)}),
+        ("cost", {"o": "cost", "i": "1", "v": "NaN"}),
+        ("id", {"o": "id", "i": str(2 ** 70)}),
+    ])
+    def test_get_paginated_by_forged_cursor(self, api_client, org_1_items, org_1_users, ordering, tokens):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        cursor = b64encode(urlencode(tokens).encode("ascii")).decode("ascii")
+        response = api_client().get(self.endpoint + f"?ordering={ordering}&cursor={quote(cursor)}", **headers)
+
+        assert response.status_code == 404
+
+    def test_get_paginated_max_page_size(self, api_client, org_1_items, org_1_users, monkeypatch):
+        monkeypatch.setattr(ItemCursorPagination, "max_page_size", 10)
+
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        endpoint = self.endpoint + "?page_size=100000"
+        response_data = api_client().get(endpoint, **headers).json()
+
+        assert len(response_data['results']) == 10
+        assert response_data['next'] is not None
+
     # TODO: def test_create_duplicate
     # TODO: def test_update_to_duplicate
     # TODO: def test_update_of_different_org
-    # TODO: def test_delete_of_different_org
\ No newline at end of file
+    # TODO: def test_delete_of_different_org
+
+
+# @pytest.mark.skip
+@pytest.mark.django_db
+class TestItemBulkAPIs:
+    endpoint = "/api/dashboard/items/bulk/"
+    items_endpoint = "/api/dashboard/items/"
+
+    def build_item_rows(self, item_subcategories, num_items, prefix="Bulk"):
+        return [
+            {
+                "name": f"{prefix} Item {i}",
+                "category": item_subcategories[i % len(item_subcategories)].category.id,
+                "sub_category": item_subcategories[i % len(item_subcategories)].id,
+                "stock_keeping_unit": f"{prefix}_sku_{i}",
+                "cost": "12.50",
+                "available_stock": i,
+                "tags": '["shopify"]',
+                "usage_tags": '["component", "saleable"]',
+            }
+            for i in range(num_items)
+        ]
+
+    def test_bulk_create(self, api_client, org_1_users, org_1_item_subcategories, django_assert_max_num_queries):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        items_response_1 = api_client().get(self.items_endpoint, **headers)
+        assert items_response_1.json() == []
+
+        item_rows = self.build_item_rows(org_1_item_subcategories, 50)
+
+        # Query count does not grow with the number of rows.
+        with django_assert_max_num_queries(15):
+            create_response = api_client().post(self.endpoint, item_rows, format='json', **headers)
+
+        assert create_response.status_code == 201
+
+        create_response_data = create_response.json()
+
+        assert create_response_data['success'] == True
+        assert len(create_response_data['result']['created_ids']) == 50
+        assert create_response_data['result']['errors'] == []
+
+        created_items = Item.objects.filter(id__in=create_response_data['result']['created_ids'])
+        assert created_items.count() == 50
+        assert all(item.organization_id == org_1_users[0]['object'].organization_id for item in created_items)
+        assert ItemTag.objects.filter(item__in=created_items, kind="usage_tags").count() == 100
+
+        items_response_2 = api_client().get(self.items_endpoint, **headers)
+        assert len(items_response_2.json()) == 50
+
+    def test_bulk_create_errors(self, api_client, org_1_users, org_1_items, org_1_item_subcategories, org_2_item_subcategories):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        original_num_items = Item.objects.count()
+
+        item_rows = self.build_item_rows(org_1_item_subcategories, 6)
+        item_rows[1]['category'] = org_2_item_subcategories[0].category.id
+        item_rows[2]['stock_keeping_unit'] = org_1_items[0].stock_keeping_unit
+        item_rows[3]['stock_keeping_unit'] = item_rows[0]['stock_keeping_unit']
+        item_rows[4]['tags'] = '["foo"]'
+        del item_rows[5]['cost']
+
+        create_response = api_client().post(self.endpoint, item_rows, format='json', **headers)
+
+        assert create_response.status_code == 400
+
+        create_response_data = create_response.json()
+        errors_by_index = {error['index']: error['errors'] for error in create_response_data['errors']}
+
+        assert sorted(errors_by_index.keys()) == [1, 2, 3, 4, 5]
+        assert "category" in errors_by_index[1]
+        assert "stock_keeping_unit" in errors_by_index[2]
+        assert "stock_keeping_unit" in errors_by_index[3]
+        assert "non_field_errors" in errors_by_index[4]
+        assert "cost" in errors_by_index[5]
+
+        assert Item.objects.count() == original_num_items
+
+    def test_bulk_create_allow_partial(self, api_client, org_1_users, org_1_item_subcategories):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        item_rows = self.build_item_rows(org_1_item_subcategories, 3)
+        item_rows[1]['usage_tags'] = '["foo"]'
+
+        create_response = api_client().post(self.endpoint + "?allow_partial=true", item_rows, format='json', **headers)
+
+        assert create_response.status_code == 201
+
+        create_response_data = create_response.json()
+
+        assert create_response_data['success'] == False
+        assert len(create_response_data['result']['created_ids']) == 2
+        assert [error['index'] for error in create_response_data['result']['errors']] == [1]
+
+
+    def test_bulk_update_by_ids(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        selected_items = org_1_items[:3]
+        other_item = org_1_items[3]
+
+        update_response = api_client().patch(
+            self.endpoint,
+            {
+                "ids": [object.id for object in selected_items],
+                "changes": {"available_stock": 7, "tags": '["xero"]'},
+            },
+            format='json',
+            **headers
+        )
+
+        assert update_response.status_code == 200
+        assert update_response.json()['result']['updated'] == 3
+
+        for object in selected_items:
+            updated_item = Item.objects.get(id=object.id)
+            assert updated_item.available_stock == 7
+            assert list(ItemTag.objects.filter(item=updated_item, kind="tags").values_list('name', flat=True)) == ["xero"]
+            # Usage tags are untouched.
+            assert set(ItemTag.objects.filter(item=updated_item, kind="usage_tags").values_list('name', flat=True)) \
+                == set(json_loads(object.usage_tags))
+
+        assert Item.objects.get(id=other_item.id).available_stock == other_item.available_stock
+
+    def test_bulk_update_by_filter(self, api_client, org_1_users, org_1_items, org_1_item_subcategories):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        source_subcategory = org_1_item_subcategories[0]
+        target_subcategory = ItemSubCategory.objects.create(
+            name="Bulk Target",
+            category=org_1_item_subcategories[-1].category,
+            organization=source_subcategory.organization
+        )
+        moved_item_ids = [object.id for object in org_1_items if object.sub_category_id == source_subcategory.id]
+
+        # Moving the items next to items with the same names conflicts.
+        conflict_response = api_client().patch(
+            self.endpoint + f"?sub_category={source_subcategory.id}",
+            {"changes": {"sub_category": org_1_item_subcategories[1].id}},
+            format='json',
+            **headers
+        )
+        assert conflict_response.status_code == 409
+        assert Item.objects.filter(sub_category=source_subcategory).count() == len(moved_item_ids)
+
+        update_response = api_client().patch(
+            self.endpoint + f"?sub_category={source_subcategory.id}",
+            {"changes": {"sub_category": target_subcategory.id}},
+            format='json',
+            **headers
+        )
+
+        assert update_response.status_code == 200
+        assert update_response.json()['result']['updated'] == len(moved_item_ids)
+        assert sorted(Item.objects.filter(
+            sub_category=target_subcategory,
+            category=target_subcategory.category
+        ).values_list('id', flat=True)) == sorted(moved_item_ids)
+
+    def test_bulk_update_invalid(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        ids = [org_1_items[0].id]
+
+        no_selection_response = api_client().patch(self.endpoint, {"changes": {"available_stock": 1}}, format='json', **headers)
+        assert no_selection_response.status_code == 400
+
+        unique_field_response = api_client().patch(self.endpoint, {"ids": ids, "changes": {"name": "x"}}, format='json', **headers)
+        assert unique_field_response.status_code == 400
+        assert "name" in unique_field_response.json()['errors']
+
+        invalid_value_response = api_client().patch(self.endpoint, {"ids": ids, "changes": {"available_stock": -1}}, format='json', **headers)
+        assert invalid_value_response.status_code == 400
+
+        invalid_tags_response = api_client().patch(self.endpoint, {"ids": ids, "changes": {"tags": '["foo"]'}}, format='json', **headers)
+        assert invalid_tags_response.status_code == 400
+
+        assert Item.objects.get(id=ids[0]).available_stock == org_1_items[0].available_stock
+
+    @override_settings(ITEM_BULK_MAX_IDS=2, ITEM_BULK_CREATE_MAX_ITEMS=10)
+    def test_bulk_ids_limit(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+        ids = [object.id for object in org_1_items[:3]]
+
+        delete_response = api_client().delete(self.endpoint, {"ids": ids}, format='json', **headers)
+        assert delete_response.status_code == 400
+        assert delete_response.json()['errors'] == ["At most 2 ids can be given at once."]
+
+        delete_response = api_client().delete(self.endpoint, {"ids": ids[:2]}, format='json', **headers)
+        assert delete_response.status_code == 200
+        assert Item.objects.filter(id__in=ids).count() == 1
+
+    @override_settings(ITEM_BULK_DELETE_CHUNK_SIZE=2)
+    def test_bulk_delete_by_filter(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        deleted_item_ids = [object.id for object in org_1_items if object.cost < 250]
+        assert len(deleted_item_ids) > 2
+
+        list_response = api_client().get(self.items_endpoint, **headers)
+        assert len(list_response.json()) == len(org_1_items)
+
+        delete_response = api_client().delete(self.endpoint + "?cost__lt=250", **headers)
+
+        assert delete_response.status_code == 200
+        assert delete_response.json()['result']['deleted'] == len(deleted_item_ids)
+        assert Item.objects.filter(id__in=deleted_item_ids).count() == 0
+        assert ItemTag.objects.filter(item_id__in=deleted_item_ids).count() == 0
+        # One movement per deleted item, however many chunks it took.
+        assert StockMovement.objects.filter(reason="delete").count() == len(deleted_item_ids)
+
+        list_response = api_client().get(self.items_endpoint, **headers)
+        assert len(list_response.json()) == len(org_1_items) - len(deleted_item_ids)
+
+
+# @pytest.mark.skip
+@pytest.mark.django_db
+class TestItemStockAdjustmentAPIs:
+    endpoint = "/api/dashboard/items/stock/"
+
+    def test_adjust_stock(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        item_1, item_2 = org_1_items[0], org_1_items[1]
+        adjustments = [
+            {"id": item_1.id, "available_stock": -10, "allocated_to_sales": 10},
+            {"id": item_2.id, "incoming_stock": 25},
+            {"id": item_1.id, "available_stock": -5},
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client().post(self.endpoint, adjustments, format='json', **headers)
+
+        assert response.status_code == 200
+        assert len([query for query in queries.captured_queries if query['sql'].startswith("UPDATE")]) == 1
+
+        new_values = {row['id']: row for row in response.json()['result']}
+        assert new_values[item_1.id]['available_stock'] == item_1.available_stock - 15
+        assert new_values[item_1.id]['allocated_to_sales'] == 10
+        assert new_values[item_2.id]['incoming_stock'] == 25
+        assert new_values[item_2.id]['available_stock'] == item_2.available_stock
+
+        assert Item.objects.get(id=item_1.id).available_stock == item_1.available_stock - 15
+        assert list(StockMovement.objects.filter(item_id=item_1.id, reason="adjustment").values_list(
+            'available_stock', 'allocated_to_sales'
+        )) == [(-15, 10)]
+
+    def test_adjust_stock_below_zero(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        item_1, item_2 = org_1_items[0], org_1_items[1]
+        adjustments = [
+            {"id": item_1.id, "available_stock": -1},
+            {"id": item_2.id, "available_stock": -(item_2.available_stock + 1)},
+        ]
+
+        response = api_client().post(self.endpoint, adjustments, format='json', **headers)
+
+        assert response.status_code == 409
+        assert [error['id'] for error in response.json()['errors']] == [item_2.id]
+        assert "available_stock" in response.json()['errors'][0]['errors']
+
+        # The valid adjustment is rolled back with the rest.
+        assert Item.objects.get(id=item_1.id).available_stock == item_1.available_stock
+        assert Item.objects.get(id=item_2.id).available_stock == item_2.available_stock
+
+    def test_adjust_stock_invalid(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        no_delta_response = api_client().post(self.endpoint, [{"id": org_1_items[0].id}], format='json', **headers)
+        assert no_delta_response.status_code == 400
+
+        missing_item_response = api_client().post(self.endpoint, [{"id": 0, "available_stock": 1}], format='json', **headers)
+        assert missing_item_response.status_code == 404
+
+
+# @pytest.mark.skip
+@pytest.mark.django_db
+class TestItemAsOfAPIs:
+    items_endpoint = "/api/dashboard/items/"
+    stock_endpoint = "/api/dashboard/items/stock/"
+    valuation_endpoint = "/api/dashboard/items/valuation/"
+
+    def test_get_as_of(self, api_client, org_1_users, org_1_items, org_1_item_subcategories):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        before_changes = quote(timezone.now().isoformat())
+        adjusted_item = org_1_items[0]
+        repriced_item = Item.objects.get(id=org_1_items[1].id)
+
+        adjust_response = api_client().post(self.stock_endpoint, [{"id": adjusted_item.id, "available_stock": 5}], format='json', **headers)
+        assert adjust_response.status_code == 200
+
+        repriced_item.cost = "1.00"
+        repriced_item.save()
+
+        new_item = Item.objects.create(
+            name="As Of Item",
+            stock_keeping_unit="AS_OF_1",
+            organization=adjusted_item.organization,
+            category=org_1_item_subcategories[0].category,
+            sub_category=org_1_item_subcategories[0],
+            cost=1
+        )
+
+        current_response = api_client().get(self.items_endpoint, **headers)
+        current_items = {object['id']: object for object in current_response.json()}
+        assert current_items[adjusted_item.id]['available_stock'] == adjusted_item.available_stock + 5
+        assert new_item.id in current_items
+
+        as_of_response = api_client().get(self.items_endpoint + f"?as_of={before_changes}", **headers)
+        assert as_of_response.status_code == 200
+
+        as_of_items = {object['id']: object for object in as_of_response.json()}
+        assert len(as_of_items) == len(org_1_items)
+        assert new_item.id not in as_of_items
+        assert as_of_items[adjusted_item.id]['available_stock'] == adjusted_item.available_stock
+        assert Decimal(as_of_items[repriced_item.id]['cost']) == Decimal(str(org_1_items[1].cost))
+
+        paginated_response = api_client().get(self.items_endpoint + f"?as_of={before_changes}&page_size=2", **headers)
+        assert paginated_response.json()['results'][0]['available_stock'] == adjusted_item.available_stock
+
+    def test_get_as_of_invalid(self, api_client, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response = api_client().get(self.items_endpoint + "?as_of=yesterday", **headers)
+        assert response.status_code == 400
+
+    def test_valuation(self, api_client, org_1_users, org_1_items):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        expected_value = sum(Decimal(str(object.cost)) * object.available_stock for object in org_1_items)
+        before_changes = quote(timezone.now().isoformat())
+
+        current_response = api_client().get(self.valuation_endpoint, **headers)
+        assert current_response.status_code == 200
+        assert Decimal(current_response.json()['result']['total_value']) == expected_value
+        assert current_response.json()['result']['num_items_in_stock'] == len(org_1_items)
+
+        api_client().post(self.stock_endpoint, [{"id": org_1_items[0].id, "available_stock": 10}], format='json', **headers)
+
+        current_response = api_client().get(self.valuation_endpoint, **headers)
+        assert Decimal(current_response.json()['result']['total_value']) \
+            == expected_value + Decimal(str(org_1_items[0].cost)) * 10
+
+        as_of_response = api_client().get(self.valuation_endpoint + f"?as_of={before_changes}", **headers)
+        assert as_of_response.status_code == 200
+        assert Decimal(as_of_response.json()['result']['total_value']) == expected_value
+        assert as_of_response.json()['result']['total_available_stock'] == sum(object.available_stock for object in org_1_items)
+
+
+# @pytest.mark.skip
+@pytest.mark.django_db
+class TestItemExportAPIs:
+    endpoint = "/api/dashboard/items/export/"
+
+    def read_streaming_content(self, response):
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_export_csv(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response = api_client().get(self.endpoint, **headers)
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == "text/csv"
+        assert 'filename="items.csv"' in response['Content-Disposition']
+
+        rows = list(DictReader(StringIO(self.read_streaming_content(response))))
+
+        assert [int(row['id']) for row in rows] == sorted(object.id for object in org_1_items)
+        assert rows[0]['stock_keeping_unit'] == Item.objects.get(id=rows[0]['id']).stock_keeping_unit
+
+    def test_export_ndjson_filtered(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        expected_ids = sorted(
+            object.id for object in org_1_items
+            if object.cost >= 250 and "shopify" in json_loads(object.tags)
+        )
+        assert len(expected_ids) > 0
+
+        response = api_client().get(self.endpoint + "?export_format=ndjson&cost__gte=250&tags=shopify", **headers)
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == "application/x-ndjson"
+
+        rows = [json_loads(line) for line in self.read_streaming_content(response).splitlines()]
+
+        assert [row['id'] for row in rows] == expected_ids
+        assert all(row['organization'] == org_1_users[0]['object'].organization.id for row in rows)
+
+    def test_export_invalid_format(self, api_client, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response = api_client().get(self.endpoint + "?export_format=xml", **headers)
+
+        assert response.status_code == 400
+
+
+# @pytest.mark.skip
+@pytest.mark.django_db
+class TestItemImportAPIs:
+    endpoint = "/api/dashboard/items/import/"
+
+    def build_csv_file(self, item_subcategories, num_items, prefix="Import"):
+        lines = ["name,category,sub_category,stock_keeping_unit,cost,available_stock,tags"]
+        for i in range(num_items):
+            item_subcategory = item_subcategories[i % len(item_subcategories)]
+            lines.append(
+                f"{prefix} Item {i},{item_subcategory.category.name},{item_subcategory.name},"
+                f"{prefix}_sku_{i},9.99,{i},\"[\"\"shopify\"\"]\""
+            )
+        return SimpleUploadedFile("items.csv", "\n".join(lines).encode("utf-8"), content_type="text/csv")
+
+    def read_progress(self, response):
+        return [json_loads(line) for line in b"".join(response.streaming_content).decode("utf-8").splitlines()]
+
+    @override_settings(ITEM_IMPORT_CHUNK_SIZE=2)
+    def test_import_csv(self, api_client, org_1_users, org_1_item_subcategories):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        original_num_items = Item.objects.count()
+        items_file = self.build_csv_file(org_1_item_subcategories, 5)
+
+        response = api_client().post(self.endpoint, {"file": items_file}, format='multipart', **headers)
+
+        assert response.status_code == 200
+        progress = self.read_progress(response)
+
+        assert [chunk['rows_processed'] for chunk in progress] == [2, 4, 5]
+        assert sum(chunk['created'] for chunk in progress) == 5
+        assert all(len(chunk['errors']) == 0 for chunk in progress)
+
+        assert Item.objects.count() == original_num_items + 5
+        imported_item = Item.objects.get(stock_keeping_unit="Import_sku_3")
+        assert imported_item.sub_category_id == org_1_item_subcategories[3].id
+        assert imported_item.available_stock == 3
+        assert list(ItemTag.objects.filter(item=imported_item).values_list('name', flat=True)) == ["shopify"]
+
+    def test_import_ndjson_row_errors(self, api_client, org_1_users, org_1_item_subcategories):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        item_subcategory = org_1_item_subcategories[0]
+        rows = [
+            json_dumps({
+                "name": "Import Item 0",
+                "category": item_subcategory.category.name,
+                "sub_category": item_subcategory.name,
+                "stock_keeping_unit": "Import_sku_0",
+                "cost": "1.00",
+                "usage_tags": ["component"],
+            }),
+            json_dumps({
+                "name": "Import Item 1",
+                "category": "Not A Category",
+                "sub_category": item_subcategory.name,
+                "stock_keeping_unit": "Import_sku_1",
+                "cost": "1.00",
+            }),
+            "not json",
+        ]
+        items_file = SimpleUploadedFile("items.ndjson", "\n".join(rows).encode("utf-8"))
+
+        response = api_client().post(self.endpoint, {"file": items_file}, format='multipart', **headers)
+
+        assert response.status_code == 200
+        progress = self.read_progress(response)
+
+        assert progress[-1]['rows_processed'] == 3
+        errors_by_index = {error['index']: error['errors'] for chunk in progress for error in chunk['errors']}
+        assert sorted(errors_by_index.keys()) == [1, 2]
+        assert "category" in errors_by_index[1]
+
+        assert Item.objects.get(stock_keeping_unit="Import_sku_0").usage_tags == json_dumps(["component"])
+
+    def test_import_upsert(self, api_client, org_1_users, org_1_item_subcategories):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response = api_client().post(self.endpoint, {"file": self.build_csv_file(org_1_item_subcategories, 3)}, format='multipart', **headers)
+        assert sum(chunk['created'] for chunk in self.read_progress(response)) == 3
+
+        item_subcategory = org_1_item_subcategories[1]
+        update_file = SimpleUploadedFile(
+            "items.csv",
+            (
+                "name,category,sub_category,stock_keeping_unit,cost,available_stock\n"
+                f"Import Item 1,{item_subcategory.category.name},{item_subcategory.name},Import_sku_1,19.99,100\n"
+            ).encode("utf-8")
+        )
+
+        # Without upsert an existing SKU is a row error.
+        response = api_client().post(self.endpoint, {"file": update_file}, format='multipart', **headers)
+        progress = self.read_progress(response)
+        assert "stock_keeping_unit" in progress[0]['errors'][0]['errors']
+
+        update_file.seek(0)
+        response = api_client().post(self.endpoint + "?upsert=true", {"file": update_file}, format='multipart', **headers)
+        progress = self.read_progress(response)
+
+        assert progress[0]['updated'] == 1
+        assert progress[0]['created'] == 0
+
+        updated_item = Item.objects.get(stock_keeping_unit="Import_sku_1")
+        assert updated_item.available_stock == 100
+        assert str(updated_item.cost) == "19.9900"
+        # Columns missing from the file keep their values.
+        assert updated_item.tags == json_dumps(["shopify"])
+        assert list(ItemTag.objects.filter(item=updated_item).values_list('name', flat=True)) == ["shopify"]
+
+
+# @pytest.mark.skip
+@pytest.mark.django_db
+class TestRequestTiming:
+    endpoint = "/api/dashboard/items/"
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0, REQUEST_TIMING_SLOW_THRESHOLD_MS=10000)
+    def test_server_timing(self, api_client, org_1_items, org_1_users, caplog):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        with caplog.at_level("INFO", logger="dashboard_api.middleware"):
+            miss_response = api_client().get(self.endpoint, **headers)
+            hit_response = api_client().get(self.endpoint, **headers)
+
+        assert "db;dur=" in miss_response.headers['server-timing']
+        assert "serialize;dur=" in miss_response.headers['server-timing']
+        assert '0 hits, 1 misses' in miss_response.headers['server-timing']
+        assert '1 hits, 0 misses' in hit_response.headers['server-timing']
+        assert '"0 queries"' in hit_response.headers['server-timing']
+
+        miss_log, hit_log = [json_loads(record.getMessage()) for record in caplog.records]
+        assert miss_log['url_name'] == "items"
+        assert miss_log['status'] == 200
+        assert miss_log['db_queries'] > 0
+        assert hit_log['cache_hits'] == 1
+        assert "queries" not in hit_log
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0, REQUEST_TIMING_SLOW_THRESHOLD_MS=0)
+    def test_slow_request_logs_sql(self, api_client, org_1_items, org_1_users, caplog):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        with caplog.at_level("INFO", logger="dashboard_api.middleware"):
+            api_client().get(self.endpoint, **headers)
+
+        slow_log = json_loads(caplog.records[-1].getMessage())
+        assert slow_log['slow'] is True
+        assert any("dashboard_api_item" in query['sql'] for query in slow_log['queries'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled_request(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+
+        response = api_client().get(self.endpoint, **headers)
+
+        assert "Server-Timing" not in response.headers
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0, REQUEST_TIMING_SLOW_THRESHOLD_MS=0)
+    def test_unsampled_slow_request(self, api_client, org_1_items, org_1_users, caplog):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+        slow_requests_key = ("http_slow_requests_total", (("url_name", "items"),))
+        slow_requests_before = get_metrics_registry().snapshot()["counters"].get(slow_requests_key, 0)
+
+        with caplog.at_level("INFO", logger="dashboard_api.middleware"):
+            response = api_client().get(self.endpoint, **headers)
+
+        assert "Server-Timing" not in response.headers
+        slow_log = json_loads(caplog.records[-1].getMessage())
+        assert slow_log['slow'] is True
+        assert slow_log['sampled'] is False
+        assert slow_log['url_name'] == "items"
+        assert slow_log['db_queries'] > 0
+        assert any("dashboard_api_item" in query['sql'] for query in slow_log['queries'])
+        assert get_metrics_registry().snapshot()["counters"][slow_requests_key] == slow_requests_before + 1
+
+
+# @pytest.mark.skip
+@pytest.mark.django_db
+class TestMetrics:
+    endpoint = "/api/dashboard/metrics/"
+    metrics_token = "metrics-token"
+
+    def get_samples(self, api_client):
+        with override_settings(METRICS_AUTH_TOKEN=self.metrics_token):
+            response = api_client().get(self.endpoint, HTTP_AUTHORIZATION=f"Bearer {self.metrics_token}")
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith("text/plain; version=0.0.4")
+
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith("#"):
+                sample, value = line.rsplit(" ", 1)
+                samples[sample] = float(value)
+        return samples
+
+    def test_metrics(self, api_client, org_1_items, org_1_users):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {org_1_users[0]['tokens']['access']}",
+        }
+        requests_sample = 'http_requests_total{url_name="items",method="GET",status="200"}'
+        hits_sample = 'cache_lookups_total{model="Item",result="hit"}'
+        misses_sample = 'cache_lookups_total{model="Item",result="miss"}'
+
+        samples_before = self.get_samples(api_client)
+        api_client().get("/api/dashboard/items/", **headers)
+        api_client().get("/api/dashboard/items/", **headers)
+        samples = self.get_samples(api_client)
+
+        assert samples[requests_sample] - samples_before.get(requests_sample, 0) == 2
+        assert samples[hits_sample] - samples_before.get(hits_sample, 0) == 1
+        assert samples[misses_sample] - samples_before.get(misses_sample, 0) == 1
+        assert 0 < samples['cache_hit_ratio{model="Item"}'] < 1
+        assert samples['db_queries_total{url_name="items"}'] > samples_before.get('db_queries_total{url_name="items"}', 0)
+        assert samples['http_request_duration_seconds_count{url_name="items"}'] == samples[
+            'http_request_duration_seconds_bucket{url_name="items",le="+Inf"}'
+        ]
+
+    def test_metrics_registry_retires_thread_shards(self):
+        registry = MetricsRegistry()
+
+        def record():
+            registry.increment("redis_errors_total", (("source", "request"),))
+            registry.observe("http_request_duration_seconds", 0.02, (("url_name", "items"),))
+
+        for _ in range(20):
+            thread = Thread(target=record)
+            thread.start()
+            thread.join()
+        gc_collect()
+
+        snapshot = registry.snapshot()
+        assert len(registry._shards) == 0
+        assert snapshot["counters"][("redis_errors_total", (("source", "request"),))] == 20
+        histogram = snapshot["histograms"][("http_request_duration_seconds", (("url_name", "items"),))]
+        assert sum(histogram[:-1]) == 20
+        assert histogram[-1] == pytest.approx(0.4)
+        assert snapshot["histogram_buckets"]["http_request_duration_seconds"] == settings.METRICS_LATENCY_BUCKETS
+
+    def test_metrics_merge_worker_snapshots(self, api_client, tmp_path):
+        other_worker_registry = MetricsRegistry()
+        other_worker_registry.increment("redis_errors_total", (("source", "request"),), 3)
+        other_worker_registry.observe("http_request_duration_seconds", 0.02, (("url_name", "items"),))
+        (tmp_path / "metrics_1.json").write_text(serialize_snapshot(other_worker_registry.snapshot()))
+
+        with override_settings(METRICS_DIR=str(tmp_path)):
+            samples_before = self.get_samples(api_client)
+            samples = self.get_samples(api_client)
+
+        assert samples['redis_errors_total{source="request"}'] == 3
+        assert samples['http_request_duration_seconds_bucket{url_name="items",le="0.025"}'] >= 1
+        # This worker's own snapshot is written before merging.
+        assert samples['http_requests_total{url_name="metrics",method="GET",status="200"}'] == samples_before.get(
+            'http_requests_total{url_name="metrics",method="GET",status="200"}', 0
+        ) + 1
+
+    def test_metrics_token(self, api_client):
+        with override_settings(METRICS_AUTH_TOKEN=self.metrics_token):
+            assert api_client().get(self.endpoint).status_code == 403
+            assert api_client().get(self.endpoint, HTTP_AUTHORIZATION="Bearer other-token").status_code == 403
+
+        self.get_samples(api_client)
+
+    def test_metrics_without_token(self, api_client):
+        with override_settings(METRICS_AUTH_TOKEN="", DEBUG=False):
+            assert api_client().get(self.endpoint).status_code == 403
+
+        with override_settings(METRICS_AUTH_TOKEN="", DEBUG=True):
+            assert api_client().get(self.endpoint, REMOTE_ADDR="10.0.0.1").status_code == 403
+            assert api_client().get(self.endpoint).status_code == 200
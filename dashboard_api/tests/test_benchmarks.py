@@ -0,0 +1,451 @@
+from io import StringIO
+from itertools import count
+from json import loads as json_loads, dumps as json_dumps
+from math import ceil
+from os import environ
+from pathlib import Path
+from threading import get_ident
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import pytest
+from redis import Redis
+from redis.client import Pipeline
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from dashboard_api.models import (
+    CustomUser,
+    Item,
+    ItemCategory,
+    ItemSubCategory,
+)
+from dashboard_api.renderers import (
+    FastJSONRenderer,
+    orjson,
+)
+from dashboard_api.serializers import (
+    ItemSerializer,
+)
+
+# Organizations are generated with the seed command; every size runs every
+# endpoint, so a query count that grows with the organization shows up as a
+# budget breach on the larger sizes.
+ORGANIZATION_SIZES = {
+    "small": {"categories": 1, "subcategories": 2, "items": 10},
+    "medium": {"categories": 4, "subcategories": 5, "items": 25},
+    "large": {"categories": 10, "subcategories": 10, "items": 50},
+}
+BENCHMARK_SAMPLES = int(environ.get("BENCHMARK_SAMPLES", 10))
+# A p50 fails when above baseline * (1 + tolerance) + slack, which leaves
+# room for slower machines while still catching order-of-magnitude slips.
+# p95 is recorded but not gated: over a few samples it is the slowest one.
+BENCHMARK_LATENCY_TOLERANCE = float(environ.get("BENCHMARK_LATENCY_TOLERANCE", 2.0))
+BENCHMARK_LATENCY_SLACK_MS = float(environ.get("BENCHMARK_LATENCY_SLACK_MS", 5.0))
+BENCHMARK_RENDER_ROUNDS = int(environ.get("BENCHMARK_RENDER_ROUNDS", 20))
+BENCHMARK_RESULTS_PATH = environ.get("BENCHMARK_RESULTS_PATH", None)
+BENCHMARK_UPDATE_BASELINES = environ.get("BENCHMARK_UPDATE_BASELINES", "") == "1"
+BENCHMARK_BASELINES_PATH = Path(__file__).parent / "benchmark_baselines.json"
+
+API_PREFIX = "/api/dashboard"
+
+
+class RedisRoundTripCounter:
+    # Counts commands sent to Redis by the test's thread; a pipeline counts
+    # once. Background threads (query stats flushes) are left out.
+    def __init__(self, monkeypatch):
+        self.count = 0
+        self.thread_id = get_ident()
+
+        execute_command = Redis.execute_command
+        execute_pipeline = Pipeline.execute
+
+        def counting_execute_command(client, *args, **kwargs):
+            self.count += get_ident() == self.thread_id
+            return execute_command(client, *args, **kwargs)
+
+        def counting_execute_pipeline(pipeline, *args, **kwargs):
+            self.count += get_ident() == self.thread_id
+            return execute_pipeline(pipeline, *args, **kwargs)
+
+        monkeypatch.setattr(Redis, "execute_command", counting_execute_command)
+        monkeypatch.setattr(Pipeline, "execute", counting_execute_pipeline)
+
+
+class BenchmarkContext:
+    def __init__(self, size):
+        self.size = size
+        self.user = CustomUser.objects.get(username=f"{size}_1_1")
+        self.organization = self.user.organization
+        self.category = ItemCategory.objects.filter(organization=self.organization).order_by("id").first()
+        self.subcategory = ItemSubCategory.objects.filter(category=self.category).order_by("id").first()
+        self.items = list(Item.objects.filter(organization=self.organization).order_by("id")[:10])
+        self.numbers = count(1)
+
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+
+    def next_number(self):
+        return next(self.numbers)
+
+    def create_items(self, num_items):
+        number = self.next_number()
+        return Item.objects.bulk_create([
+            Item(
+                name=f"Benchmark Item {number}_{i}",
+                category=self.category,
+                sub_category=self.subcategory,
+                organization=self.organization,
+                stock_keeping_unit=f"{self.size}_benchmark_{number}_{i}",
+                cost="10.00",
+            )
+            for i in range(num_items)
+        ])
+
+    def new_user_data(self):
+        username = f"{self.size}_registered_{self.next_number()}"
+        return {
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "1234",
+            "full_name": "Registered User",
+            "phone_number": "0000000000",
+            "organization_id": self.organization.id,
+            "role": "admin",
+        }
+
+    def new_item_data(self):
+        number = self.next_number()
+        return {
+            "name": f"Benchmark Item {number}",
+            "category": self.category.id,
+            "sub_category": self.subcategory.id,
+            "stock_keeping_unit": f"{self.size}_benchmark_{number}",
+            "cost": "10.00",
+        }
+
+
+class BenchmarkCase:
+    # A request against one endpoint. Cached reads are measured on the hit
+    # path (after a warming request) and the miss path (cache cleared before
+    # each request); everything else once per sample with a warm cache.
+    def __init__(self, url_name, method, path, data=None, format="json", cached=False, setup=None):
+        self.url_name = url_name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.format = format
+        self.cached = cached
+        self.setup = setup
+
+    @property
+    def name(self):
+        return f"{self.url_name}:{self.method}"
+
+    def get_paths(self):
+        return ["hit", "miss"] if self.cached else ["uncached"]
+
+    # Builds the path and body outside of the measurement.
+    def prepare(self, context):
+        setup_result = self.setup(context) if self.setup else None
+        path = self.path(context, setup_result) if callable(self.path) else self.path
+        data = self.data(context, setup_result) if callable(self.data) else self.data
+        return f"{API_PREFIX}{path}", data
+
+    def send(self, client, path, data):
+        return getattr(client, self.method)(path, data, format=self.format)
+
+
+def build_import_file(context, setup_result):
+    number = context.next_number()
+    lines = ["name,category,sub_category,stock_keeping_unit,cost"] + [
+        f"Imported Item {number}_{i},{context.category.name},{context.subcategory.name},{context.size}_import_{number}_{i},10"
+        for i in range(10)
+    ]
+    return {"file": SimpleUploadedFile("items.csv", "\n".join(lines).encode("utf-8"), content_type="text/csv")}
+
+
+BENCHMARK_CASES = [
+    BenchmarkCase("auth_register", "post", "/auth/register/", lambda context, _: context.new_user_data()),
+    BenchmarkCase("token_obtain_pair", "post", "/auth/login/", lambda context, _: {
+        "username": context.user.username,
+        "password": "1234",
+    }),
+    BenchmarkCase(
+        "token_refresh", "post", "/auth/token/refresh/",
+        lambda context, _: {"refresh": str(RefreshToken.for_user(context.user))}
+    ),
+    BenchmarkCase(
+        "token_blacklist", "post", "/auth/logout/",
+        lambda context, _: {"refresh": str(RefreshToken.for_user(context.user))}
+    ),
+
+    BenchmarkCase("item_categories", "get", "/item-categories/", cached=True),
+    BenchmarkCase(
+        "item_category_with_pk", "get", lambda context, _: f"/item-categories/{context.category.id}/", cached=True
+    ),
+    BenchmarkCase("item_categories", "post", "/item-categories/", lambda context, _: {
+        "name": f"Benchmark Category {context.next_number()}",
+    }),
+    BenchmarkCase("item_subcategories", "get", "/item-subcategories/", cached=True),
+    BenchmarkCase(
+        "item_subcategory_with_pk", "get", lambda context, _: f"/item-subcategories/{context.subcategory.id}/", cached=True
+    ),
+    BenchmarkCase("item_subcategories", "post", "/item-subcategories/", lambda context, _: {
+        "name": f"Benchmark Sub Category {context.next_number()}",
+        "category": context.category.id,
+    }),
+
+    BenchmarkCase("items", "get", "/items/", cached=True),
+    BenchmarkCase("items_page", "get", "/items/?page_size=50", cached=True),
+    BenchmarkCase("items_filtered", "get", "/items/?tags__any=shopify,xero&cost__gte=100", cached=True),
+    BenchmarkCase("items", "post", "/items/", lambda context, _: context.new_item_data()),
+    BenchmarkCase("item_with_pk", "get", lambda context, _: f"/items/{context.items[0].id}/", cached=True),
+    BenchmarkCase(
+        "item_with_pk", "put",
+        lambda context, item: f"/items/{item.id}/",
+        lambda context, item: {**context.new_item_data(), "stock_keeping_unit": item.stock_keeping_unit},
+        setup=lambda context: context.create_items(1)[0]
+    ),
+    BenchmarkCase(
+        "item_with_pk", "delete",
+        lambda context, item: f"/items/{item.id}/",
+        setup=lambda context: context.create_items(1)[0]
+    ),
+
+    BenchmarkCase("items_bulk", "post", "/items/bulk/", lambda context, _: [context.new_item_data() for _ in range(10)]),
+    BenchmarkCase("items_bulk", "patch", "/items/bulk/", lambda context, _: {
+        "ids": [item.id for item in context.items],
+        "changes": {"description": f"Benchmark {context.next_number()}"},
+    }),
+    BenchmarkCase(
+        "items_bulk", "delete", "/items/bulk/",
+        lambda context, items: {"ids": [item.id for item in items]},
+        setup=lambda context: context.create_items(10)
+    ),
+    BenchmarkCase("items_export", "get", "/items/export/?export_format=ndjson"),
+    BenchmarkCase("items_import", "post", "/items/import/", build_import_file, format="multipart"),
+    BenchmarkCase("items_stock", "post", "/items/stock/", lambda context, _: [
+        {"id": item.id, "available_stock": 1} for item in context.items
+    ]),
+    BenchmarkCase("items_valuation", "get", "/items/valuation/", cached=True),
+]
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile.
+    ordered = sorted(values)
+    return ordered[max(0, ceil(fraction * len(ordered)) - 1)]
+
+
+def load_baselines():
+    if not BENCHMARK_BASELINES_PATH.exists():
+        return {"budgets": {}, "latency_ms": {}}
+    return json_loads(BENCHMARK_BASELINES_PATH.read_text())
+
+
+def write_json(path, data):
+    Path(path).write_text(json_dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+def measure_request(case, context, redis_counter):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {context.access_token}")
+
+    path, data = case.prepare(context)
+
+    with CaptureQueriesContext(connection) as queries:
+        redis_round_trips_before = redis_counter.count
+        start_time = perf_counter()
+
+        response = case.send(client, path, data)
+        if response.streaming:
+            b"".join(response.streaming_content)
+
+        elapsed_ms = (perf_counter() - start_time) * 1000
+
+    assert response.status_code < 400, f"{case.name}: {response.status_code} {response.content[:200]}"
+    return elapsed_ms, len(queries), redis_counter.count - redis_round_trips_before
+
+
+def run_case(case, context, path, redis_counter):
+    if path == "hit":
+        measure_request(case, context, redis_counter)
+
+    latencies = []
+    query_counts = []
+    redis_round_trips = []
+    for _ in range(BENCHMARK_SAMPLES):
+        if path == "miss":
+            cache.clear()
+
+        elapsed_ms, num_queries, num_redis_round_trips = measure_request(case, context, redis_counter)
+        latencies.append(elapsed_ms)
+        query_counts.append(num_queries)
+        redis_round_trips.append(num_redis_round_trips)
+
+    return {
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "queries": max(query_counts),
+        "redis_round_trips": max(redis_round_trips),
+    }
+
+
+def check_result(key, size, result, baselines):
+    failures = []
+
+    budget = baselines["budgets"].get(key, None)
+    if budget is None:
+        failures.append(f"{key}: no query budget in {BENCHMARK_BASELINES_PATH.name}")
+    else:
+        if result["queries"] > budget["queries"]:
+            failures.append(f"{key} ({size}): {result['queries']} queries, budget {budget['queries']}")
+        if result["redis_round_trips"] > budget["redis_round_trips"]:
+            failures.append(
+                f"{key} ({size}): {result['redis_round_trips']} Redis round trips, budget {budget['redis_round_trips']}"
+            )
+
+    latency_baseline = baselines["latency_ms"].get(size, {}).get(key, None)
+    if latency_baseline is not None:
+        max_p50_ms = latency_baseline["p50_ms"] * (1 + BENCHMARK_LATENCY_TOLERANCE) + BENCHMARK_LATENCY_SLACK_MS
+        if result["p50_ms"] > max_p50_ms:
+            failures.append(f"{key} ({size}): p50 {result['p50_ms']}ms, limit {max_p50_ms:.1f}ms")
+
+    return failures
+
+
+# Budgets only ever grow here (they hold the maximum over every size); delete
+# the baselines file to tighten them.
+def update_baselines(baselines, size, results):
+    for key, result in results.items():
+        budget = baselines["budgets"].setdefault(key, {"queries": 0, "redis_round_trips": 0})
+        budget["queries"] = max(budget["queries"], result["queries"])
+        budget["redis_round_trips"] = max(budget["redis_round_trips"], result["redis_round_trips"])
+
+    baselines["latency_ms"][size] = {
+        key: {"p50_ms": result["p50_ms"], "p95_ms": result["p95_ms"]}
+        for key, result in results.items()
+    }
+    write_json(BENCHMARK_BASELINES_PATH, baselines)
+
+
+def write_results(key, results):
+    all_results = json_loads(Path(BENCHMARK_RESULTS_PATH).read_text()) if Path(BENCHMARK_RESULTS_PATH).exists() else {}
+    all_results[key] = results
+    write_json(BENCHMARK_RESULTS_PATH, all_results)
+
+
+# @pytest.mark.skip
+@pytest.mark.benchmark
+@pytest.mark.django_db
+class TestEndpointBenchmarks:
+    @pytest.mark.parametrize("size", list(ORGANIZATION_SIZES))
+    def test_endpoint_budgets(self, size, monkeypatch):
+        organization_size = ORGANIZATION_SIZES[size]
+        call_command(
+            "seed",
+            "--organizations", "1",
+            "--users-per-organization", "1",
+            "--categories-per-organization", str(organization_size["categories"]),
+            "--subcategories-per-category", str(organization_size["subcategories"]),
+            "--items-per-subcategory", str(organization_size["items"]),
+            "--prefix", size,
+            "--fast-passwords",
+            stdout=StringIO()
+        )
+
+        context = BenchmarkContext(size)
+        redis_counter = RedisRoundTripCounter(monkeypatch)
+
+        results = {}
+        for case in BENCHMARK_CASES:
+            for path in case.get_paths():
+                results[f"{case.name}:{path}"] = run_case(case, context, path, redis_counter)
+
+        baselines = load_baselines()
+
+        if BENCHMARK_RESULTS_PATH:
+            write_results(size, results)
+
+        if BENCHMARK_UPDATE_BASELINES:
+            update_baselines(baselines, size, results)
+            return
+
+        failures = []
+        for key, result in results.items():
+            failures += check_result(key, size, result, baselines)
+
+        assert not failures, "\n".join(failures)
+
+
+# Item pages as the items endpoint serializes them (strings and ints only),
+# and as raw values() rows, where Decimals and datetimes reach the renderer.
+def build_item_page(items, shape):
+    if shape == "serialized":
+        rows = ItemSerializer(items, many=True).data
+    else:
+        rows = list(Item.objects.filter(id__in=[item.id for item in items]).order_by("id").values())
+
+    return {
+        "success": True,
+        "result": {
+            "next": f"http://testserver{API_PREFIX}/items/?cursor=cD0xMjM0",
+            "previous": None,
+            "results": rows,
+        },
+    }
+
+
+def measure_render(renderer, data):
+    durations = []
+    for _ in range(BENCHMARK_RENDER_ROUNDS):
+        start_time = perf_counter()
+        renderer.render(data, "application/json", {})
+        durations.append(perf_counter() - start_time)
+    return percentile(durations, 0.50)
+
+
+# @pytest.mark.skip
+@pytest.mark.benchmark
+@pytest.mark.django_db
+class TestRenderBenchmarks:
+    @pytest.mark.parametrize("shape", ["serialized", "values"])
+    @pytest.mark.parametrize("page_size", [50, 500])
+    def test_render_throughput(self, shape, page_size):
+        call_command(
+            "seed",
+            "--organizations", "1",
+            "--users-per-organization", "1",
+            "--categories-per-organization", "5",
+            "--subcategories-per-category", "10",
+            "--items-per-subcategory", "10",
+            "--prefix", "render",
+            "--fast-passwords",
+            stdout=StringIO()
+        )
+        items = list(Item.objects.filter(stock_keeping_unit__startswith="render_").order_by("id")[:page_size])
+        data = build_item_page(items, shape)
+
+        stdlib_renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+        assert json_loads(fast_renderer.render(data)) == json_loads(stdlib_renderer.render(data))
+
+        stdlib_p50 = measure_render(stdlib_renderer, data)
+        fast_p50 = measure_render(fast_renderer, data)
+        results = {
+            "stdlib_items_per_s": round(page_size / stdlib_p50),
+            "fast_items_per_s": round(page_size / fast_p50),
+            "speedup": round(stdlib_p50 / fast_p50, 2),
+        }
+
+        if BENCHMARK_RESULTS_PATH:
+            write_results(f"render:{shape}:{page_size}", results)
+
+        # Without orjson both renderers are the same code.
+        if orjson is not None:
+            assert results["speedup"] > 1, results
@@ -0,0 +1,115 @@
+from time import sleep
+
+from django.core.cache import cache
+import pytest
+
+from dashboard_api.local_cache import (
+    LocalCacheInvalidationListener,
+    LocalLRUCache,
+    TwoTierCache,
+)
+
+
+# @pytest.mark.skip
+class TestLocalLRUCache:
+    def test_evicts_least_recently_used_by_entry_count(self):
+        local_cache = LocalLRUCache(max_entries=2, max_size=1024)
+
+        local_cache.set("a", b"a", 60)
+        local_cache.set("b", b"b", 60)
+        local_cache.get("a")
+        local_cache.set("c", b"c", 60)
+
+        assert local_cache.get("a") == b"a"
+        assert local_cache.get("b") is None
+        assert local_cache.get("c") == b"c"
+
+    def test_evicts_least_recently_used_by_size(self):
+        local_cache = LocalLRUCache(max_entries=10, max_size=10)
+
+        local_cache.set("a", b"aaaa", 60)
+        local_cache.set("b", b"bbbb", 60)
+        local_cache.set("c", b"cccc", 60)
+
+        assert local_cache.get("a") is None
+        assert local_cache.size == 8
+        assert len(local_cache) == 2
+
+    def test_skips_values_larger_than_max_size(self):
+        local_cache = LocalLRUCache(max_entries=10, max_size=10)
+
+        local_cache.set("a", b"a" * 11, 60)
+
+        assert local_cache.get("a") is None
+        assert local_cache.size == 0
+
+    def test_expires_entries(self):
+        local_cache = LocalLRUCache(max_entries=10, max_size=1024)
+
+        local_cache.set("a", b"a", 0.01)
+        sleep(0.02)
+
+        assert local_cache.get("a") is None
+        assert local_cache.size == 0
+
+
+# @pytest.mark.skip
+class TestTwoTierCache:
+    channel = "test_local_cache__invalidation"
+
+    def test_get_fills_local_cache(self):
+        two_tier_cache = TwoTierCache(cache, LocalLRUCache(10, 1024), self.channel, 60)
+
+        cache.set("test_local_cache__key", 1)
+        assert two_tier_cache.get("test_local_cache__key") == 1
+
+        cache.delete("test_local_cache__key")
+        assert two_tier_cache.get("test_local_cache__key") == 1
+
+    def test_get_skips_fill_invalidated_during_read(self):
+        local_cache = LocalLRUCache(10, 1024)
+
+        class InvalidatedRemoteCache:
+            def get(self, key, default=None):
+                value = cache.get(key, default)
+                # The invalidation of this value arrives before the read returns.
+                local_cache.delete(key)
+                return value
+
+        two_tier_cache = TwoTierCache(InvalidatedRemoteCache(), local_cache, self.channel, 60)
+
+        cache.set("test_local_cache__key", 1)
+        assert two_tier_cache.get("test_local_cache__key") == 1
+        assert local_cache.get("test_local_cache__key") is None
+
+    def test_get_many_reads_missing_keys_remotely(self):
+        local_cache = LocalLRUCache(10, 1024)
+        two_tier_cache = TwoTierCache(cache, local_cache, self.channel, 60)
+
+        local_cache.set("test_local_cache__key_1", 1, 60)
+        cache.set("test_local_cache__key_2", 2)
+        assert two_tier_cache.get_many(
+            ["test_local_cache__key_1", "test_local_cache__key_2", "test_local_cache__key_3"]
+        ) == {"test_local_cache__key_1": 1, "test_local_cache__key_2": 2}
+        assert local_cache.get("test_local_cache__key_2") == 2
+
+    def test_incr_invalidates_other_processes(self):
+        local_cache_1 = LocalLRUCache(10, 1024)
+        local_cache_2 = LocalLRUCache(10, 1024)
+        two_tier_cache_1 = TwoTierCache(cache, local_cache_1, self.channel, 60)
+        two_tier_cache_2 = TwoTierCache(cache, local_cache_2, self.channel, 60)
+
+        LocalCacheInvalidationListener(local_cache_2, self.channel).start()
+        sleep(0.2)
+
+        cache.set("test_local_cache__version", 1, timeout=None)
+        assert two_tier_cache_2.get("test_local_cache__version") == 1
+
+        assert two_tier_cache_1.incr("test_local_cache__version") == 2
+
+        for _ in range(50):
+            if local_cache_2.get("test_local_cache__version") is None:
+                break
+            sleep(0.02)
+
+        assert two_tier_cache_2.get("test_local_cache__version") == 2
@@ -0,0 +1,138 @@
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import override_settings
+import pytest
+
+from dashboard_api.mixins import (
+    CacheMixin,
+)
+
+
+class ItemCacheMixin(CacheMixin):
+    model_name = "Item"
+    dependent_model_names = []
+
+
+class CategoryCacheMixin(CacheMixin):
+    model_name = "ItemCategory"
+    dependent_model_names = ["Item"]
+
+
+# @pytest.mark.skip
+class TestCacheMixin:
+    def test_query_params_hash_is_canonical(self):
+        cache_mixin = ItemCacheMixin()
+
+        hash_1 = cache_mixin.generate_query_params_hash(QueryDict("category=1&cost__lte=50&tags=a&tags=b"))
+        hash_2 = cache_mixin.generate_query_params_hash(QueryDict("tags=b&cost__lte=50&tags=a&category=1"))
+        hash_3 = cache_mixin.generate_query_params_hash(QueryDict("category=2&cost__lte=50&tags=a&tags=b"))
+
+        assert hash_1 == hash_2
+        assert hash_1 != hash_3
+        assert len(hash_1) == 40
+
+    def test_primary_cache_key_is_bounded(self):
+        cache_mixin = ItemCacheMixin()
+        long_query_params = QueryDict("&".join(f"param{i}=value{i}" for i in range(500)))
+
+        primary_cache_key = cache_mixin.generate_primary_cache_key(1, long_query_params)
+
+        assert len(primary_cache_key) < 100
+
+    def test_invalidate_cache_bumps_version(self):
+        cache_mixin = ItemCacheMixin()
+        query_params = QueryDict("category=1")
+
+        cache_mixin.set_cache(1, query_params, ["cached"])
+        assert cache_mixin.get_cache(1, query_params) == ["cached"]
+
+        cache_mixin.invalidate_cache(1)
+        assert cache_mixin.get_cache(1, query_params) is None
+
+    def test_invalidate_cache_bumps_dependent_versions(self):
+        item_cache_mixin = ItemCacheMixin()
+        category_cache_mixin = CategoryCacheMixin()
+        query_params = QueryDict("")
+
+        item_cache_mixin.set_cache(1, query_params, ["cached"])
+        item_cache_mixin.set_cache(2, query_params, ["cached"])
+
+        category_cache_mixin.invalidate_cache(1)
+
+        # Versions are pinned per view instance, i.e. per request.
+        item_cache_mixin = ItemCacheMixin()
+        assert item_cache_mixin.get_cache(1, query_params) is None
+        assert item_cache_mixin.get_cache(2, query_params) == ["cached"]
+
+    def test_get_or_compute_cache_computes_once(self):
+        cache_mixin = ItemCacheMixin()
+        query_params = QueryDict("")
+        compute_calls = []
+
+        def compute():
+            compute_calls.append(1)
+            return ["computed"]
+
+        data_1 = cache_mixin.get_or_compute_cache(1, query_params, compute)
+        data_2 = cache_mixin.get_or_compute_cache(1, query_params, compute)
+
+        assert data_1 == ["computed"]
+        assert data_2 == ["computed"]
+        assert len(compute_calls) == 1
+
+    def test_get_or_compute_cache_serves_stale_while_locked(self):
+        cache_mixin = ItemCacheMixin()
+        query_params = QueryDict("")
+
+        cache_mixin.set_cache(1, query_params, ["stale"])
+        cache_mixin.invalidate_cache(1)
+
+        versioned_cache_key = cache_mixin.generate_versioned_cache_key(1, query_params)
+        assert cache_mixin.acquire_cache_lock(versioned_cache_key)
+
+        def compute():
+            raise AssertionError("Only the lock holder may recompute.")
+
+        assert cache_mixin.get_or_compute_cache(1, query_params, compute) == ["stale"]
+
+    @override_settings(CACHE_SERVE_STALE=False, CACHE_LOCK_WAIT_TIMEOUT=0.2)
+    def test_get_or_compute_cache_waits_for_lock_holder(self):
+        cache_mixin = ItemCacheMixin()
+        query_params = QueryDict("")
+
+        versioned_cache_key = cache_mixin.generate_versioned_cache_key(1, query_params)
+        assert cache_mixin.acquire_cache_lock(versioned_cache_key)
+
+        data = cache_mixin.get_or_compute_cache(1, query_params, lambda: ["computed"])
+
+        assert data == ["computed"]
+        assert cache_mixin.get_cache(1, query_params) is None
+
+    def test_cache_lock_released_by_owner_only(self):
+        cache_mixin = ItemCacheMixin()
+        versioned_cache_key = cache_mixin.generate_versioned_cache_key(1, QueryDict(""))
+        lock_cache_key = cache_mixin.generate_lock_cache_key(versioned_cache_key)
+
+        lock_token = cache_mixin.acquire_cache_lock(versioned_cache_key)
+        assert lock_token is not None
+        assert cache_mixin.acquire_cache_lock(versioned_cache_key) is None
+
+        # The lock expired while the first worker computed and a second took it.
+        cache.set(lock_cache_key, lock_token + 1)
+        cache_mixin.release_cache_lock(versioned_cache_key, lock_token)
+        assert cache.get(lock_cache_key) == lock_token + 1
+
+        cache_mixin.release_cache_lock(versioned_cache_key, lock_token + 1)
+        assert cache.get(lock_cache_key) is None
+
+    @override_settings(CACHE_EARLY_REFRESH_BETA=1e9)
+    def test_get_or_compute_cache_refreshes_early(self):
+        cache_mixin = ItemCacheMixin()
+        query_params = QueryDict("")
+
+        cache_mixin.set_cache(1, query_params, ["old"], compute_time=1.0)
+
+        data = cache_mixin.get_or_compute_cache(1, query_params, lambda: ["new"])
+
+        assert data == ["new"]
+        assert cache_mixin.get_cache(1, query_params) == ["new"]
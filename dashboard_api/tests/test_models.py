@@ -1,15 +1,42 @@
+from datetime import timedelta
+from io import StringIO
 from json import dumps as json_dumps
+from tempfile import NamedTemporaryFile
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 import pytest
 
+from dashboard_api.mixins import (
+    generate_version_cache_key,
+)
 from dashboard_api.models import (
     CustomUser,
     Item,
     ItemCategory,
     ItemSubCategory,
+    ItemTag,
     Organization,
+    StaleVersionError,
+    StockMovement,
+    StockSnapshot,
+)
+from dashboard_api.organization_config import (
+    OrganizationConfig,
+)
+from dashboard_api.stock_ledger import (
+    format_valuation,
+    get_current_valuation,
+    get_period_ends,
+    get_stock_as_of,
+    get_valuation_as_of,
+    snapshot_closed_periods,
+    take_stock_snapshot,
 )
 
 
@@ -243,6 +270,23 @@ class TestItemCategory:
         updated_item_category_1 = ItemCategory.objects.get(id=item_category_1.id)
         assert updated_item_category_1.name == original_name
 
+    def test_update_item_category_stale_version(self, item_category_1):
+        first_copy = ItemCategory.objects.get(id=item_category_1.id)
+        second_copy = ItemCategory.objects.get(id=item_category_1.id)
+
+        first_copy.name = "First"
+        first_copy.save()
+        assert first_copy.version == 2
+
+        second_copy.name = "Second"
+        with pytest.raises(StaleVersionError):
+            second_copy.save()
+
+        with pytest.raises(StaleVersionError):
+            second_copy.delete()
+
+        assert ItemCategory.objects.get(id=item_category_1.id).name == "First"
+
 
 # @pytest.mark.skip
 class TestItemSubCategory:
@@ -320,3 +364,356 @@ class TestItem:
                 usage_tags=json_dumps(['foo', 'bar'])
             )
             assert str(error.value) == "Usage tags foo, bar are not defined in the item's organization."
+
+    def test_item_tags_use_cached_organization_config(self, organization_1, item_category_1, item_sub_category_1, django_assert_num_queries):
+        item = Item(
+            organization=organization_1,
+            tags=json_dumps(['shopify']),
+            usage_tags=json_dumps(['assembly'])
+        )
+        item.clean_tags()
+
+        # The parsed tag lists are cached after the first check.
+        with django_assert_num_queries(0):
+            item.clean_tags()
+
+        item.tags = json_dumps(['amazon'])
+        with pytest.raises(ValidationError):
+            item.clean_tags()
+
+        organization_1.item_tags = json_dumps(['shopify', 'xero', 'amazon'])
+        organization_1.save()
+
+        item.clean_tags()
+
+    def test_organization_config_fill_racing_an_update_is_not_kept(self, organization_1, monkeypatch):
+        from_organization = OrganizationConfig.from_organization
+
+        # The organization changes after the fill has read it, but before the
+        # fill writes the config to the cache.
+        def from_organization_then_update(organization):
+            organization_config = from_organization(organization)
+            monkeypatch.setattr(OrganizationConfig, "from_organization", from_organization)
+            Organization.objects.filter(id=organization.id).update(item_tags=json_dumps(['amazon']))
+            return organization_config
+
+        monkeypatch.setattr(OrganizationConfig, "from_organization", from_organization_then_update)
+        assert "amazon" not in Organization.objects.get_config(organization_1.id).item_tags
+
+        assert "amazon" in Organization.objects.get_config(organization_1.id).item_tags
+
+    def test_item_tags_synced_on_save(self, organization_1, item_category_1, item_sub_category_1):
+        new_item = Item.objects.create(
+            name="Green Wooden Door 6'x3'",
+            stock_keeping_unit="GWD63",
+            organization=organization_1,
+            category=item_category_1,
+            sub_category=item_sub_category_1,
+            cost=100.00,
+            tags=json_dumps(['shopify']),
+            usage_tags=json_dumps(['assembly', 'saleable'])
+        )
+
+        item_tags = ItemTag.objects.filter(item=new_item)
+        assert set(item_tags.values_list('kind', 'name')) == {
+            ('tags', 'shopify'),
+            ('usage_tags', 'assembly'),
+            ('usage_tags', 'saleable'),
+        }
+        assert all(item_tag.organization_id == organization_1.id for item_tag in item_tags)
+
+        new_item.tags = json_dumps(['xero'])
+        new_item.usage_tags = json_dumps([])
+        new_item.save()
+
+        assert set(ItemTag.objects.filter(item=new_item).values_list('kind', 'name')) == {
+            ('tags', 'xero'),
+        }
+
+    def test_backfill_item_tags(self, organization_1, item_category_1, item_sub_category_1):
+        new_item = Item.objects.create(
+            name="Blue Wooden Door 6'x3'",
+            stock_keeping_unit="BLWD63",
+            organization=organization_1,
+            category=item_category_1,
+            sub_category=item_sub_category_1,
+            cost=100.00,
+            tags=json_dumps(['shopify', 'xero'])
+        )
+        ItemTag.objects.all().delete()
+
+        call_command("backfill_item_tags", "--chunk-size", "1", stdout=StringIO())
+
+        assert set(ItemTag.objects.filter(item=new_item).values_list('name', flat=True)) == {'shopify', 'xero'}
+
+    def test_import_items(self, organization_1, item_category_1, item_sub_category_1):
+        version_cache_key = generate_version_cache_key(organization_1.id, "Item")
+        cache.set(version_cache_key, 1, timeout=None)
+
+        with NamedTemporaryFile("w", suffix=".csv") as items_file:
+            items_file.write("name,category,sub_category,stock_keeping_unit,cost\n")
+            for i in range(3):
+                items_file.write(f"Imported Door {i},{item_category_1.name},{item_sub_category_1.name},IMP{i},10\n")
+            items_file.flush()
+
+            call_command(
+                "import_items", items_file.name,
+                "--organization", str(organization_1.id),
+                "--chunk-size", "2",
+                stdout=StringIO(),
+                stderr=StringIO()
+            )
+
+        assert set(
+            Item.objects.filter(organization=organization_1, stock_keeping_unit__startswith="IMP").values_list('name', flat=True)
+        ) == {"Imported Door 0", "Imported Door 1", "Imported Door 2"}
+        # One version bump per committed chunk.
+        assert cache.get(version_cache_key) == 3
+
+    def test_seed_is_deterministic(self, db):
+        seed_arguments = [
+            "--organizations", "2",
+            "--users-per-organization", "2",
+            "--categories-per-organization", "2",
+            "--subcategories-per-category", "2",
+            "--items-per-subcategory", "3",
+            "--seed", "7",
+            "--chunk-size", "5",
+            "--fast-passwords",
+        ]
+
+        def seeded_items():
+            return list(Item.objects.order_by("stock_keeping_unit").values_list(
+                "stock_keeping_unit", "name", "cost", "available_stock", "tags", "usage_tags"
+            ))
+
+        call_command("seed", *seed_arguments, stdout=StringIO())
+        first_items = seeded_items()
+
+        assert len([item for item in first_items if item[0].startswith("seed_")]) == 2 * 2 * 2 * 3
+        assert ItemTag.objects.count() > 0
+        assert CustomUser.objects.filter(username__startswith="seed_").count() == 4
+        assert CustomUser.objects.get(username="seed_1_1").check_password("1234")
+
+        Organization.objects.all().delete()
+        call_command("seed", *seed_arguments, stdout=StringIO())
+
+        assert seeded_items() == first_items
+
+    def test_seed_creates_demo_fixtures(self, db):
+        seed_arguments = [
+            "--organizations", "1",
+            "--users-per-organization", "1",
+            "--items-per-subcategory", "1",
+            "--fast-passwords",
+        ]
+        call_command("seed", *seed_arguments, stdout=StringIO())
+
+        demo_user = CustomUser.objects.get(email="marcos@kaizntree.com")
+        assert demo_user.organization.name == "Kaizntree"
+        assert demo_user.check_password("1234")
+        assert Item.objects.filter(organization=demo_user.organization).count() == 2 * 3 * 4
+        assert CustomUser.objects.get(email="foo@bar.com").organization.name == "Organization 1"
+
+        # Each demo user has its own hash, not the shared synthetic one.
+        seeded_user = CustomUser.objects.get(username="seed_1_1")
+        assert demo_user.password != seeded_user.password
+
+        # Another batch leaves the demo fixtures alone.
+        call_command("seed", *seed_arguments, "--prefix", "other", stdout=StringIO())
+        assert CustomUser.objects.filter(email="marcos@kaizntree.com").count() == 1
+        assert Organization.objects.filter(name="Kaizntree").count() == 1
+        assert CustomUser.objects.filter(username="other_1_1").exists()
+
+
+# @pytest.mark.skip
+class TestStockLedger:
+    def create_item(self, organization, item_sub_category, **kwargs):
+        return Item.objects.create(**{
+            "name": "Ledger Door",
+            "stock_keeping_unit": "LD1",
+            "organization": organization,
+            "category": item_sub_category.category,
+            "sub_category": item_sub_category,
+            "cost": 10,
+            **kwargs
+        })
+
+    def test_item_save_records_movements(self, organization_1, item_sub_category_1):
+        new_item = self.create_item(organization_1, item_sub_category_1, available_stock=10, incoming_stock=5)
+        after_create = timezone.now()
+
+        reloaded_item = Item.objects.get(id=new_item.id)
+        reloaded_item.available_stock = 4
+        reloaded_item.description = "Not a quantity"
+        reloaded_item.save()
+        after_update = timezone.now()
+
+        reloaded_item.save()
+        reloaded_item.delete()
+
+        movements = StockMovement.objects.filter(item_id=new_item.id).order_by("id")
+        assert [
+            (movement.reason, movement.available_stock, movement.incoming_stock) for movement in movements
+        ] == [("create", 10, 5), ("update", -6, 0), ("delete", -4, -5)]
+
+        assert get_stock_as_of(organization_1.id, after_create)[new_item.id]['available_stock'] == 10
+        assert get_stock_as_of(organization_1.id, after_update)[new_item.id]['available_stock'] == 4
+        assert get_stock_as_of(organization_1.id, timezone.now())[new_item.id]['available_stock'] == 0
+
+    def test_cascade_delete_records_movements(self, organization_1, item_sub_category_1):
+        category_item = self.create_item(organization_1, item_sub_category_1, available_stock=10)
+        queryset_item = Item.objects.create(
+            name="Ledger Window",
+            stock_keeping_unit="LW1",
+            organization=organization_1,
+            category=item_sub_category_1.category,
+            sub_category=item_sub_category_1,
+            cost=10,
+            available_stock=3,
+        )
+
+        Item.objects.filter(id=queryset_item.id).delete()
+        ItemCategory.objects.get(id=item_sub_category_1.category_id).delete()
+
+        assert list(
+            StockMovement.objects.filter(reason="delete").order_by("id").values_list("item_id", "available_stock")
+        ) == [(queryset_item.id, -3), (category_item.id, -10)]
+        assert get_stock_as_of(organization_1.id, timezone.now())[category_item.id]['available_stock'] == 0
+
+    def test_cascade_delete_records_movements_in_bulk(self, organization_1, item_sub_category_1):
+        items = [
+            self.create_item(organization_1, item_sub_category_1, name=f"Ledger Door {i}", stock_keeping_unit=f"LD{i}", available_stock=i)
+            for i in range(1, 4)
+        ]
+
+        with CaptureQueriesContext(connection) as captured_queries:
+            ItemSubCategory.objects.filter(id=item_sub_category_1.id).delete()
+
+        movement_inserts = [
+            query for query in captured_queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "dashboard_api_stockmovement"')
+        ]
+        assert len(movement_inserts) == 1
+        assert set(
+            StockMovement.objects.filter(reason="delete").values_list("item_id", "available_stock")
+        ) == {(item.id, -item.available_stock) for item in items}
+
+        # The organization's ledger goes with it.
+        organization_1.delete()
+        assert not StockMovement.objects.filter(organization_id=organization_1.id).exists()
+
+    def test_valuation_as_of_now_after_category_delete(self, organization_1, item_sub_category_1):
+        self.create_item(organization_1, item_sub_category_1, available_stock=5)
+        take_stock_snapshot(organization_1.id)
+
+        ItemCategory.objects.get(id=item_sub_category_1.category_id).delete()
+
+        assert get_current_valuation(organization_1.id)['total_available_stock'] == 0
+        assert get_valuation_as_of(organization_1.id, timezone.now()) == get_current_valuation(organization_1.id)
+
+    def test_stock_as_of_from_snapshot(self, organization_1, item_sub_category_1):
+        new_item = self.create_item(organization_1, item_sub_category_1, available_stock=10)
+        # Items that predate the ledger are only known through snapshots.
+        StockMovement.objects.all().delete()
+
+        take_stock_snapshot(organization_1.id)
+        after_snapshot = timezone.now()
+
+        new_item.available_stock = 25
+        new_item.save()
+
+        assert get_stock_as_of(organization_1.id, after_snapshot)[new_item.id]['available_stock'] == 10
+        assert get_stock_as_of(organization_1.id, timezone.now(), item_ids=[new_item.id]) == {
+            new_item.id: {
+                **{
+                    field_name: 25 if field_name == "available_stock" else 0
+                    for field_name in StockMovement.quantity_field_names
+                },
+                "cost": 10,
+            }
+        }
+
+    def test_stock_as_of_with_movement_committed_after_snapshot(self, organization_1, item_sub_category_1):
+        new_item = self.create_item(organization_1, item_sub_category_1, available_stock=10)
+        before_snapshot = timezone.now()
+
+        take_stock_snapshot(organization_1.id)
+
+        # A write that started before the snapshot and committed after it.
+        Item.objects.filter(id=new_item.id).update(available_stock=12)
+        StockMovement.objects.record([
+            StockMovement.objects.build(
+                new_item.id, organization_1.id, {"available_stock": 2}, "adjustment", created_at=before_snapshot
+            )
+        ])
+
+        assert get_stock_as_of(organization_1.id, timezone.now())[new_item.id]['available_stock'] == 12
+        assert get_valuation_as_of(organization_1.id, timezone.now()) == get_current_valuation(organization_1.id)
+
+    def test_compact_stock_ledger(self, organization_1, item_sub_category_1):
+        new_item = self.create_item(organization_1, item_sub_category_1, available_stock=10)
+        new_item.available_stock = 7
+        new_item.save()
+
+        StockMovement.objects.filter(item_id=new_item.id).update(created_at=timezone.now() - timedelta(days=30))
+        new_item.available_stock = 8
+        new_item.save()
+
+        call_command("compact_stock_ledger", "--retention-days", "7", stdout=StringIO())
+
+        assert list(StockMovement.objects.filter(item_id=new_item.id).values_list('available_stock', flat=True)) == [1]
+        assert StockSnapshot.objects.filter(item_id=new_item.id).latest('taken_at').available_stock == 7
+        assert get_stock_as_of(organization_1.id, timezone.now())[new_item.id]['available_stock'] == 8
+
+    def test_compact_stock_ledger_keeps_period_ends(self, organization_1, item_sub_category_1):
+        new_item = self.create_item(organization_1, item_sub_category_1, available_stock=10)
+        StockMovement.objects.filter(item_id=new_item.id).update(created_at=timezone.now() - timedelta(days=100))
+
+        new_item.available_stock = 7
+        new_item.cost = 12
+        new_item.save()
+        StockMovement.objects.filter(item_id=new_item.id, reason="update").update(created_at=timezone.now() - timedelta(days=40))
+
+        call_command("compact_stock_ledger", "--retention-days", "7", stdout=StringIO())
+
+        assert StockMovement.objects.filter(item_id=new_item.id).count() == 0
+
+        first_period_end = get_period_ends(timezone.now() - timedelta(days=100), timezone.now())[0]
+        assert get_stock_as_of(organization_1.id, first_period_end)[new_item.id]['available_stock'] == 10
+        assert get_stock_as_of(organization_1.id, timezone.now())[new_item.id]['available_stock'] == 7
+        assert get_stock_as_of(organization_1.id, timezone.now())[new_item.id]['cost'] == 12
+
+    def test_snapshot_closed_periods(self, organization_1, item_sub_category_1):
+        new_item = self.create_item(organization_1, item_sub_category_1, available_stock=10)
+        StockMovement.objects.filter(item_id=new_item.id).update(created_at=timezone.now() - timedelta(days=70))
+        period_ends = get_period_ends(timezone.now() - timedelta(days=70), timezone.now())
+
+        call_command("snapshot_stock", "--period-ends", stdout=StringIO())
+
+        assert list(
+            StockSnapshot.objects.filter(item_id=new_item.id).order_by("taken_at").values_list("taken_at", "available_stock")
+        ) == [(period_end, 10) for period_end in period_ends]
+
+        # Closed periods are only snapshotted once.
+        assert snapshot_closed_periods(organization_1.id) == 0
+
+    def test_valuation_as_of_matches_stock_as_of(self, organization_1, item_sub_category_1):
+        snapshotted_item = self.create_item(organization_1, item_sub_category_1, available_stock=10)
+        empty_item = self.create_item(organization_1, item_sub_category_1, name="Ledger Door 2", stock_keeping_unit="LD2")
+        take_stock_snapshot(organization_1.id)
+
+        snapshotted_item.available_stock = 4
+        snapshotted_item.cost = 12
+        snapshotted_item.save()
+        empty_item.delete()
+        self.create_item(organization_1, item_sub_category_1, name="Ledger Door 3", stock_keeping_unit="LD3", available_stock=3, cost=5)
+
+        now = timezone.now()
+        stock_as_of = get_stock_as_of(organization_1.id, now).values()
+
+        assert get_valuation_as_of(organization_1.id, now) == format_valuation(
+            sum(ledger_values["available_stock"] > 0 for ledger_values in stock_as_of),
+            sum(ledger_values["available_stock"] for ledger_values in stock_as_of),
+            sum((ledger_values["cost"] or 0) * ledger_values["available_stock"] for ledger_values in stock_as_of),
+        ) == get_current_valuation(organization_1.id)
@@ -0,0 +1,130 @@
+from random import Random
+
+from django.db import connection
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from dashboard_api.models import (
+    CustomUser,
+    Item,
+    ItemCategory,
+    ItemSubCategory,
+    Organization,
+)
+from dashboard_api.views import (
+    ItemGenericAPIView,
+)
+
+NUM_ORGS = 20
+NUM_ITEM_CATEGORIES_PER_ORG = 10
+NUM_ITEM_SUBCATEGORIES_PER_ITEM_CATEGORY = 5
+NUM_ITEMS_PER_ORG = 500
+STOCK_STATUSES = ["in_stock", "low_stock", "out_of_stock", "discontinued"]
+
+
+@pytest.fixture
+def large_dataset(db):
+    random = Random(0)
+
+    organizations = Organization.objects.bulk_create([
+        Organization(name=f"Organization {i}") for i in range(NUM_ORGS)
+    ])
+
+    item_categories = ItemCategory.objects.bulk_create([
+        ItemCategory(name=f"Item Category {i}", organization=organization)
+        for organization in organizations
+        for i in range(NUM_ITEM_CATEGORIES_PER_ORG)
+    ])
+
+    item_subcategories = ItemSubCategory.objects.bulk_create([
+        ItemSubCategory(name=f"Item Sub Category {i}", category=item_category, organization_id=item_category.organization_id)
+        for item_category in item_categories
+        for i in range(NUM_ITEM_SUBCATEGORIES_PER_ITEM_CATEGORY)
+    ])
+
+    item_subcategories_by_org = {}
+    for item_subcategory in item_subcategories:
+        item_subcategories_by_org.setdefault(item_subcategory.organization_id, []).append(item_subcategory)
+
+    items = []
+    for organization in organizations:
+        for i in range(NUM_ITEMS_PER_ORG):
+            item_subcategory = random.choice(item_subcategories_by_org[organization.id])
+            items.append(Item(
+                name=f"Item {i}",
+                category_id=item_subcategory.category_id,
+                sub_category=item_subcategory,
+                organization=organization,
+                stock_keeping_unit=f"sku_{organization.id}_{i}",
+                cost=round(random.uniform(10.0, 1000.0), 2),
+                available_stock=random.randint(0, 250),
+                incoming_stock=random.randint(1, 50) if random.random() < 0.05 else 0,
+                stock_status=random.choice(STOCK_STATUSES),
+            ))
+    Item.objects.bulk_create(items, batch_size=1000)
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    organization = organizations[0]
+    user = CustomUser.objects.create_user(
+        email="planner@org.com",
+        username="planner",
+        password="1234",
+        full_name="Planner",
+        phone_number="0000000000",
+        organization=organization,
+        role="admin"
+    )
+
+    return {
+        'user': user,
+        'item_category': item_categories[0],
+        'item_subcategory': item_subcategories_by_org[organization.id][0],
+    }
+
+
+def get_item_view_queryset(user, query_string):
+    request = APIRequestFactory().get(f"/api/dashboard/items/?{query_string}")
+    force_authenticate(request, user=user)
+
+    view = ItemGenericAPIView()
+    view.setup(request)
+    view.request = view.initialize_request(request)
+    return view.get_queryset()
+
+
+# @pytest.mark.skip
+class TestItemQueryPlans:
+    @pytest.mark.parametrize("query_string, expected_index_name", [
+        ("category={item_category}", "item_org_category_idx"),
+        ("sub_category={item_subcategory}", "item_org_subcategory_idx"),
+        ("stock_status=discontinued", "item_org_status_idx"),
+        ("cost__gte=100&cost__lte=110", "item_org_cost_idx"),
+        ("available_stock__gte=100&available_stock__lte=102", "item_org_available_idx"),
+        ("incoming_stock__gt=0", "item_org_incoming_idx"),
+    ])
+    def test_filter_uses_index(self, large_dataset, query_string, expected_index_name):
+        query_string = query_string.format(
+            item_category=large_dataset['item_category'].id,
+            item_subcategory=large_dataset['item_subcategory'].id,
+        )
+        queryset = get_item_view_queryset(large_dataset['user'], query_string)
+
+        assert expected_index_name in queryset.explain()
+
+    def test_keyset_page_uses_index(self, large_dataset):
+        queryset = get_item_view_queryset(large_dataset['user'], "").order_by("id")
+
+        assert "item_org_id_idx" in queryset[:50].explain()
+
+    @pytest.mark.parametrize("ordering, expected_index_name", [
+        ("name", "item_org_name_idx"),
+        ("-available_stock", "item_org_available_idx"),
+        ("cost", "item_org_cost_idx"),
+    ])
+    def test_ordered_keyset_page_uses_index(self, large_dataset, ordering, expected_index_name):
+        queryset = get_item_view_queryset(large_dataset['user'], "")
+        id_ordering = "-id" if ordering.startswith("-") else "id"
+
+        assert expected_index_name in queryset.order_by(ordering, id_ordering)[:50].explain()
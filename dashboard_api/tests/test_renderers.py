@@ -0,0 +1,98 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from uuid import UUID
+
+from django.utils.translation import gettext_lazy
+import pytest
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from dashboard_api import parsers, renderers
+from dashboard_api.parsers import (
+    FastJSONParser,
+)
+from dashboard_api.renderers import (
+    FastJSONRenderer,
+)
+
+
+def build_data():
+    return {
+        "success": True,
+        "result": ReturnList([
+            {
+                "id": 1,
+                "name": "Item \u00e9\u2028\u2029",
+                "cost": Decimal("12.50"),
+                "created_at": datetime(2024, 2, 1, 10, 30, 15, 123456, tzinfo=dt_timezone.utc),
+                "updated_at": datetime(2024, 2, 1, 16, 0, tzinfo=dt_timezone(timedelta(hours=5, minutes=30))),
+                "naive_at": datetime(2024, 2, 1, 10, 30),
+                "day": date(2024, 2, 1),
+                "at": time(10, 30),
+                "duration": timedelta(minutes=90),
+                "uuid": UUID("12345678-1234-5678-1234-567812345678"),
+                "label": gettext_lazy("Item"),
+                "counts": {1: "one"},
+                "tags": ("shopify", "xero"),
+            },
+        ], serializer=None),
+    }
+
+
+# @pytest.mark.skip
+class TestFastJSONRenderer:
+    def test_matches_json_renderer(self):
+        assert FastJSONRenderer().render(build_data()) == JSONRenderer().render(build_data())
+
+    def test_matches_json_renderer_without_orjson(self, monkeypatch):
+        monkeypatch.setattr(renderers, "orjson", None)
+        assert FastJSONRenderer().render(build_data()) == JSONRenderer().render(build_data())
+
+    def test_indent(self):
+        accepted_media_type = "application/json; indent=4"
+        assert FastJSONRenderer().render(build_data(), accepted_media_type) == JSONRenderer().render(build_data(), accepted_media_type)
+
+    def test_large_integers_fall_back(self):
+        assert FastJSONRenderer().render({"value": 2 ** 70}) == b'{"value":1180591620717411303424}'
+
+    def test_none(self):
+        assert FastJSONRenderer().render(None) == b''
+
+    @pytest.mark.parametrize("value", [Decimal("NaN"), Decimal("Infinity"), Decimal("-Infinity")])
+    def test_non_finite_decimals_fail(self, value):
+        with pytest.raises(ValueError):
+            JSONRenderer().render({"cost": value})
+        with pytest.raises(ValueError):
+            FastJSONRenderer().render({"cost": value})
+
+    # Documented difference from JSONRenderer, which raises ValueError.
+    @pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+    def test_non_finite_floats_render_as_null(self, value):
+        assert FastJSONRenderer().render({"value": value}) == b'{"value":null}'
+
+
+# @pytest.mark.skip
+class TestFastJSONParser:
+    def test_parse(self):
+        body = b'{"name": "Item \\u00e9", "cost": "12.50", "available_stock": 3, "tags": ["xero"]}'
+        assert FastJSONParser().parse(BytesIO(body)) == JSONParser().parse(BytesIO(body))
+
+    def test_parse_without_orjson(self, monkeypatch):
+        monkeypatch.setattr(parsers, "orjson", None)
+        assert FastJSONParser().parse(BytesIO(b'{"id": 1}')) == {"id": 1}
+
+    def test_parse_other_encoding(self):
+        body = '{"name": "Item é"}'.encode("latin-1")
+        assert FastJSONParser().parse(BytesIO(body), parser_context={"encoding": "latin-1"}) == {"name": "Item é"}
+
+    @pytest.mark.parametrize("body", [b'{"id": ', b'{"cost": NaN}', b''])
+    def test_parse_error_matches_json_parser(self, body):
+        with pytest.raises(ParseError) as fast_error:
+            FastJSONParser().parse(BytesIO(body))
+        with pytest.raises(ParseError) as error:
+            JSONParser().parse(BytesIO(body))
+
+        assert str(fast_error.value.detail) == str(error.value.detail)
@@ -6,9 +6,15 @@ from rest_framework_simplejwt.views import (
 )
 
 from dashboard_api.views import (
+    ItemBulkAPIView,
+    ItemExportAPIView,
     ItemGenericAPIView,
+    ItemImportAPIView,
+    ItemStockAdjustmentAPIView,
+    ItemValuationAPIView,
     ItemCategoryGenericAPIView,
     ItemSubCategoryGenericAPIView,
+    MetricsAPIView,
     RegisterUserAPIView,
 )
 
@@ -25,5 +31,13 @@ urlpatterns = [
     path('item-subcategories/', ItemSubCategoryGenericAPIView.as_view(), name="item_subcategories"),
     path('item-subcategories/<int:id>/', ItemSubCategoryGenericAPIView.as_view(), name="item_subcategory_with_pk"),
     path('items/', ItemGenericAPIView.as_view(), name="items"),
+    path('items/bulk/', ItemBulkAPIView.as_view(), name="items_bulk"),
+    path('items/export/', ItemExportAPIView.as_view(), name="items_export"),
+    path('items/import/', ItemImportAPIView.as_view(), name="items_import"),
+    path('items/stock/', ItemStockAdjustmentAPIView.as_view(), name="items_stock"),
+    path('items/valuation/', ItemValuationAPIView.as_view(), name="items_valuation"),
     path('items/<int:id>/', ItemGenericAPIView.as_view(), name="item_with_pk"),
+
+    # Monitoring
+    path('metrics/', MetricsAPIView.as_view(), name="metrics"),
 ]
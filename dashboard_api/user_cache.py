@@ -0,0 +1,19 @@
+from dashboard_api.local_cache import (
+    get_shared_cache,
+)
+
+
+def generate_user_cache_key(user_id):
+    return f"auth__user__{user_id}"
+
+
+def get_user_cache():
+    return get_shared_cache()
+
+
+# Called whenever a user or their organization changes, since cached users
+# carry their organization.
+def invalidate_cached_users(user_ids):
+    user_cache = get_user_cache()
+    for user_id in user_ids:
+        user_cache.delete(generate_user_cache_key(user_id))
@@ -1,16 +1,44 @@
+from hmac import compare_digest
 from json import dumps as json_dumps
 
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import generics, mixins, status
-from rest_framework.parsers import JSONParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework.pagination import PageNumberPagination
 
 
+from dashboard_api.authentication import (
+    CachedJWTAuthentication,
+)
+from dashboard_api.bulk_operations import (
+    adjust_item_stock,
+    bulk_create_items,
+    bulk_delete_items,
+    bulk_update_items,
+    ItemBatchValidator,
+)
+from dashboard_api.exports import (
+    stream_csv,
+    stream_ndjson,
+)
+from dashboard_api.imports import (
+    ItemImporter,
+    iter_csv_rows,
+    iter_ndjson_rows,
+)
+from dashboard_api.metrics import (
+    collect_metrics,
+)
 from dashboard_api.mixins import (
     CacheMixin,
+    idempotent,
+    IdempotencyMixin,
+    ItemFilterMixin,
 )
 from dashboard_api.models import (
     CustomUser,
@@ -18,18 +46,33 @@ from dashboard_api.models import (
     ItemCategory,
     ItemSubCategory,
     Organization,
+    StockMovement,
+)
+from dashboard_api.paginations import (
+    ItemCursorPagination,
+)
+from dashboard_api.parsers import (
+    FastJSONParser,
 )
 from dashboard_api.serializers import (
+    ItemBulkCreateSerializer,
     ItemSerializer,
+    ItemStockAdjustmentSerializer,
     ItemCategorySerializer,
     ItemSubCategorySerializer,
     RegisterUserSerializer,
 )
+from dashboard_api.stock_ledger import (
+    get_current_valuation,
+    get_items_known_at,
+    get_stock_as_of,
+    get_valuation_as_of,
+)
 
 
 class RegisterUserAPIView(APIView):
     permission_classes = [AllowAny]
-    parser_classes = [JSONParser]
+    parser_classes = [FastJSONParser]
     serializer_class = RegisterUserSerializer
 
     def post(self, request):
@@ -64,13 +107,16 @@ class ItemCategoryGenericAPIView(
         mixins.RetrieveModelMixin,
         mixins.UpdateModelMixin,
         mixins.DestroyModelMixin,
-        CacheMixin
+        CacheMixin,
+        IdempotencyMixin
     ):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = ItemCategorySerializer
 
     model_name = "ItemCategory"
+    dependent_model_names = ["ItemSubCategory", "Item"]
+    local_cache_enabled = True
     queryset = ItemCategory.objects.all()
     lookup_field = "id"
 
@@ -79,47 +125,43 @@ class ItemCategoryGenericAPIView(
         return queryset.filter(organization=self.request.user.organization)
     
     def get(self, request, id=None):
-        user_organization = self.request.user.organization
-
-        if id:
-            cached_data = self.get_single_cache(user_organization.id, id)
-            if cached_data:
-                return Response(cached_data)
-            
-            response = self.retrieve(request, id)
-            self.set_single_cache(user_organization.id, id, response.data)
-            return response
-        
-        cached_data = self.get_all_cache(user_organization.id)
-        if cached_data:
-            return Response(cached_data)
-        
-        response = self.list(request, id)
-        self.set_all_cache(user_organization.id, response.data)
-        return response
+        return self.cached_get(request, id)
     
+    @idempotent
     def post(self, request):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
 
         request.data['organization'] = user_organization.id
-        return self.create(request)
+        response = self.create(request)
+
+        self.invalidate_cache(user_organization.id)
+        return response
     
+    @idempotent
     def put(self, request, id=None):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
-        self.delete_single_cache(user_organization.id, id)
+        expected_version = self.check_if_match(request, id)
 
         request.data['organization'] = user_organization.id
-        return self.update(request, id)
+        if expected_version is not None:
+            request.data['version'] = expected_version
+        response = self.write_at_version(lambda: self.update(request, id), expected_version)
+
+        self.invalidate_cache(user_organization.id)
+        return response
     
     def delete(self, request, id=None):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
-        self.delete_single_cache(user_organization.id, id)
+        expected_version = self.check_if_match(request, id)
 
         request.data['organization'] = user_organization.id
-        return self.destroy(request, id)
+        response = self.write_at_version(
+            lambda: self.destroy_at_version(request, id, expected_version),
+            expected_version
+        )
+
+        self.invalidate_cache(user_organization.id)
+        return response
     
 
 class ItemSubCategoryGenericAPIView(
@@ -129,13 +171,16 @@ class ItemSubCategoryGenericAPIView(
         mixins.RetrieveModelMixin,
         mixins.UpdateModelMixin,
         mixins.DestroyModelMixin,
-        CacheMixin
+        CacheMixin,
+        IdempotencyMixin
     ):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = ItemSubCategorySerializer
 
     model_name = "ItemSubCategory"
+    dependent_model_names = ["Item"]
+    local_cache_enabled = True
     queryset = ItemSubCategory.objects.all()
     lookup_field = "id"
 
@@ -150,49 +195,43 @@ class ItemSubCategoryGenericAPIView(
         return queryset
     
     def get(self, request, id=None):
-        user_organization = self.request.user.organization
-
-        primary_cache_key = self.generate_primary_cache_key(user_organization.id, request.query_params)
-
-        if id:
-            cached_data = self.get_single_cache(primary_cache_key, id)
-            if cached_data:
-                return Response(cached_data)
-            
-            response = self.retrieve(request, id)
-            self.set_single_cache(primary_cache_key, id, response.data)
-            return response
-        
-        cached_data = self.get_all_cache(primary_cache_key)
-        if cached_data:
-            return Response(cached_data)
-        
-        response = self.list(request, id)
-        self.set_all_cache(primary_cache_key, response.data)
-        return response
+        return self.cached_get(request, id)
     
+    @idempotent
     def post(self, request):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
 
         request.data['organization'] = user_organization.id
-        return self.create(request)
+        response = self.create(request)
+
+        self.invalidate_cache(user_organization.id)
+        return response
     
+    @idempotent
     def put(self, request, id=None):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
-        self.delete_single_cache(user_organization.id, id)
+        expected_version = self.check_if_match(request, id)
 
         request.data['organization'] = user_organization.id
-        return self.update(request, id)
+        if expected_version is not None:
+            request.data['version'] = expected_version
+        response = self.write_at_version(lambda: self.update(request, id), expected_version)
+
+        self.invalidate_cache(user_organization.id)
+        return response
     
     def delete(self, request, id=None):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
-        self.delete_single_cache(user_organization.id, id)
+        expected_version = self.check_if_match(request, id)
 
         request.data['organization'] = user_organization.id
-        return self.destroy(request, id)
+        response = self.write_at_version(
+            lambda: self.destroy_at_version(request, id, expected_version),
+            expected_version
+        )
+
+        self.invalidate_cache(user_organization.id)
+        return response
 
 
 class ItemGenericAPIView(
@@ -202,113 +241,516 @@ class ItemGenericAPIView(
         mixins.RetrieveModelMixin,
         mixins.UpdateModelMixin,
         mixins.DestroyModelMixin,
-        PageNumberPagination,
-        CacheMixin
+        CacheMixin,
+        IdempotencyMixin,
+        ItemFilterMixin
     ):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = ItemSerializer
+    pagination_class = ItemCursorPagination
 
     model_name = "Item"
-    queryset = Item.objects.all()
+    queryset = Item.objects.order_by("id")
     lookup_field = "id"
 
-    page_size = 2
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        queryset = self.filter_item_queryset(queryset)
+
+        as_of = self.get_as_of() if self.request.method == "GET" else None
+        if as_of is not None:
+            queryset = queryset.filter(get_items_known_at(self.request.user.organization.id, as_of))
+
+        return queryset
+
+    # Replaces the quantities and cost of serialized items with their values
+    # at as_of. Other fields, and the filters, use the current values.
+    def apply_as_of(self, item_rows, as_of, paginated):
+        item_ids = [item_row["id"] for item_row in item_rows] if paginated else None
+        ledger_values = get_stock_as_of(self.request.user.organization.id, as_of, item_ids)
+
+        cost_field = self.get_serializer().fields["cost"]
+        for item_row in item_rows:
+            item_ledger_values = ledger_values.get(item_row["id"], None)
+            if item_ledger_values is None:
+                continue
+
+            for field_name in StockMovement.quantity_field_names:
+                item_row[field_name] = item_ledger_values[field_name]
+            if item_ledger_values["cost"] is not None:
+                item_row["cost"] = cost_field.to_representation(item_ledger_values["cost"])
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+
+        as_of = self.get_as_of()
+        if as_of is not None:
+            paginated = isinstance(response.data, dict)
+            self.apply_as_of(response.data["results"] if paginated else response.data, as_of, paginated)
+
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+
+        as_of = self.get_as_of()
+        if as_of is not None:
+            self.apply_as_of([response.data], as_of, True)
+
+        return response
+    
+    def get(self, request, id=None):
+        # Rejects a malformed as_of before anything is cached.
+        self.get_as_of()
+        return self.cached_get(request, id)
+    
+    @idempotent
+    def post(self, request):
+        user_organization = self.request.user.organization
+
+        request.data['organization'] = user_organization.id
+        response = self.create(request)
+
+        self.invalidate_cache(user_organization.id)
+        return response
+    
+    @idempotent
+    def put(self, request, id=None):
+        user_organization = self.request.user.organization
+        expected_version = self.check_if_match(request, id)
+
+        request.data['organization'] = user_organization.id
+        if expected_version is not None:
+            request.data['version'] = expected_version
+        response = self.write_at_version(lambda: self.update(request, id), expected_version)
+
+        self.invalidate_cache(user_organization.id)
+        return response
+    
+    def delete(self, request, id=None):
+        user_organization = self.request.user.organization
+        expected_version = self.check_if_match(request, id)
+
+        request.data['organization'] = user_organization.id
+        response = self.write_at_version(
+            lambda: self.destroy_at_version(request, id, expected_version),
+            expected_version
+        )
+
+        self.invalidate_cache(user_organization.id)
+        return response
+
 
-    direct_filter_fields = [
+class ItemBulkAPIView(generics.GenericAPIView, CacheMixin, ItemFilterMixin):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedJWTAuthentication]
+    serializer_class = ItemBulkCreateSerializer
+
+    model_name = "Item"
+    queryset = Item.objects.all()
+
+    # Unique fields (name, stock_keeping_unit) cannot be set on many items.
+    bulk_update_field_names = [
         "category",
-        "subcategory",
-        "stock_status",
-    ]
-    contains_filter_fields = [
-        "tags",
-        "usage_tags"
-    ]
-    range_filter_fields = [
+        "sub_category",
+        "description",
         "allocated_to_sales",
         "allocated_to_builds",
         "available_stock",
         "incoming_stock",
         "minimum_stock",
         "desired_stock",
+        "stock_status",
         "on_build_order",
         "can_build",
         "cost",
+        "tags",
+        "usage_tags",
     ]
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        queryset = queryset.filter(organization=self.request.user.organization)
+        return self.filter_item_queryset(queryset)
 
-        params = self.request.query_params
+    # PATCH and DELETE target either the "ids" listed in the body or every
+    # item matching the items/ query filters; returns (queryset, errors).
+    def get_selected_queryset(self, request):
+        ids = request.data.get('ids', None) if isinstance(request.data, dict) else None
 
-        for filter_field in self.direct_filter_fields:
-            if filter_field in params:
-                queryset = queryset.filter(**{filter_field: params[filter_field]})
-        
-        for filter_field in self.contains_filter_fields:
-            if filter_field in params:
-                cs_values = params[filter_field].replace(",", "%2c")
-                values = cs_values.split("%2c")
-
-                for value in values:
-                    value = value.strip()
-                    queryset = queryset.filter(**{f"{filter_field}__icontains": value})
-        
-        for filter_field in self.range_filter_fields:
-            if f"{filter_field}__lte" in params:
-                queryset = queryset.filter(**{f"{filter_field}__lte": params[f"{filter_field}__lte"]})
-            elif f"{filter_field}__lt" in params:
-                queryset = queryset.filter(**{f"{filter_field}__lt": params[f"{filter_field}__lt"]})
-
-            if f"{filter_field}__gte" in params:
-                queryset = queryset.filter(**{f"{filter_field}__gte": params[f"{filter_field}__gte"]})
-            elif f"{filter_field}__gt" in params:
-                queryset = queryset.filter(**{f"{filter_field}__gt": params[f"{filter_field}__gt"]})
-        
-        return queryset
-    
-    def get(self, request, id=None):
-        user_organization = self.request.user.organization
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+                return None, ["\"ids\" must be a list of integers."]
+            if len(ids) > settings.ITEM_BULK_MAX_IDS:
+                return None, [f"At most {settings.ITEM_BULK_MAX_IDS} ids can be given at once."]
+            return self.get_queryset().filter(id__in=ids), []
 
-        primary_cache_key = self.generate_primary_cache_key(user_organization.id, request.query_params)
+        # Refuse to touch every item of the organization by accident.
+        if not self.has_item_filters():
+            return None, ["Expected \"ids\" or at least one filter."]
+
+        return self.get_queryset(), []
 
-        if id:
-            cached_data = self.get_single_cache(primary_cache_key, id)
-            if cached_data:
-                return Response(cached_data)
-            
-            response = self.retrieve(request, id)
-            self.set_single_cache(primary_cache_key, id, response.data)
-            return response
-        
-        cached_data = self.get_all_cache(primary_cache_key)
-        if cached_data:
-            return Response(cached_data)
-        
-        response = self.list(request, id)
-        self.set_all_cache(primary_cache_key, response.data)
-        return response
-    
     def post(self, request):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
 
-        request.data['organization'] = user_organization.id
-        return self.create(request)
-    
-    def put(self, request, id=None):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({
+                'success': False,
+                'errors': ["Expected a list of items."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(rows) > settings.ITEM_BULK_CREATE_MAX_ITEMS:
+            return Response({
+                'success': False,
+                'errors': [f"At most {settings.ITEM_BULK_CREATE_MAX_ITEMS} items can be created at once."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # A single serializer instance validates every row, skipping the per-row
+        # serializer construction that ListSerializer would do.
+        row_serializer = self.get_serializer()
+        indexed_validated_data = []
+        errors = []
+
+        for index, row in enumerate(rows):
+            try:
+                indexed_validated_data.append((index, row_serializer.run_validation(row)))
+            except ValidationError as error:
+                errors.append({'index': index, 'errors': error.detail})
+
+        items, batch_errors = ItemBatchValidator(user_organization).validate(indexed_validated_data)
+        errors = sorted(errors + batch_errors, key=lambda error: error['index'])
+
+        allow_partial = request.query_params.get('allow_partial', "").lower() in ("1", "true")
+        if errors and (not allow_partial or len(items) == 0):
+            return Response({
+                'success': False,
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            bulk_create_items(items, settings.ITEM_BULK_CREATE_CHUNK_SIZE)
+        except IntegrityError:
+            # Another request inserted a conflicting SKU or name after validation.
+            return Response({
+                'success': False,
+                'errors': ["Items conflict with concurrently created items; nothing was created."],
+            }, status=status.HTTP_409_CONFLICT)
+
+        if len(items) > 0:
+            self.invalidate_cache(user_organization.id)
+
+        return Response({
+            'success': len(errors) == 0,
+            'result': {
+                'created_ids': [item.id for item in items],
+                'errors': errors,
+            },
+        }, status=status.HTTP_201_CREATED)
+
+    def patch(self, request):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
-        self.delete_single_cache(user_organization.id, id)
 
-        request.data['organization'] = user_organization.id
-        return self.update(request, id)
-    
-    def delete(self, request, id=None):
+        queryset, errors = self.get_selected_queryset(request)
+        if errors:
+            return Response({
+                'success': False,
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = request.data.get('changes', None)
+        if not isinstance(changes, dict) or len(changes) == 0:
+            return Response({
+                'success': False,
+                'errors': ["Expected a non-empty \"changes\" object."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        unknown_field_names = sorted(set(changes) - set(self.bulk_update_field_names))
+        if unknown_field_names:
+            return Response({
+                'success': False,
+                'errors': {field_name: ["This field cannot be changed in bulk."] for field_name in unknown_field_names},
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            validated_data = self.get_serializer(partial=True).run_validation(changes)
+        except ValidationError as error:
+            return Response({
+                'success': False,
+                'errors': error.detail,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        changes, errors = ItemBatchValidator(user_organization).validate_changes(validated_data)
+        if errors:
+            return Response({
+                'success': False,
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            num_updated = bulk_update_items(queryset, changes)
+        except IntegrityError:
+            return Response({
+                'success': False,
+                'errors': ["Items would conflict with existing items; nothing was updated."],
+            }, status=status.HTTP_409_CONFLICT)
+
+        if num_updated > 0:
+            self.invalidate_cache(user_organization.id)
+
+        return Response({
+            'success': True,
+            'result': {
+                'updated': num_updated,
+            },
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
         user_organization = self.request.user.organization
-        self.delete_all_cache(user_organization.id)
-        self.delete_single_cache(user_organization.id, id)
 
-        request.data['organization'] = user_organization.id
-        return self.destroy(request, id)
+        queryset, errors = self.get_selected_queryset(request)
+        if errors:
+            return Response({
+                'success': False,
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        num_deleted = bulk_delete_items(queryset, settings.ITEM_BULK_DELETE_CHUNK_SIZE)
+
+        if num_deleted > 0:
+            self.invalidate_cache(user_organization.id)
+
+        return Response({
+            'success': True,
+            'result': {
+                'deleted': num_deleted,
+            },
+        }, status=status.HTTP_200_OK)
+
+
+class ItemStockAdjustmentAPIView(generics.GenericAPIView, CacheMixin):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedJWTAuthentication]
+    serializer_class = ItemStockAdjustmentSerializer
+
+    model_name = "Item"
+    queryset = Item.objects.all()
+
+    def get_queryset(self):
+        return super().get_queryset().filter(organization=self.request.user.organization)
+
+    def post(self, request):
+        user_organization = self.request.user.organization
+
+        rows = request.data
+        if not isinstance(rows, list) or len(rows) == 0:
+            return Response({
+                'success': False,
+                'errors': ["Expected a non-empty list of stock adjustments."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(rows) > settings.ITEM_STOCK_ADJUSTMENT_MAX_ITEMS:
+            return Response({
+                'success': False,
+                'errors': [f"At most {settings.ITEM_STOCK_ADJUSTMENT_MAX_ITEMS} adjustments can be applied at once."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        row_serializer = self.get_serializer()
+        deltas_by_id = {}
+        errors = []
+
+        for index, row in enumerate(rows):
+            try:
+                deltas = row_serializer.run_validation(row)
+            except ValidationError as error:
+                errors.append({'index': index, 'errors': error.detail})
+                continue
+
+            # Several adjustments of the same item add up.
+            item_deltas = deltas_by_id.setdefault(deltas.pop('id'), {})
+            for field_name, delta in deltas.items():
+                item_deltas[field_name] = item_deltas.get(field_name, 0) + delta
+
+        if errors:
+            return Response({
+                'success': False,
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        new_values, errors = adjust_item_stock(self.get_queryset(), deltas_by_id)
+        if errors:
+            missing_items = any(error['errors'] == ["Item does not exist."] for error in errors)
+            return Response({
+                'success': False,
+                'errors': errors,
+            }, status=status.HTTP_404_NOT_FOUND if missing_items else status.HTTP_409_CONFLICT)
+
+        self.invalidate_cache(user_organization.id)
+
+        return Response({
+            'success': True,
+            'result': new_values,
+        }, status=status.HTTP_200_OK)
+
+
+class ItemExportAPIView(generics.GenericAPIView, ItemFilterMixin):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedJWTAuthentication]
+
+    queryset = Item.objects.order_by("id")
+
+    # "format" is reserved by DRF for renderer selection.
+    export_format_query_param = "export_format"
+    export_content_types = {
+        "csv": "text/csv",
+        "ndjson": "application/x-ndjson",
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return self.filter_item_queryset(queryset)
+
+    def get(self, request):
+        export_format = request.query_params.get(self.export_format_query_param, "csv")
+        if export_format not in self.export_content_types:
+            return Response({
+                'success': False,
+                'errors': [f"Unsupported export format \"{export_format}\"."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        field_names = [field.name for field in Item._meta.concrete_fields]
+        chunk_size = settings.ITEM_EXPORT_CHUNK_SIZE
+
+        # values() + iterator() streams plain dicts from the cursor without
+        # building model instances or caching the result set.
+        rows = self.get_queryset().values(*field_names).iterator(chunk_size=chunk_size)
+
+        if export_format == "csv":
+            streaming_content = stream_csv(rows, field_names, chunk_size)
+        else:
+            streaming_content = stream_ndjson(rows, chunk_size)
+
+        response = StreamingHttpResponse(streaming_content, content_type=self.export_content_types[export_format])
+        response['Content-Disposition'] = f'attachment; filename="items.{export_format}"'
+        return response
+
+
+class ItemImportAPIView(generics.GenericAPIView, CacheMixin):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedJWTAuthentication]
+    parser_classes = [MultiPartParser]
+
+    model_name = "Item"
+    queryset = Item.objects.all()
+
+    import_format_query_param = "import_format"
+    row_readers = {
+        "csv": iter_csv_rows,
+        "ndjson": iter_ndjson_rows,
+    }
+
+    def get_import_format(self, request, uploaded_file):
+        import_format = request.query_params.get(self.import_format_query_param, None)
+        if import_format is not None:
+            return import_format
+
+        if uploaded_file.name.lower().endswith((".ndjson", ".jsonl")):
+            return "ndjson"
+        return "csv"
+
+    def stream_progress(self, importer, rows):
+        user_organization_id = self.request.user.organization.id
+
+        for progress in importer.import_rows(rows):
+            # Each chunk is committed on its own, so readers should see it
+            # without waiting for the rest of the file.
+            if progress['created'] or progress['updated']:
+                self.invalidate_cache(user_organization_id)
+
+            yield json_dumps(progress) + "\n"
+
+    def post(self, request):
+        uploaded_file = request.FILES.get('file', None)
+        if uploaded_file is None:
+            return Response({
+                'success': False,
+                'errors': ["Expected a \"file\" upload."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        import_format = self.get_import_format(request, uploaded_file)
+        if import_format not in self.row_readers:
+            return Response({
+                'success': False,
+                'errors': [f"Unsupported import format \"{import_format}\"."],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = ItemImporter(
+            self.request.user.organization,
+            settings.ITEM_IMPORT_CHUNK_SIZE,
+            upsert=request.query_params.get('upsert', "").lower() in ("1", "true")
+        )
+        rows = self.row_readers[import_format](uploaded_file.file)
+
+        # Progress is reported as one NDJSON line per committed chunk.
+        return StreamingHttpResponse(self.stream_progress(importer, rows), content_type="application/x-ndjson")
+
+
+class ItemValuationAPIView(generics.GenericAPIView, CacheMixin, ItemFilterMixin):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedJWTAuthentication]
+
+    model_name = "Item"
+    cache_view_name = "valuation"
+    queryset = Item.objects.all()
+
+    def compute_response(self, request, id=None):
+        user_organization = self.request.user.organization
+        as_of = self.get_as_of()
+
+        if as_of is None:
+            valuation = get_current_valuation(user_organization.id)
+        else:
+            valuation = get_valuation_as_of(user_organization.id, as_of)
+
+        return Response({
+            'success': True,
+            'result': {
+                'as_of': as_of.isoformat() if as_of is not None else None,
+                **valuation,
+            },
+        })
+
+    def get(self, request):
+        self.get_as_of()
+        return self.cached_get(request)
+
+
+class MetricsAPIView(APIView):
+    # Scraped by Prometheus, which does not hold a JWT; guarded by
+    # METRICS_AUTH_TOKEN instead. Without a token only local requests to a
+    # DEBUG server are answered.
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    local_addresses = ("127.0.0.1", "::1")
+
+    def is_authorized(self, request):
+        if not settings.METRICS_AUTH_TOKEN:
+            return settings.DEBUG and request.META.get("REMOTE_ADDR", None) in self.local_addresses
+        authorization = request.META.get("HTTP_AUTHORIZATION", "")
+        return compare_digest(authorization.encode(), f"Bearer {settings.METRICS_AUTH_TOKEN}".encode())
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            return Response({
+                'success': False,
+                'errors': ["Metrics are disabled."],
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        if not self.is_authorized(request):
+            return Response({
+                'success': False,
+                'errors': ["Invalid metrics token."],
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        return HttpResponse(collect_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
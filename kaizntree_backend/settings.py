@@ -47,6 +47,9 @@ SERIALIZATION_MODULES = {
 }
 
 MIDDLEWARE = [
+    "dashboard_api.middleware.RequestMetricsMiddleware",
+    "dashboard_api.middleware.RequestTimingMiddleware",
+    "dashboard_api.middleware.QueryStatsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -83,6 +86,90 @@ CACHES = {
     }
 }
 
+# Dashboard API cache
+# Single-flight recomputation: one worker rebuilds a missing entry while the
+# others serve the previous (stale) value or wait for the rebuild.
+CACHE_LOCK_TIMEOUT = config('CACHE_LOCK_TIMEOUT', default=10, cast=int)
+CACHE_LOCK_WAIT_TIMEOUT = config('CACHE_LOCK_WAIT_TIMEOUT', default=2.0, cast=float)
+CACHE_LOCK_POLL_INTERVAL = config('CACHE_LOCK_POLL_INTERVAL', default=0.05, cast=float)
+CACHE_SERVE_STALE = config('CACHE_SERVE_STALE', default=True, cast=bool)
+CACHE_STALE_TIMEOUT = config('CACHE_STALE_TIMEOUT', default=3600, cast=int)
+# Probabilistic early refresh of hot entries; 0 disables it.
+CACHE_EARLY_REFRESH_BETA = config('CACHE_EARLY_REFRESH_BETA', default=1.0, cast=float)
+# Cache the rendered JSON body instead of response.data, optionally gzipped.
+CACHE_RENDERED_RESPONSES = config('CACHE_RENDERED_RESPONSES', default=True, cast=bool)
+CACHE_COMPRESS_RESPONSES = config('CACHE_COMPRESS_RESPONSES', default=False, cast=bool)
+CACHE_COMPRESSION_MIN_SIZE = config('CACHE_COMPRESSION_MIN_SIZE', default=1024, cast=int)
+CACHE_COMPRESSION_LEVEL = config('CACHE_COMPRESSION_LEVEL', default=6, cast=int)
+# Optional per-process LRU cache in front of Redis for views that opt in,
+# invalidated across workers over Redis pub/sub.
+CACHE_L1_ENABLED = config('CACHE_L1_ENABLED', default=False, cast=bool)
+CACHE_L1_MAX_ENTRIES = config('CACHE_L1_MAX_ENTRIES', default=1024, cast=int)
+CACHE_L1_MAX_SIZE = config('CACHE_L1_MAX_SIZE', default=64 * 1024 * 1024, cast=int)
+CACHE_L1_TIMEOUT = config('CACHE_L1_TIMEOUT', default=60, cast=int)
+CACHE_L1_INVALIDATION_CHANNEL = config('CACHE_L1_INVALIDATION_CHANNEL', default="dashboard_api__l1_invalidation")
+
+# Authenticated users (with their organization) are cached so that cached
+# responses need no query.
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+
+# Parsed organization roles and tag lists used by model validation. Writes
+# move the organization to a new config version; the timeout only bounds how
+# long an unreachable version lingers.
+ORGANIZATION_CONFIG_CACHE_TIMEOUT = config('ORGANIZATION_CONFIG_CACHE_TIMEOUT', default=300, cast=int)
+
+# Idempotency-Key replay for retried writes. Successful responses are kept
+# for the key timeout; duplicates that arrive while the first request is
+# still running wait on its lock.
+IDEMPOTENCY_KEY_TIMEOUT = config('IDEMPOTENCY_KEY_TIMEOUT', default=24 * 3600, cast=int)
+IDEMPOTENCY_KEY_MAX_LENGTH = config('IDEMPOTENCY_KEY_MAX_LENGTH', default=255, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=30, cast=int)
+IDEMPOTENCY_LOCK_WAIT_TIMEOUT = config('IDEMPOTENCY_LOCK_WAIT_TIMEOUT', default=5.0, cast=float)
+
+# Every request slower than the threshold is logged with its slowest SQL and
+# counted. A sampled fraction of requests also gets a per-phase breakdown
+# (Server-Timing header and a JSON log line).
+REQUEST_TIMING_SAMPLE_RATE = config('REQUEST_TIMING_SAMPLE_RATE', default=0.01, cast=float)
+REQUEST_TIMING_SLOW_THRESHOLD_MS = config('REQUEST_TIMING_SLOW_THRESHOLD_MS', default=500, cast=float)
+REQUEST_TIMING_MAX_CAPTURED_QUERIES = config('REQUEST_TIMING_MAX_CAPTURED_QUERIES', default=200, cast=int)
+REQUEST_TIMING_MAX_LOGGED_QUERIES = config('REQUEST_TIMING_MAX_LOGGED_QUERIES', default=20, cast=int)
+
+# Metrics exposed at /api/dashboard/metrics/ in the Prometheus text format. Under a
+# pre-fork server set METRICS_DIR to a directory shared by the workers (and
+# emptied on startup); each worker flushes its snapshot there every flush
+# interval. Scrapers send METRICS_AUTH_TOKEN as a Bearer token; while it is
+# empty the endpoint only answers local requests with DEBUG on.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default="")
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default="")
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# SQL aggregated by normalized shape (fingerprint), flushed to Redis by every
+# process. Reads slower than the threshold get an EXPLAIN plan, captured off
+# the request path at most once per fingerprint per explain interval.
+QUERY_STATS_ENABLED = config('QUERY_STATS_ENABLED', default=True, cast=bool)
+QUERY_STATS_FLUSH_INTERVAL = config('QUERY_STATS_FLUSH_INTERVAL', default=10.0, cast=float)
+QUERY_STATS_SLOW_THRESHOLD_MS = config('QUERY_STATS_SLOW_THRESHOLD_MS', default=100, cast=float)
+QUERY_STATS_EXPLAIN_INTERVAL = config('QUERY_STATS_EXPLAIN_INTERVAL', default=3600, cast=int)
+QUERY_STATS_EXPLAIN_QUEUE_SIZE = config('QUERY_STATS_EXPLAIN_QUEUE_SIZE', default=100, cast=int)
+
+# Bulk item operations
+ITEM_BULK_CREATE_MAX_ITEMS = config('ITEM_BULK_CREATE_MAX_ITEMS', default=10000, cast=int)
+# Ids listed in one bulk PATCH or DELETE.
+ITEM_BULK_MAX_IDS = config('ITEM_BULK_MAX_IDS', default=10000, cast=int)
+ITEM_BULK_CREATE_CHUNK_SIZE = config('ITEM_BULK_CREATE_CHUNK_SIZE', default=500, cast=int)
+ITEM_BULK_DELETE_CHUNK_SIZE = config('ITEM_BULK_DELETE_CHUNK_SIZE', default=500, cast=int)
+ITEM_EXPORT_CHUNK_SIZE = config('ITEM_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+ITEM_IMPORT_CHUNK_SIZE = config('ITEM_IMPORT_CHUNK_SIZE', default=500, cast=int)
+ITEM_STOCK_ADJUSTMENT_MAX_ITEMS = config('ITEM_STOCK_ADJUSTMENT_MAX_ITEMS', default=500, cast=int)
+
+# Stock ledger
+STOCK_LEDGER_BATCH_SIZE = config('STOCK_LEDGER_BATCH_SIZE', default=1000, cast=int)
+STOCK_LEDGER_RETENTION_DAYS = config('STOCK_LEDGER_RETENTION_DAYS', default=90, cast=int)
+# Seconds after a month ends before snapshot_stock --period-ends snapshots it.
+STOCK_LEDGER_PERIOD_CLOSE_DELAY = config('STOCK_LEDGER_PERIOD_CLOSE_DELAY', default=300, cast=int)
+
 WSGI_APPLICATION = "kaizntree_backend.wsgi.application"
 
 
@@ -129,7 +216,17 @@ USE_TZ = True
 # DRF
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'dashboard_api.authentication.CachedJWTAuthentication',
+    ],
+    # orjson-backed JSON, falling back to DRF's stdlib JSON without orjson.
+    'DEFAULT_RENDERER_CLASSES': [
+        'dashboard_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'dashboard_api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 